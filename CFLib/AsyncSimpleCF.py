@@ -0,0 +1,231 @@
+# General purpose import
+import asyncio
+import time
+import numpy as np
+
+from cflib.positioning.position_hl_commander import PositionHlCommander
+
+from CFLib.SimpleCF import SimpleCF, DEFAULT_VELOCITY, DEFAULT_HEIGHT, DEFAULT_LANDING_HEIGHT, EMERGENCY_LAND_DURATION
+
+class AsyncSimpleCF(SimpleCF):
+
+    '''
+    AsyncSimpleCF class is the asyncio version of SimpleCF.
+
+    Connection, take off, go_to, waiting and landing are coroutines, so that many
+    drones can be driven by a single event loop (see AsyncSimpleCFSwarm) instead of
+    one thread for each drone.
+
+    cflib callbacks are invoked by the cflib threads: they are forwarded to the event
+    loop with loop.call_soon_threadsafe().
+
+    The coroutines counterpart of SimpleCF methods have their own names (connect_async(),
+    disconnect_async(), go_to_async()), so the inherited code keeps calling the
+    synchronous ones: the connection is supervised (see LinkSupervisor) and
+    emergency_land(), form() and the safety responses work on these drones too.
+
+    The action performed by the agent is a coroutine function:
+        async def method(self):
+            await self.go_to_async(x, y, z)
+            await self.wait(2)
+    '''
+
+    def __init__(self, uri, clock=None, Ts=100, log_max_len=None, velocity=DEFAULT_VELOCITY, toc_cache=None):
+        '''
+        Parameters are the same of SimpleCF, plus:
+
+        velocity:   Velocity (m/s) used to compute the duration of take off, go_to and landing
+        '''
+        super().__init__(uri, clock=clock, Ts=Ts, log_max_len=log_max_len, toc_cache=toc_cache)
+        self._velocity = velocity
+
+        # Event loop the drone is attached to
+        self._loop = None
+
+        # Asyncio counterparts of _first_log_event and _mission_stop, created in connect_async()
+        self._first_log_async = None
+        self._mission_stop_async = None
+
+        # High level commander state
+        self._is_flying = False
+
+        # Default action: wait 5 seconds
+        self._executed_function = AsyncSimpleCF._execute_async
+
+    '''
+    Bridge between cflib threads and the event loop
+    '''
+    def _call_in_loop(self, fn, *args):
+        if self._loop is not None and not self._loop.is_closed():
+            self._loop.call_soon_threadsafe(fn, *args)
+
+    def _async_log_cb(self, data, timestamp=None, logconf=None):
+        first_log = not self._first_log_event.is_set()
+        super()._async_log_cb(data, timestamp, logconf)
+        if first_log and self._first_log_async is not None:
+            self._call_in_loop(self._first_log_async.set)
+
+    '''
+    Connection methods
+    '''
+    async def connect_async(self, **kwargs):
+        '''
+        Coroutine equivalent of SimpleCF.connect(): the supervised connection (link,
+        logs, estimator reset, first position) is opened in a worker thread, so the
+        link is opened again if it drops (see LinkSupervisor). Parameters are passed
+        to LinkSupervisor. Raise ConnectionError if the connection failed.
+        '''
+        self._loop = asyncio.get_running_loop()
+        self._first_log_async = asyncio.Event()
+        self._mission_stop_async = asyncio.Event()
+        self._mission_stop.clear()
+        self._emergency.clear()
+
+        self.startup_times = {}
+        if not await asyncio.to_thread(self.connect, **kwargs):
+            raise ConnectionError("Connection to the drone " + self._uri + " failed.")
+        # The connection returns once a position has been logged
+        self._first_log_async.set()
+
+    async def disconnect_async(self):
+        # Land, if flying, and close the link (see LinkSupervisor.close())
+        await asyncio.to_thread(self.disconnect)
+
+    async def wait_for_position(self, timeout=None):
+        t0 = time.monotonic()
+        await asyncio.wait_for(self._first_log_async.wait(), timeout)
+        self.wait_times["first_log"] = time.monotonic() - t0
+
+    '''
+    Flight methods
+    '''
+    def _duration(self, target, velocity):
+        # Time necessary to reach target from the last logged position
+        if velocity is None:
+            velocity = self._velocity
+        distance = np.linalg.norm(np.asarray(target) - self.get_last_position())
+        return max(distance/velocity, 0.1)
+
+    def _send_go_to(self, target, duration=None):
+        # Used by go_to_async() and by the inherited non-blocking motions (form(),
+        #   safety moves): the high level commander is driven directly.
+        #   Return the duration of the motion.
+        target = np.asarray(target, dtype=np.float64)
+        self._pos_set_point = target
+        if duration is None:
+            duration = self._duration(target, None)
+        self._scf.cf.high_level_commander.go_to(target[0], target[1], target[2], 0, duration)
+        return duration
+
+    async def take_off(self, height=DEFAULT_HEIGHT, velocity=None):
+        if self._is_flying or self._emergency.is_set():
+            return
+        p0 = self.get_last_position()
+        duration = self._duration((p0[0], p0[1], height), velocity)
+        cf = self._scf.cf
+        # Same controller used by PositionHlCommander in SimpleCF
+        cf.param.set_value('stabilizer.controller', str(PositionHlCommander.CONTROLLER_PID))
+        # The drone is considered flying as soon as the command is sent: if the take off
+        #   is cancelled, land() is still performed.
+        t0 = time.monotonic()
+        self._is_flying = True
+        self._commander = cf.commander
+        cf.high_level_commander.takeoff(height, duration)
+        await self.wait(duration)
+        self._record_startup("take_off", t0)
+        self._set_took_off(True)
+
+    async def go_to_async(self, x, y, z, velocity=None):
+        # Send the setpoint and wait the time necessary to reach it.
+        #   Return False if the command was ignored or the mission was stopped meanwhile.
+        if not self._is_flying:
+            print("[AsyncSimpleCF.go_to_async()] The drone is not flying.")
+            return False
+        if self._safety_target is not None or self._emergency.is_set():
+            print("[AsyncSimpleCF.go_to_async()] Safety override active on drone ", self._uri, ", command ignored.")
+            return False
+        target = np.array([x, y, z])
+        duration = self._send_go_to(target, self._duration(target, velocity))
+        return await self.wait(duration)
+
+    async def land(self, velocity=None):
+        if not self._is_flying:
+            return
+        land_end = self._emergency_land_end
+        if self._emergency.is_set():
+            # Landing already commanded by emergency_land(): wait for its end
+            if land_end is not None and land_end > time.monotonic():
+                await asyncio.sleep(land_end - time.monotonic())
+        else:
+            p0 = self.get_last_position()
+            duration = self._duration((p0[0], p0[1], DEFAULT_LANDING_HEIGHT), velocity)
+            self._scf.cf.high_level_commander.land(DEFAULT_LANDING_HEIGHT, duration)
+            await asyncio.sleep(duration)
+            self._scf.cf.high_level_commander.stop()
+        self._is_flying = False
+        self._set_took_off(False)
+
+    async def wait(self, seconds):
+        # Hover for the given time. Return False if the mission was stopped meanwhile.
+        try:
+            await asyncio.wait_for(self._mission_stop_async.wait(), seconds)
+        except asyncio.TimeoutError:
+            return True
+        return False
+
+    def took_off(self):
+        return self._is_flying
+
+    def stop_drone(self):
+        # Blocking landing, used by the inherited code (LinkSupervisor.run_mission()
+        #   and close()) outside the event loop
+        if self._wait_emergency_land():
+            pass
+        elif self._is_flying and self._scf is not None:
+            p0 = self.get_last_position()
+            duration = self._duration((p0[0], p0[1], DEFAULT_LANDING_HEIGHT), None)
+            self._scf.cf.high_level_commander.land(DEFAULT_LANDING_HEIGHT, duration)
+            time.sleep(duration)
+            self._scf.cf.high_level_commander.stop()
+        self._is_flying = False
+        self._set_took_off(False)
+
+    def emergency_land(self, duration=EMERGENCY_LAND_DURATION):
+        # See SimpleCF.emergency_land(): the waits of the mission are woken up too
+        method = super().emergency_land(duration)
+        if self._mission_stop_async is not None:
+            self._call_in_loop(self._mission_stop_async.set)
+        return method
+
+    '''
+    Execution methods
+    '''
+    async def run(self):
+        '''
+        Coroutine equivalent of SimpleCF.start_drone(): connect, take off, perform the
+        action, land and disconnect.
+        '''
+        try:
+            # A connection failing after the link is open (first log, estimator reset)
+            #   is closed by disconnect_async() too
+            await self.connect_async()
+            await self.take_off()
+            await self._executed_function(self)
+        finally:
+            await self.land()
+            await self.disconnect_async()
+        print("[AsyncSimpleCF.run()] Operation completed.")
+
+    def start_drone(self):
+        asyncio.run(self.run())
+
+    def stop_mission(self):
+        # Ask the action to stop: the drone lands as soon as the action returns.
+        # It can be called from any thread.
+        self._mission_stop.set()
+        if self._mission_stop_async is not None:
+            self._call_in_loop(self._mission_stop_async.set)
+
+    async def _execute_async(self):
+        print("Execute: wait(5)")
+        await self.wait(5)
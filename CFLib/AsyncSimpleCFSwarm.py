@@ -0,0 +1,94 @@
+import asyncio
+import time
+
+from CFLib.AsyncSimpleCF import AsyncSimpleCF
+from CFLib.SwarmState import SwarmState
+
+class AsyncSimpleCFSwarm():
+
+    '''
+    AsyncSimpleCFSwarm class is the asyncio version of SimpleCFSwarm.
+
+    All the drones are driven by a single event loop: each phase (connection, take
+    off, action, landing) is run concurrently on all the drones with asyncio.gather(),
+    so the drones start each phase together without barriers or threads.
+    '''
+
+    def __init__(self, uris, clock=None, toc_cache=None):
+        self._cfs = [AsyncSimpleCF(uri, clock=clock, toc_cache=toc_cache) for uri in uris]
+
+        # Positions and times of all the drones (see SimpleCFSwarm)
+        self._swarm_state = SwarmState(len(self._cfs))
+        for idx, cf in enumerate(self._cfs):
+            cf._swarm_state = self._swarm_state
+            cf._swarm_idx = idx
+
+        # Time (s) spent in each swarm phase, identified by name
+        self.wait_times = {}
+
+    def enable_extpos_all(self):
+        for cf in self._cfs:
+            cf.use_extpos = True
+
+    def assign_execute_method(self, cf_idx, executed_method):
+        self._cfs[cf_idx]._executed_function = executed_method
+
+    def get_snapshot(self):
+        return self._swarm_state.snapshot()
+
+    def get_positions(self):
+        return self._swarm_state.snapshot().pos
+
+    async def _phase(self, name, coroutines):
+        t0 = time.monotonic()
+        results = await asyncio.gather(*coroutines, return_exceptions=True)
+        self.wait_times[name] = time.monotonic() - t0
+        for cf, res in zip(self._cfs, results):
+            if isinstance(res, BaseException):
+                print("[AsyncSimpleCFSwarm._phase()] Drone ", cf._uri, " failed during ", name, ": ")
+                print(res)
+        return results
+
+    async def connect_all(self):
+        return await self._phase("connect", [cf.connect_async() for cf in self._cfs])
+
+    async def take_off_all(self):
+        return await self._phase("take_off", [cf.take_off() for cf in self._cfs])
+
+    async def land_all(self):
+        return await self._phase("land", [cf.land() for cf in self._cfs])
+
+    async def disconnect_all(self):
+        return await self._phase("disconnect", [cf.disconnect_async() for cf in self._cfs])
+
+    async def run(self):
+        '''
+        Connect all the drones, take off, execute the actions and land.
+        If a drone fails to connect, the swarm does not take off.
+        '''
+        results = await self.connect_all()
+        try:
+            if any(isinstance(res, BaseException) for res in results):
+                print("[AsyncSimpleCFSwarm.run()] Not all the drones are connected. Aborting...")
+                return
+            await self.take_off_all()
+            await self._phase("mission", [cf._executed_function(cf) for cf in self._cfs])
+        finally:
+            await self.land_all()
+            await self.disconnect_all()
+        print("[AsyncSimpleCFSwarm.run()] Operation completed.")
+
+    def start_swarm(self):
+        # Blocking: run the whole swarm in a new event loop
+        asyncio.run(self.run())
+
+    def stop_missions(self):
+        # Ask all the actions to stop: the drones land as soon as the actions return.
+        # It can be called from any thread.
+        for cf in self._cfs:
+            cf.stop_mission()
+
+    def kill_all(self):
+        # Land all the drones at once (see SimpleCF.emergency_land()), the actions are
+        #   stopped. It can be called from any thread. Return the command sent to each drone.
+        return {cf._uri: cf.emergency_land() for cf in self._cfs}
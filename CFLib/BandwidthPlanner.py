@@ -0,0 +1,175 @@
+import time
+
+from CFLib.SwarmLifecycle import link_of, radio_of
+
+# Packets per second exchanged by a Crazyradio at each datarate. Each exchange carries an
+#   uplink packet and, in its acknowledgement, a downlink one. Conservative figures for
+#   a Crazyradio PA driven by cflib, the USB round trip being the bottleneck: they can be
+#   overridden with the capacity parameter of BandwidthPlanner.
+LINK_CAPACITY = {"2M": 1000, "1M": 800, "250K": 300}
+# Fraction of the capacity that the configured load can use
+DEFAULT_MAX_UTILIZATION = 0.8
+
+# Limits of the rates reduced by the "scale" policy
+MIN_SETPOINT_RATE = 10
+MIN_EXTPOS_RATE = 10
+MAX_LOG_PERIOD = 500
+# Scaling rounds before giving up (periods are rounded to 10 ms, rates are limited)
+SCALE_ITERATIONS = 5
+
+# Actions on a configuration that exceeds the budget of a radio
+BANDWIDTH_POLICIES = ("warn", "reject", "scale")
+
+class BandwidthPlanner:
+
+    '''
+    BandwidthPlanner class checks that the traffic configured for a swarm fits the
+    radio links.
+
+    The drones sharing a Crazyradio (see radio_of()) share its exchanges: the load of
+    a drone is max(uplink, downlink) exchanges per second, since the logs travel in the
+    acknowledgements of the setpoints and external poses (see SimpleCF.get_radio_load()),
+    and the load of a radio is the sum over its drones. It must stay below
+    max_utilization times the capacity of the radio (LINK_CAPACITY).
+
+    check() applies a policy to the radios over budget:
+        warn:   Print the radios over budget
+        reject: Raise ValueError
+        scale:  Reduce the log, setpoint and extpos rates of their drones by the same
+                factor (within MIN_SETPOINT_RATE, MIN_EXTPOS_RATE and MAX_LOG_PERIOD),
+                raise ValueError if they still do not fit
+    Rates are applied at connection and take off, so check() is invoked before.
+
+    sample() reports the utilization of each radio measured from the packets actually
+    exchanged since the previous call.
+    '''
+
+    def __init__(self, capacity=None, max_utilization=DEFAULT_MAX_UTILIZATION):
+        '''
+        capacity:           {datarate: exchanges per second} overriding LINK_CAPACITY
+
+        max_utilization:    Fraction of the capacity available to the configured load
+        '''
+        self._capacity = dict(LINK_CAPACITY)
+        if capacity is not None:
+            self._capacity.update(capacity)
+        self._max_utilization = max_utilization
+
+        # Packet counters of the previous sample() and its time
+        self._last_counts = None
+        self._last_sample = None
+
+    def capacity(self, datarate):
+        return self._capacity[datarate]
+
+    @staticmethod
+    def _group(cfs):
+        # Drones of each radio
+        radios = {}
+        for cf in cfs:
+            radios.setdefault(radio_of(cf._uri), []).append(cf)
+        return radios
+
+    def plan(self, cfs):
+        '''
+        Load configured on each radio: drones, channels, uplink, downlink and total load
+        (exchanges per second), capacity, budget and utilization. Channels used by more
+        than one radio are reported under 'shared_channels': their air time is shared.
+        '''
+        radios = {}
+        channel_radios = {}
+        for radio, group in self._group(cfs).items():
+            loads = [cf.get_radio_load() for cf in group]
+            links = [link_of(cf._uri) for cf in group]
+            # The slowest datarate of the radio bounds its capacity
+            capacity = min(self.capacity(datarate) for _, _, datarate in links)
+            load = sum(max(l["up"], l["down"]) for l in loads)
+            channels = sorted({channel for _, channel, _ in links if channel is not None})
+            for channel in channels:
+                channel_radios.setdefault(channel, set()).add(radio)
+            radios[radio] = {
+                "drones": [cf._uri for cf in group],
+                "channels": channels,
+                "up": sum(l["up"] for l in loads),
+                "down": sum(l["down"] for l in loads),
+                "load": load,
+                "capacity": capacity,
+                "budget": capacity*self._max_utilization,
+                "utilization": load/capacity,
+            }
+        return {
+            "radios": radios,
+            "over_budget": [radio for radio, entry in radios.items() if entry["load"] > entry["budget"]],
+            "shared_channels": {channel: sorted(group) for channel, group in channel_radios.items() if len(group) > 1},
+        }
+
+    def check(self, cfs, policy="warn"):
+        # Plan the load of cfs and apply policy to the radios over budget. Return the plan.
+        if policy not in BANDWIDTH_POLICIES:
+            raise ValueError("[BandwidthPlanner.check()] Unknown policy " + str(policy))
+        report = self.plan(cfs)
+        if policy == "scale":
+            for _ in range(SCALE_ITERATIONS):
+                if not report["over_budget"]:
+                    break
+                radios = self._group(cfs)
+                for radio in report["over_budget"]:
+                    entry = report["radios"][radio]
+                    factor = entry["budget"]/entry["load"]
+                    for cf in radios[radio]:
+                        self._scale_drone(cf, factor)
+                report = self.plan(cfs)
+
+        if report["over_budget"]:
+            message = "[BandwidthPlanner.check()] Load over budget on " + ", ".join(
+                "%s (%.0f/%.0f packets/s)" % (radio, report["radios"][radio]["load"], report["radios"][radio]["budget"])
+                for radio in report["over_budget"])
+            if policy == "warn":
+                print(message)
+            else:
+                raise ValueError(message)
+        if report["shared_channels"]:
+            print("[BandwidthPlanner.check()] Channels shared by several radios: ", report["shared_channels"])
+        return report
+
+    @staticmethod
+    def _scale_drone(cf, factor):
+        # Reduce the rates of cf by factor (< 1)
+        ts = int(-(-cf._ts/factor//10))*10
+        cf._ts = min(ts, max(MAX_LOG_PERIOD, cf._ts))
+        cf._log_planner.scale_periods(1.0/factor, MAX_LOG_PERIOD)
+        if not cf.use_phlc:
+            cf._setpoint_rate = max(cf._setpoint_rate*factor, min(MIN_SETPOINT_RATE, cf._setpoint_rate))
+        if cf.use_extpos:
+            cf.extpos_rate = max(cf.extpos_rate*factor, min(MIN_EXTPOS_RATE, cf.extpos_rate))
+
+    def sample(self, cfs):
+        '''
+        Utilization of each radio measured since the previous call: packets per second
+        of each kind (log, setpoint, extpos), exchanges per second (load), capacity and
+        utilization. The first call just starts the measure and returns None.
+        '''
+        now = time.monotonic()
+        counts = {cf._uri: cf.get_packet_counts() for cf in cfs}
+        last_counts, last_sample = self._last_counts, self._last_sample
+        self._last_counts, self._last_sample = counts, now
+        if last_counts is None or now <= last_sample:
+            return None
+
+        dt = now - last_sample
+        radios = {}
+        for radio, group in self._group(cfs).items():
+            entry = {"drones": len(group), "log": 0.0, "setpoint": 0.0, "extpos": 0.0, "load": 0.0}
+            for cf in group:
+                previous = last_counts.get(cf._uri)
+                # Counters restart on reconnection (new forwarder)
+                rates = {kind: max(n - (previous[kind] if previous is not None else 0), 0)/dt
+                         for kind, n in counts[cf._uri].items()}
+                for kind, rate in rates.items():
+                    entry[kind] += rate
+                entry["load"] += max(rates["setpoint"] + rates["extpos"], rates["log"])
+            capacity = min(self.capacity(link_of(cf._uri)[2]) for cf in group)
+            entry["capacity"] = capacity
+            entry["utilization"] = entry["load"]/capacity
+            radios[radio] = entry
+        return radios
@@ -0,0 +1,130 @@
+import numpy as np
+
+# Forgetting factor of the recursive least squares: values closer to 1 average more
+#   samples, smaller values follow the drift faster
+DEFAULT_FORGETTING = 0.999
+# Number of samples used to estimate the minimum transport latency
+DEFAULT_LATENCY_WINDOW = 200
+# A tick earlier than the last one by more than this time (s) means that the clock of
+#   the source restarted (reboot, counter wrap): smaller steps back are packets of
+#   different blocks received out of order
+TICK_RESET_TOLERANCE = 0.1
+# Host time returned for the ticks that cannot be mapped (no packet received yet)
+INVALID_TIME_NS = np.iinfo(np.int64).min
+
+class ClockSync:
+
+    '''
+    ClockSync class estimates the relation between the clock of a source (e.g. the ms
+    tick attached to each log packet of a drone) and the host clock (see HostClock):
+
+        host_time = offset + drift*tick*tick_period
+
+    The model is fitted online with recursive least squares (RLS), one update for each
+    packet, using the arrival time of the packet on the host. Host times are int64 ns.
+
+    Arrival times are delayed by the radio link and by the callback queueing, so the
+    fitted line lies above the true one by the mean delay. The residuals of the packets
+    that arrived fastest give the minimum delay: the line is shifted down by the
+    minimum residual over the last latency_window packets, so that corrected times are
+    close to the time at which the drone actually sampled the data.
+
+    When the tick goes back (the drone rebooted, or its 32-bit ms counter wrapped) the
+    model is reset and fitted again from that packet.
+    '''
+
+    def __init__(self, tick_period=1e-3, forgetting=DEFAULT_FORGETTING, latency_window=DEFAULT_LATENCY_WINDOW):
+        '''
+        tick_period:    Nominal period (s) of a tick of the source
+
+        forgetting:     Forgetting factor of the RLS, in (0, 1]
+
+        latency_window: Number of packets used to estimate the minimum delay
+        '''
+        self._tick_period = tick_period
+        self._forgetting = forgetting
+        self._residuals = np.zeros(latency_window)
+        self.reset()
+
+    def reset(self):
+        # Forget the model, e.g. when the drone is connected again (its tick restarts)
+        # The offset is the host time of the reference tick, moved to the last packet at
+        #   each update: regressors stay small and the problem well conditioned.
+        #   Host times are fitted in seconds from _host_ref, the arrival time (ns) of the
+        #   first packet, so that float64 keeps a ns resolution.
+        self._tick_ref = None
+        self._host_ref = 0
+        # Parameters [offset, drift] and their covariance
+        self._theta = np.zeros(2)
+        self._P = np.eye(2)*1e6
+        self._n = 0
+        self._residuals[:] = 0.0
+        self._min_residual = 0.0
+
+    @property
+    def n_samples(self):
+        return self._n
+
+    def _regressor(self, tick):
+        # Nominal seconds from the reference tick
+        return (np.asarray(tick, dtype=np.float64) - self._tick_ref)*self._tick_period
+
+    def _move_reference(self, tick):
+        # Express the model with respect to a new reference tick
+        dt = self._regressor(tick)
+        T = np.array([[1.0, dt], [0.0, 1.0]])
+        self._theta = T @ self._theta
+        self._P = T @ self._P @ T.T
+        self._tick_ref = tick
+
+    def update(self, tick, host_ns):
+        '''
+        Add a packet with the given tick, received at host_ns (ns).
+        Return the corrected host time (ns) of the packet.
+        '''
+        if self._tick_ref is not None and self._regressor(tick) < -TICK_RESET_TOLERANCE:
+            self.reset()
+        if self._tick_ref is None:
+            # Start from the first packet with the nominal drift
+            self._tick_ref = tick
+            self._host_ref = int(host_ns)
+            self._theta = np.array([0.0, 1.0])
+        self._move_reference(tick)
+        host_time = (int(host_ns) - self._host_ref)/1e9
+
+        # With the reference on the new packet the regressor is [1, 0]
+        phi = np.array([1.0, 0.0])
+        residual = host_time - self._theta[0]
+        # Gain and covariance update
+        P_phi = self._P @ phi
+        gain = P_phi/(self._forgetting + phi @ P_phi)
+        self._theta = self._theta + gain*residual
+        self._P = (self._P - np.outer(gain, P_phi))/self._forgetting
+        self._P = (self._P + self._P.T)/2
+
+        # Residual with respect to the updated line: the minimum one is the fastest packet
+        self._residuals[self._n % len(self._residuals)] = host_time - self._theta[0]
+        self._n += 1
+        self._min_residual = np.min(self._residuals[:min(self._n, len(self._residuals))])
+
+        return self.to_host(tick)
+
+    def to_host(self, ticks):
+        '''
+        Convert ticks (scalar or array) in host times (int64 ns).
+        Before the first packet, times are INVALID_TIME_NS (see HostClock).
+        '''
+        if self._tick_ref is None:
+            return np.full(np.shape(ticks), INVALID_TIME_NS, dtype=np.int64) if np.ndim(ticks) > 0 else None
+        host = self._theta[0] + self._theta[1]*self._regressor(ticks) + self._min_residual
+        host_ns = self._host_ref + np.rint(host*1e9).astype(np.int64)
+        return host_ns if np.ndim(ticks) > 0 else int(host_ns)
+
+    def get_stats(self):
+        return {
+            "samples": self._n,
+            "offset_ns": self._host_ref + int(round(self._theta[0]*1e9)),
+            "reference_tick": None if self._tick_ref is None else int(self._tick_ref),
+            "drift": float(self._theta[1]),
+            "min_latency_correction": float(self._min_residual),
+        }
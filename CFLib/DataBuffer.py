@@ -0,0 +1,91 @@
+import numpy as np
+
+# Default number of samples preallocated by a DataBuffer
+DEFAULT_CHUNK_SIZE = 1024
+
+class DataBuffer:
+
+    '''
+    DataBuffer class stores a stream of samples in preallocated NumPy memory.
+
+    Samples are stored along the last axis of the internal array, so a buffer of
+    samples with shape (3,) is seen as a (3, N) array, as the position logs were
+    stored so far.
+
+    It tries to:
+        - Append a sample in amortized O(1), instead of copying the whole history
+          at each new sample as np.append does
+        - Optionally keep only the last max_len samples (bounded memory)
+        - Expose the stored samples as a view, without copying them
+    '''
+
+    def __init__(self, shape=(), dtype=np.float64, chunk_size=DEFAULT_CHUNK_SIZE, max_len=None):
+        '''
+        Here is a brief description of the parameters required to create a DataBuffer object.
+
+        shape:      Shape of a single sample, e.g. (3,) for a position
+
+        dtype:      NumPy dtype of the samples (structured dtypes are supported)
+
+        chunk_size: Number of samples initially preallocated
+
+        max_len:    Maximum number of samples retained. If None, the buffer grows
+                    without bounds
+        '''
+        if np.isscalar(shape):
+            shape = (shape,)
+        self._shape = tuple(shape)
+        self._dtype = np.dtype(dtype)
+        self._max_len = max_len
+
+        if max_len is None:
+            capacity = chunk_size
+        else:
+            # Keep room for max_len more samples: the retained window is moved back
+            # to the beginning of a new array once every max_len appends.
+            capacity = 2*max_len
+
+        # The state is stored as a single tuple (data, start, end), so that it is
+        # replaced atomically and a reader never sees indices not matching the array.
+        data = np.empty(self._shape + (capacity,), dtype=self._dtype)
+        self._state = (data, 0, 0)
+
+    def __len__(self):
+        _, start, end = self._state
+        return end - start
+
+    def append(self, sample):
+        data, start, end = self._state
+        if end == data.shape[-1]:
+            data, start, end = self._make_room(data, start, end)
+        data[..., end] = sample
+        end += 1
+        if self._max_len is not None and end - start > self._max_len:
+            start = end - self._max_len
+        self._state = (data, start, end)
+
+    def _make_room(self, data, start, end):
+        # A new array is allocated instead of moving data in place: views already
+        # returned to the readers keep pointing to consistent data.
+        if self._max_len is None:
+            new_data = np.empty(self._shape + (2*data.shape[-1],), dtype=self._dtype)
+        else:
+            new_data = np.empty_like(data)
+        new_data[..., :end-start] = data[..., start:end]
+        return new_data, 0, end-start
+
+    def view(self):
+        # Return the stored samples, without copying them
+        data, start, end = self._state
+        return data[..., start:end]
+
+    def last(self):
+        # Return the last stored sample
+        data, start, end = self._state
+        if end == start:
+            raise IndexError("[DataBuffer.last()] The buffer is empty.")
+        return data[..., end-1]
+
+    def clear(self):
+        data, _, _ = self._state
+        self._state = (np.empty_like(data), 0, 0)
@@ -0,0 +1,105 @@
+import time
+
+from threading import Lock
+
+# Default frequency (Hz) of the external poses sent to a drone
+DEFAULT_EXTPOS_RATE = 50
+# Poses older than this (s) when they should be sent are dropped
+DEFAULT_EXTPOS_MAX_AGE = 0.1
+
+class ExtposForwarder:
+
+    '''
+    ExtposForwarder class forwards external poses (e.g. OptiTrack) to a drone at a fixed rate.
+
+    Poses are pushed by the producer (the NatNet receiving thread) at its own rate, but just
+    the newest one is kept: the others are overwritten (coalesced) instead of being queued
+    on the radio link. A RateScheduler sends the newest pose at the configured rate; if it
+    is older than max_age it is dropped instead.
+
+    Counters:
+        received:   Poses pushed by the producer
+        sent:       Poses sent to the drone
+        coalesced:  Poses overwritten by a newer one before being sent
+        dropped:    Poses discarded because older than max_age
+        age:        Time (s) between push and send of the sent poses (mean and max)
+    '''
+
+    def __init__(self, extpos, scheduler, key, rate=DEFAULT_EXTPOS_RATE, max_age=DEFAULT_EXTPOS_MAX_AGE):
+        '''
+        extpos:     cflib Extpos object of the drone
+
+        scheduler:  RateScheduler used to send the poses
+
+        key:        Key identifying the forwarder in the scheduler
+
+        rate:       Frequency (Hz) of the poses sent to the drone
+
+        max_age:    Maximum age (s) of a pose when it is sent
+        '''
+        self._extpos = extpos
+        self._scheduler = scheduler
+        self._key = key
+        self._rate = rate
+        self._max_age = max_age
+
+        # Newest pose: (pos, quat, push time), None once it has been sent
+        self._latest = None
+        self._lock = Lock()
+
+        # Counters
+        self._received = 0
+        self._sent = 0
+        self._coalesced = 0
+        self._dropped = 0
+        self._age_sum = 0.0
+        self._age_max = 0.0
+
+    def start(self):
+        self._scheduler.add_task(self._key, self._send_latest, self._rate)
+
+    def stop(self):
+        self._scheduler.remove_task(self._key)
+
+    def push(self, pos, quat=None):
+        # Store the newest pose. quat, if given, is (qx, qy, qz, qw).
+        pose = (pos, quat, time.monotonic())
+        with self._lock:
+            if self._latest is not None:
+                self._coalesced += 1
+            self._latest = pose
+            self._received += 1
+
+    def _send_latest(self):
+        # Called by the scheduler at the configured rate
+        with self._lock:
+            pose = self._latest
+            self._latest = None
+        if pose is None:
+            return
+
+        pos, quat, t_push = pose
+        age = time.monotonic() - t_push
+        if age > self._max_age:
+            self._dropped += 1
+            return
+
+        if quat is None:
+            self._extpos.send_extpos(pos[0], pos[1], pos[2])
+        else:
+            self._extpos.send_extpose(pos[0], pos[1], pos[2], quat[0], quat[1], quat[2], quat[3])
+
+        self._sent += 1
+        self._age_sum += age
+        self._age_max = max(self._age_max, age)
+
+    def get_stats(self):
+        return {
+            "rate": self._rate,
+            "received": self._received,
+            "sent": self._sent,
+            "coalesced": self._coalesced,
+            "dropped": self._dropped,
+            "age_mean": self._age_sum/self._sent if self._sent > 0 else 0.0,
+            "age_max": self._age_max,
+        }
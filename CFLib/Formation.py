@@ -0,0 +1,71 @@
+import numpy as np
+
+from scipy.optimize import linear_sum_assignment
+from scipy.spatial.distance import cdist
+
+# Default distance (m) between neighbouring slots and default height (m) of the formations
+DEFAULT_SPACING = 0.5
+DEFAULT_FORMATION_HEIGHT = 0.5
+
+class Formation:
+
+    '''
+    Formation class describes a set of slots (target positions) that a swarm can occupy,
+    and assigns the drones to the slots.
+
+    The assignment minimizes the total distance flown by the swarm
+    (scipy.optimize.linear_sum_assignment on the (N, M) matrix of the distances between
+    drones and slots). There can be more slots than drones: the extra slots stay empty.
+    '''
+
+    def __init__(self, slots):
+        '''
+        slots:  (M, 3) array of target positions
+        '''
+        self.slots = np.atleast_2d(np.asarray(slots, dtype=np.float64))
+        if self.slots.shape[1] != 3:
+            raise ValueError("[Formation] Slots must be an (M, 3) array.")
+
+    def __len__(self):
+        return len(self.slots)
+
+    @classmethod
+    def grid(cls, n, spacing=DEFAULT_SPACING, height=DEFAULT_FORMATION_HEIGHT, center=(0.0, 0.0), cols=None):
+        '''
+        n slots on a horizontal grid with cols columns (square by default), centered in center.
+        '''
+        if cols is None:
+            cols = int(np.ceil(np.sqrt(n)))
+        rows = int(np.ceil(n/cols))
+        k = np.arange(n)
+        x = (k % cols - (cols - 1)/2)*spacing + center[0]
+        y = (k // cols - (rows - 1)/2)*spacing + center[1]
+        return cls(np.column_stack((x, y, np.full(n, height))))
+
+    @classmethod
+    def circle(cls, n, radius, height=DEFAULT_FORMATION_HEIGHT, center=(0.0, 0.0), phase=0.0):
+        '''
+        n slots evenly spaced on a horizontal circle, the first one at angle phase (rad).
+        '''
+        angle = phase + 2*np.pi*np.arange(n)/n
+        x = center[0] + radius*np.cos(angle)
+        y = center[1] + radius*np.sin(angle)
+        return cls(np.column_stack((x, y, np.full(n, height))))
+
+    def translated(self, offset):
+        return Formation(self.slots + np.asarray(offset, dtype=np.float64))
+
+    def assign(self, pos):
+        '''
+        Assign the drones, at positions pos ((N, 3) array), to the slots.
+        Return the (N,) array with the slot of each drone and the total distance.
+        '''
+        pos = np.atleast_2d(np.asarray(pos, dtype=np.float64))
+        if len(pos) > len(self.slots):
+            raise ValueError("[Formation.assign()] " + str(len(pos)) + " drones, but just "
+                             + str(len(self.slots)) + " slots.")
+        cost = cdist(pos, self.slots)
+        rows, cols = linear_sum_assignment(cost)
+        slot_of = np.empty(len(pos), dtype=np.intp)
+        slot_of[rows] = cols
+        return slot_of, float(cost[rows, cols].sum())
@@ -0,0 +1,91 @@
+import time
+import numpy as np
+
+from threading import Lock
+
+from CFLib.ClockSync import ClockSync, INVALID_TIME_NS
+
+# Period (s) of the clocks mapped on the host timeline
+#   Crazyflie log timestamps are ms ticks
+DRONE_TICK_PERIOD = 1e-3
+#   NatNet stamp_camera_mid_exposure is a tick of the high resolution clock of the Motive
+#   machine (QueryPerformanceCounter, 10 MHz on recent Windows). The drift estimated by
+#   ClockSync absorbs a different frequency.
+CAMERA_TICK_PERIOD = 1e-7
+
+class HostClock:
+
+    '''
+    HostClock class is the timebase shared by all the components of a session
+    (SimpleCF, OptitrackClient, exports and plots).
+
+    Host times are int64 nanoseconds elapsed from the creation of the clock, read from
+    time.monotonic_ns(): they do not jump when the wall clock is adjusted (NTP) and
+    keep a ns resolution on sessions of any length.
+
+    Components with their own clock (the drone ticks, the NatNet camera stamps) register
+    with the clock and receive a ClockSync, which maps their ticks onto the host timeline.
+    The clock shared by default is returned by HostClock.get_default(), so objects
+    created in the same process agree on the time origin without passing it around.
+    '''
+
+    _default = None
+    _default_lock = Lock()
+
+    def __init__(self, origin_ns=None):
+        # origin_ns: time.monotonic_ns() taken as time origin. Clocks of different processes
+        #   created with the same origin_ns share the timeline (monotonic_ns is system-wide)
+        self._origin_ns = time.monotonic_ns() if origin_ns is None else origin_ns
+
+        # ClockSync of each registered clock source, identified by name
+        self._sources = {}
+        self._lock = Lock()
+
+    @classmethod
+    def get_default(cls):
+        # Clock shared by all the components that do not receive one explicitly
+        with cls._default_lock:
+            if cls._default is None:
+                cls._default = cls()
+            return cls._default
+
+    @property
+    def origin_ns(self):
+        # time.monotonic_ns() at the creation of the clock
+        return self._origin_ns
+
+    def now_ns(self):
+        # Current host time (ns)
+        return time.monotonic_ns() - self._origin_ns
+
+    def register(self, name, tick_period):
+        '''
+        Register a clock source and return the ClockSync mapping its ticks onto the
+        host timeline. A source registered again (e.g. a drone started in a new
+        SimpleCF object) replaces the previous one.
+
+        name:           Name of the source, e.g. the drone URI
+
+        tick_period:    Nominal period (s) of a tick of the source
+        '''
+        sync = ClockSync(tick_period=tick_period)
+        with self._lock:
+            self._sources[name] = sync
+        return sync
+
+    def unregister(self, name):
+        with self._lock:
+            self._sources.pop(name, None)
+
+    def get_stats(self):
+        # Offset and drift of each registered source (see ClockSync.get_stats())
+        with self._lock:
+            sources = dict(self._sources)
+        return {name: sync.get_stats() for name, sync in sources.items()}
+
+    @staticmethod
+    def to_seconds(t_ns):
+        # Convert host times (ns, scalar or array) in seconds, e.g. for plots and exports
+        if np.ndim(t_ns) == 0:
+            return t_ns/1e9
+        return np.asarray(t_ns, dtype=np.int64)/1e9
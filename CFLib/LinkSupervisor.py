@@ -0,0 +1,243 @@
+import time
+import numpy as np
+
+from threading import Condition, Event, Lock, Thread
+
+# Reconnection backoff: the n-th attempt waits min(BACKOFF_BASE*2**n, BACKOFF_MAX) seconds
+DEFAULT_BACKOFF_BASE = 0.5
+DEFAULT_BACKOFF_MAX = 8.0
+
+class LinkSupervisor:
+
+    '''
+    LinkSupervisor class keeps a SimpleCF connected across missions.
+
+    connect() opens the link once (cold start: connection, TOC, logs, estimator reset),
+    then run_mission() executes missions on the open link (warm start): a mission that
+    ends without landing leaves the drone hovering, and the next one starts from the air.
+
+    When the link drops, it is opened again in background with exponential backoff.
+    A drone reconnected while flying keeps its estimator, commanders and external
+    position forwarding are attached to the new link. The high level commander
+    (PositionHlCommander) keeps the drone hovering on board meanwhile, while with
+    Commander the on-board watchdog stops the drone if the link stays down for long.
+
+    get_stats() reports link-up times, link losses, reconnections and the time needed
+    to start a mission, cold (connection included) or warm.
+    '''
+
+    def __init__(self, cf, backoff_base=DEFAULT_BACKOFF_BASE, backoff_max=DEFAULT_BACKOFF_MAX, max_attempts=None):
+        '''
+        cf:             SimpleCF supervised
+
+        backoff_base:   Wait (s) before the first reconnection attempt, doubled at each failure
+
+        backoff_max:    Maximum wait (s) between two attempts
+
+        max_attempts:   Attempts before giving up. If None, it never gives up
+        '''
+        self._cf = cf
+        self._backoff_base = backoff_base
+        self._backoff_max = backoff_max
+        self._max_attempts = max_attempts
+
+        # _up is set while the link is open, _closing once close() is invoked
+        self._up = Event()
+        self._closing = Event()
+        self._state_lock = Lock()
+        # Notified when the link goes up or down, or a reconnection ends
+        self._state_changed = Condition(self._state_lock)
+        # Missions are executed one at a time
+        self._mission_lock = Lock()
+        self._reconnect_thread = None
+        # Set while the link is being opened again in background
+        self._reconnecting = False
+
+        # Statistics
+        self._link_up_at = None
+        self._uptime_total = 0.0
+        self._down_at = None
+        self._downtime_total = 0.0
+        self._link_losses = 0
+        self._reconnects = 0
+        self._reconnect_failures = 0
+        self._connect_time = None
+        # The first mission after connect() is a cold start
+        self._cold_pending = True
+        self._mission_starts = {"cold": [], "warm": []}
+
+    @property
+    def is_up(self):
+        return self._up.is_set()
+
+    def connect(self):
+        # Cold start: open the link, start the logs and reset the estimator
+        if self._up.is_set():
+            return True
+        cf = self._cf
+        self._closing.clear()
+        t0 = time.monotonic()
+        scf = cf._connect()
+        if scf is None:
+            return False
+        if not cf._prepare(scf):
+            cf._disconnect(scf)
+            return False
+        if cf.use_extpos:
+            cf._enable_ext_pos(scf.cf)
+        self._connect_time = time.monotonic() - t0
+        self._cold_pending = True
+        self._set_up()
+        return True
+
+    def _set_up(self):
+        with self._state_lock:
+            now = time.monotonic()
+            if self._down_at is not None:
+                self._downtime_total += now - self._down_at
+                self._down_at = None
+            self._link_up_at = now
+            self._up.set()
+            self._state_changed.notify_all()
+
+    def _set_down(self, reconnect=False):
+        # Return False if the link was already down
+        with self._state_lock:
+            if not self._up.is_set():
+                return False
+            now = time.monotonic()
+            self._uptime_total += now - self._link_up_at
+            self._link_up_at = None
+            self._down_at = now
+            self._up.clear()
+            self._reconnecting = reconnect
+            self._state_changed.notify_all()
+            return True
+
+    def _wait_up(self, timeout=None):
+        # Wait for the link to be up. Without a reconnection in progress it will not
+        #   come up, so return False at once.
+        with self._state_changed:
+            self._state_changed.wait_for(lambda: self._up.is_set() or not self._reconnecting, timeout)
+            return self._up.is_set()
+
+    def on_link_lost(self):
+        # Called by cflib when the link drops unexpectedly
+        if self._closing.is_set() or not self._set_down(reconnect=True):
+            return
+        self._link_losses += 1
+        # Stop forwarding poses on the dead link
+        self._cf._disable_ext_pos()
+        self._reconnect_thread = Thread(target=self._reconnect, name="LinkSupervisor_" + self._cf._uri, daemon=True)
+        self._reconnect_thread.start()
+
+    def _reconnect(self):
+        try:
+            self._reconnect_loop()
+        finally:
+            with self._state_changed:
+                self._reconnecting = False
+                self._state_changed.notify_all()
+
+    def _reconnect_loop(self):
+        cf = self._cf
+        old_scf = cf._scf
+        if old_scf is not None:
+            cf._disconnect(old_scf)
+
+        attempt = 0
+        while True:
+            delay = min(self._backoff_base*2**attempt, self._backoff_max)
+            if self._closing.wait(delay):
+                return
+            attempt += 1
+            scf = cf._connect()
+            if scf is not None:
+                # A flying drone keeps its estimate
+                if cf._prepare(scf, reset_estimator=not cf._took_off_event.is_set()):
+                    cf._rebind_link(scf)
+                    self._reconnects += 1
+                    self._set_up()
+                    print("[LinkSupervisor] Drone ", cf._uri, " reconnected after ", attempt, " attempts.")
+                    return
+                cf._disconnect(scf)
+            self._reconnect_failures += 1
+            if self._max_attempts is not None and attempt >= self._max_attempts:
+                print("[LinkSupervisor] Drone ", cf._uri, " not reconnected after ", attempt, " attempts. Giving up.")
+                return
+
+    def run_mission(self, executed_function=None, land=True, timeout=None):
+        '''
+        Execute a mission on the open link. Wait up to timeout seconds for the link to be
+        up (e.g. while reconnecting). Return False if the link is not available.
+        '''
+        cf = self._cf
+        if not self._wait_up(timeout):
+            print("[LinkSupervisor.run_mission()] Link with the drone ", cf._uri, " not available.")
+            return False
+        if executed_function is None:
+            executed_function = cf._executed_function
+
+        with self._mission_lock:
+            t0 = time.monotonic()
+            cf._mission_stop.clear()
+            cf._emergency.clear()
+            cf._clear_safety_override()
+            if not cf._took_off_event.is_set():
+                if cf.use_phlc:
+                    cf._init_phlcommander()
+                else:
+                    cf._init_commander()
+
+            # Time from the request to the beginning of the mission
+            start_time = time.monotonic() - t0
+            if self._cold_pending:
+                self._mission_starts["cold"].append(start_time + self._connect_time)
+                self._cold_pending = False
+            else:
+                self._mission_starts["warm"].append(start_time)
+
+            try:
+                executed_function(cf)
+            except Exception as err:
+                print("[LinkSupervisor.run_mission()] An error occurred during the mission: ")
+                print(err)
+            if land:
+                cf.stop_drone()
+        return True
+
+    def close(self):
+        # Land, if flying, and close the link. No reconnection is attempted afterwards.
+        cf = self._cf
+        self._closing.set()
+        with self._mission_lock:
+            if self._up.is_set() and cf._took_off_event.is_set():
+                cf.stop_drone()
+            cf._disable_ext_pos()
+            if self._up.is_set():
+                cf._stop_logs()
+            self._set_down()
+            if cf._scf is not None:
+                cf._disconnect(cf._scf)
+        if cf._own_setpoint_scheduler:
+            cf._setpoint_scheduler.stop()
+
+    def get_stats(self):
+        with self._state_lock:
+            now = time.monotonic()
+            uptime = now - self._link_up_at if self._link_up_at is not None else 0.0
+            downtime = now - self._down_at if self._down_at is not None and not self._closing.is_set() else 0.0
+            stats = {
+                "state": "closed" if self._closing.is_set() else ("up" if self._up.is_set() else "reconnecting"),
+                "link_up_time": uptime,
+                "link_up_total": self._uptime_total + uptime,
+                "downtime_total": self._downtime_total + downtime,
+                "link_losses": self._link_losses,
+                "reconnects": self._reconnects,
+                "reconnect_failures": self._reconnect_failures,
+                "connect_time": self._connect_time,
+            }
+        for kind, times in self._mission_starts.items():
+            stats[kind + "_starts"] = len(times)
+            stats[kind + "_start_mean"] = float(np.mean(times)) if times else None
+        return stats
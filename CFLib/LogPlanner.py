@@ -0,0 +1,138 @@
+from cflib.crazyflie.log import LogConfig, LogTocElement
+
+class LogPlanner:
+
+    '''
+    LogPlanner class packs the log variables requested by the user into log blocks.
+
+    A log block (LogConfig) is limited by the size of a CRTP packet (LogConfig.MAX_LEN
+    bytes of data), so just a few variables fit in a single block. The planner:
+        - Groups the variables by period: each block has its own period
+        - Fetches each variable with the type it is stored with on board, unless a
+          fetch type is given, so no byte is wasted
+        - Packs each group with a first-fit decreasing strategy, filling also the free
+          space of the blocks already configured (e.g. the default position block),
+          so that the number of blocks is minimized
+    '''
+
+    def __init__(self):
+        # Requested variables: {name: (fetch_as, period_in_ms)}
+        self._variables = {}
+
+    def add_variable(self, name, fetch_as=None, period_in_ms=None):
+        '''
+        name:           Complete name of the variable (group.name)
+
+        fetch_as:       Type used to fetch the variable (e.g. 'float', 'FP16', 'uint8_t').
+                        If None, the type stored on board is used
+
+        period_in_ms:   Log period of the variable. If None, the default period is used
+        '''
+        self._variables[name] = (fetch_as, period_in_ms)
+
+    def __len__(self):
+        return len(self._variables)
+
+    @staticmethod
+    def type_size(fetch_as):
+        return LogTocElement.get_size_from_id(LogTocElement.get_id_from_cstring(fetch_as))
+
+    @staticmethod
+    def block_size(log_conf):
+        # Bytes already used by a log configuration
+        return sum(LogTocElement.get_size_from_id(var.fetch_as) for var in log_conf.variables)
+
+    def _fetch_type(self, name, fetch_as, toc):
+        if fetch_as is not None:
+            return fetch_as
+        element = toc.get_element_by_complete_name(name) if toc is not None else None
+        if element is None:
+            raise ValueError("[LogPlanner.plan()] Unknown type of the log variable " + name)
+        return element.ctype
+
+    def estimate_blocks(self, default_period, base_used=None, default_size=4):
+        '''
+        Estimate the blocks created by plan() before the connection, when the TOC is not
+        known: the variables without fetch type count default_size bytes.
+
+        base_used:  {period: bytes already used} of the base blocks
+
+        Return {period: number of new blocks}.
+        '''
+        base_used = base_used if base_used is not None else {}
+        groups = {}
+        for fetch_as, period in self._variables.values():
+            if period is None:
+                period = default_period
+            size = self.type_size(fetch_as) if fetch_as is not None else default_size
+            groups.setdefault(period, []).append(size)
+
+        blocks = {}
+        for period, sizes in groups.items():
+            bins = [LogConfig.MAX_LEN - base_used[period]] if period in base_used else []
+            n_base = len(bins)
+            for size in sorted(sizes, reverse=True):
+                for k, free in enumerate(bins):
+                    if free >= size:
+                        bins[k] -= size
+                        break
+                else:
+                    bins.append(LogConfig.MAX_LEN - size)
+            blocks[period] = len(bins) - n_base
+        return blocks
+
+    def scale_periods(self, factor, max_period=None):
+        # Multiply the periods given explicitly by factor, rounded up to the 10 ms
+        #   resolution of the log blocks and limited to max_period
+        for name, (fetch_as, period) in self._variables.items():
+            if period is None:
+                continue
+            period = int(-(-period*factor//10))*10
+            if max_period is not None:
+                period = min(period, max_period)
+            self._variables[name] = (fetch_as, period)
+
+    def plan(self, default_period, toc=None, base_blocks=(), name="cf_log_block"):
+        '''
+        Pack the requested variables into log blocks.
+
+        default_period: Period (ms) of the variables added without period
+
+        toc:            Log TOC of the drone (cf.log.toc), used to find the types
+                        of the variables added without fetch type
+
+        base_blocks:    Log configurations already in use: variables are added to
+                        them if they have the same period and enough free space
+
+        Return the list of the new LogConfig objects (base blocks are not included).
+        '''
+        # Group by period, with the size of each variable
+        groups = {}
+        for var_name, (fetch_as, period) in self._variables.items():
+            if period is None:
+                period = default_period
+            fetch_as = self._fetch_type(var_name, fetch_as, toc)
+            groups.setdefault(period, []).append((self.type_size(fetch_as), var_name, fetch_as))
+
+        new_blocks = []
+        for period, variables in groups.items():
+            # Bins: [free bytes, LogConfig], starting from the base blocks with the same period
+            bins = [[LogConfig.MAX_LEN - self.block_size(block), block]
+                    for block in base_blocks if block.period_in_ms == period]
+
+            # First-fit decreasing
+            variables.sort(key=lambda v: v[0], reverse=True)
+            for size, var_name, fetch_as in variables:
+                if size > LogConfig.MAX_LEN:
+                    raise ValueError("[LogPlanner.plan()] The log variable " + var_name + " does not fit a log block")
+                for b in bins:
+                    if b[0] >= size:
+                        break
+                else:
+                    block = LogConfig(name="%s_%d_%d" % (name, period, len(new_blocks)), period_in_ms=period)
+                    new_blocks.append(block)
+                    b = [LogConfig.MAX_LEN, block]
+                    bins.append(b)
+                b[1].add_variable(var_name, fetch_as)
+                b[0] -= size
+        return new_blocks
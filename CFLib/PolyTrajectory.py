@@ -0,0 +1,110 @@
+import numpy as np
+from math import factorial
+
+from scipy.interpolate import make_interp_spline
+
+from cflib.crazyflie.mem import Poly4D
+
+# Polynomial degree supported by the Crazyflie trajectory memory (8 coefficients)
+POLY_DEGREE = 7
+
+# Bytes used by a single Poly4D in the trajectory memory: 4 polynomials of 8 floats + duration
+POLY4D_SIZE = 4*8*4 + 4
+
+class PolyTrajectory:
+
+    '''
+    PolyTrajectory class describes a piecewise polynomial trajectory, in the format
+    executed on board by the Crazyflie high level commander.
+
+    A trajectory is fitted on a list of waypoints with timing: the resulting curve
+    passes through all the waypoints at the given times, with zero velocity,
+    acceleration and jerk at the first and last waypoint.
+
+    Each piece i has a duration and, for x, y, z and yaw, 8 coefficients in ascending
+    order: p(t) = c[0] + c[1]*t + ... + c[7]*t^7, with t in [0, duration].
+    '''
+
+    def __init__(self, durations, coeffs):
+        '''
+        durations:  (n_pieces,) array, duration of each piece
+
+        coeffs:     (n_pieces, 4, 8) array, coefficients of x, y, z and yaw of each piece
+        '''
+        self.durations = np.asarray(durations, dtype=np.float64)
+        self.coeffs = np.asarray(coeffs, dtype=np.float64)
+
+    @property
+    def duration(self):
+        return float(np.sum(self.durations))
+
+    @property
+    def n_pieces(self):
+        return len(self.durations)
+
+    @property
+    def size(self):
+        # Bytes used in the trajectory memory
+        return self.n_pieces*POLY4D_SIZE
+
+    @classmethod
+    def fit(cls, waypoints, times):
+        '''
+        waypoints:  (N, 3) array of positions
+
+        times:      (N,) array of increasing times at which the waypoints are reached
+        '''
+        return cls.fit_many(np.asarray(waypoints)[np.newaxis], times)[0]
+
+    @classmethod
+    def fit_many(cls, waypoints, times):
+        '''
+        Fit one trajectory for each drone with a single vectorized computation.
+
+        waypoints:  (D, N, 3) array: N positions for each of the D drones
+
+        times:      (N,) array of increasing times, shared by all the drones
+        '''
+        waypoints = np.asarray(waypoints, dtype=np.float64)
+        times = np.asarray(times, dtype=np.float64)
+        n_drones, n_points, _ = waypoints.shape
+        if n_points < 2 or len(times) != n_points:
+            raise ValueError("[PolyTrajectory.fit_many()] At least two waypoints, each one with its time, are required.")
+
+        # Spline of degree 7 with zero velocity, acceleration and jerk at both ends.
+        # Waypoints of all the drones are interpolated together along axis 0.
+        zero = np.zeros((n_drones, 3))
+        bc = [(1, zero), (2, zero), (3, zero)]
+        spline = make_interp_spline(times, np.moveaxis(waypoints, 1, 0), k=POLY_DEGREE, bc_type=(bc, bc), axis=0)
+
+        # The polynomial coefficients of each piece are the Taylor coefficients of the
+        # spline at the beginning of the piece: c[m] = p^(m)(t_i)/m!
+        c = np.stack([spline(times[:-1], nu=m)/factorial(m) for m in range(POLY_DEGREE+1)])
+        # (8, n_pieces, D, 3) -> (D, n_pieces, 3, 8), then append a null yaw polynomial
+        c = np.transpose(c, (2, 1, 3, 0))
+        coeffs = np.zeros((n_drones, n_points-1, 4, POLY_DEGREE+1))
+        coeffs[:, :, :3, :] = c
+
+        durations = np.diff(times)
+        return [cls(durations, coeffs[d]) for d in range(n_drones)]
+
+    def evaluate(self, t):
+        '''
+        Position at the times t (array), measured from the beginning of the trajectory.
+        Return a (3, len(t)) array.
+        '''
+        t = np.clip(np.atleast_1d(t), 0, self.duration)
+        starts = np.concatenate(([0], np.cumsum(self.durations)[:-1]))
+        piece = np.clip(np.searchsorted(starts, t, side='right') - 1, 0, self.n_pieces-1)
+        tau = t - starts[piece]
+        powers = tau[:, np.newaxis]**np.arange(POLY_DEGREE+1)
+        return np.einsum('nkm,nm->kn', self.coeffs[piece, :3, :], powers)
+
+    def to_poly4d(self):
+        # Convert the trajectory in the list of Poly4D objects written in the trajectory memory
+        return [Poly4D(float(duration),
+                       Poly4D.Poly(c[0].tolist()),
+                       Poly4D.Poly(c[1].tolist()),
+                       Poly4D.Poly(c[2].tolist()),
+                       Poly4D.Poly(c[3].tolist()))
+                for duration, c in zip(self.durations, self.coeffs)]
@@ -0,0 +1,150 @@
+import time
+import heapq
+
+from threading import Event, Lock, Thread
+
+class _Task:
+
+    '''
+    Periodic task handled by a RateScheduler, with its timing statistics.
+    '''
+
+    def __init__(self, fn, rate, generation):
+        self.fn = fn
+        self.period = 1.0/rate
+        # Unique across the tasks of the scheduler, so stale heap entries are ignored
+        self.generation = generation
+
+        # Statistics
+        self.calls = 0
+        self.overruns = 0
+        self.jitter_sum = 0.0
+        self.jitter_max = 0.0
+
+    def stats(self):
+        return {
+            "rate": 1.0/self.period,
+            "calls": self.calls,
+            "overruns": self.overruns,
+            "jitter_mean": self.jitter_sum/self.calls if self.calls > 0 else 0.0,
+            "jitter_max": self.jitter_max,
+        }
+
+class RateScheduler:
+
+    '''
+    RateScheduler class calls a set of functions at fixed rates, using a single thread.
+
+    Each task has its own rate. Deadlines are computed as start + k*period, so the
+    timing does not drift even if a call is late. When a call takes so long that one
+    or more deadlines are missed, those calls are skipped and counted as overruns.
+
+    For each task it stores:
+        - calls:        Number of calls performed
+        - overruns:     Number of skipped calls
+        - jitter:       Delay between the deadline and the actual call (mean and max, in seconds)
+    '''
+
+    def __init__(self, name="RateScheduler"):
+        self._name = name
+
+        # Tasks, identified by a key, and the heap of their deadlines (deadline, seq, key, generation)
+        self._tasks = {}
+        self._deadlines = []
+        self._seq = 0
+        # Generation of the last task added, never reused (a key can be removed and added again)
+        self._generation = 0
+        self._lock = Lock()
+
+        # Events used to wake up and to stop the scheduler thread
+        self._wakeup = Event()
+        self._stop = Event()
+        self._thread = None
+
+    def add_task(self, key, fn, rate):
+        '''
+        key:    Object used to identify the task (e.g. the uri of a drone)
+
+        fn:     Function invoked without arguments at each deadline
+
+        rate:   Call frequency, in Hz
+        '''
+        with self._lock:
+            self._generation += 1
+            task = _Task(fn, rate, self._generation)
+            self._tasks[key] = task
+            self._push(time.monotonic(), key, task)
+        self._wakeup.set()
+        self.start()
+
+    def remove_task(self, key):
+        with self._lock:
+            self._tasks.pop(key, None)
+
+    def get_stats(self, key):
+        with self._lock:
+            if key not in self._tasks:
+                return None
+            return self._tasks[key].stats()
+
+    def start(self):
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = Thread(target=self._run, name=self._name, daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._wakeup.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def _push(self, deadline, key, task):
+        heapq.heappush(self._deadlines, (deadline, self._seq, key, task.generation))
+        self._seq += 1
+
+    def _run(self):
+        while not self._stop.is_set():
+            # Look for the next deadline
+            with self._lock:
+                timeout = None
+                if self._deadlines:
+                    timeout = self._deadlines[0][0] - time.monotonic()
+            if timeout is None or timeout > 0:
+                # Sleep until the deadline, or until a task is added or the scheduler is stopped
+                self._wakeup.wait(timeout)
+                self._wakeup.clear()
+                continue
+
+            with self._lock:
+                deadline, _, key, generation = heapq.heappop(self._deadlines)
+                task = self._tasks.get(key)
+                if task is None or task.generation != generation:
+                    # Task removed or replaced
+                    continue
+
+            jitter = time.monotonic() - deadline
+            try:
+                task.fn()
+            except Exception as err:
+                print("[RateScheduler._run()] An error occurred in task ", key, ": ")
+                print(err)
+
+            # Update statistics
+            task.calls += 1
+            task.jitter_sum += jitter
+            task.jitter_max = max(task.jitter_max, jitter)
+
+            # Next deadline: skip the ones already missed, keeping the original phase
+            next_deadline = deadline + task.period
+            now = time.monotonic()
+            if now >= next_deadline:
+                missed = int((now - next_deadline)/task.period) + 1
+                task.overruns += missed
+                next_deadline += missed*task.period
+
+            with self._lock:
+                if self._tasks.get(key) is task:
+                    self._push(next_deadline, key, task)
@@ -0,0 +1,166 @@
+import time
+import numpy as np
+
+from threading import Lock
+from scipy.spatial import cKDTree
+
+from CFLib.RateScheduler import RateScheduler
+
+# Default minimum distance (m) between two drones
+DEFAULT_MIN_SEPARATION = 0.3
+# Default frequency (Hz) of the checks
+DEFAULT_MONITOR_RATE = 100
+# Height (m) gained by the upper drone of a pair with the "climb" response
+DEFAULT_CLIMB_HEIGHT = 0.3
+# Duration (s) of the manoeuvres commanded by the responses
+SAFETY_MOVE_DURATION = 1.0
+
+# Responses to a separation violation
+RESPONSES = ("hold", "climb", "land")
+
+class SeparationMonitor:
+
+    '''
+    SeparationMonitor class checks at a fixed rate that the flying drones of a swarm keep
+    a minimum distance from each other.
+
+    At each cycle a KD-tree (scipy cKDTree) is built over the positions of the swarm
+    state matrix (see SwarmState), and the pairs closer than min_separation are found
+    with query_pairs: the cost is O(N log N) instead of the O(N^2) of the pairwise check.
+
+    The drones of a pair in conflict receive the configured response, once:
+        hold:   Stop at the current position
+        climb:  The upper drone climbs by climb_height, the lower one holds
+        land:   Both drones land at once (see SimpleCF.emergency_land()), their
+                missions are stopped
+    Hold and climb override the mission setpoints until release() is invoked.
+    on_conflict, if given, is called as on_conflict(pairs, snapshot) at each cycle
+    with conflicts, pairs being an (M, 2) array of drone indices.
+
+    Timing of each cycle (snapshot, KD-tree build and query) is collected, together
+    with the calls and overruns of the scheduler, see get_stats().
+    '''
+
+    def __init__(self, swarm_state, cfs, min_separation=DEFAULT_MIN_SEPARATION, rate=DEFAULT_MONITOR_RATE,
+                 response="hold", climb_height=DEFAULT_CLIMB_HEIGHT, on_conflict=None):
+        '''
+        swarm_state:    SwarmState of the swarm
+
+        cfs:            SimpleCF objects, in the order of the rows of swarm_state
+
+        min_separation: Minimum distance (m) between two drones
+
+        rate:           Frequency (Hz) of the checks
+
+        response:       One of RESPONSES, or None to just report the conflicts
+        '''
+        if response is not None and response not in RESPONSES:
+            raise ValueError("[SeparationMonitor] Unknown response " + str(response))
+        self._swarm_state = swarm_state
+        self._cfs = cfs
+        self._min_separation = min_separation
+        self._rate = rate
+        self._response = response
+        self._climb_height = climb_height
+        self._on_conflict = on_conflict
+
+        # The checks run on their own scheduler, so they never delay the setpoints
+        self._scheduler = RateScheduler(name="SeparationMonitor")
+
+        # Drones that already received a response, and pairs found in the last cycle
+        self._engaged = set()
+        self._lock = Lock()
+        self.last_pairs = np.empty((0, 2), dtype=np.intp)
+
+        # Statistics
+        self._cycles = 0
+        self._conflict_cycles = 0
+        self._responses = 0
+        self._time_sum = 0.0
+        self._time_max = 0.0
+        self._build_sum = 0.0
+        self._query_sum = 0.0
+
+    def start(self):
+        self._scheduler.add_task("check", self._check, self._rate)
+
+    def stop(self):
+        self._scheduler.stop()
+
+    def _check(self):
+        # Called by the scheduler at the configured rate
+        t0 = time.perf_counter()
+        snapshot = self._swarm_state.snapshot()
+        flying = np.fromiter((cf._took_off_event.is_set() for cf in self._cfs), dtype=bool, count=len(self._cfs))
+        idx = np.flatnonzero(flying & (snapshot.count > 0) & np.all(np.isfinite(snapshot.pos), axis=1))
+
+        t1 = time.perf_counter()
+        pairs = np.empty((0, 2), dtype=np.intp)
+        if len(idx) > 1:
+            tree = cKDTree(snapshot.pos[idx])
+            t2 = time.perf_counter()
+            # Pairs of rows of the tree: map them back to drone indices
+            pairs = idx[tree.query_pairs(self._min_separation, output_type='ndarray')]
+        else:
+            t2 = t1
+        t3 = time.perf_counter()
+
+        self.last_pairs = pairs
+        if len(pairs) > 0:
+            self._conflict_cycles += 1
+            self._respond(pairs, snapshot)
+            if self._on_conflict is not None:
+                self._on_conflict(pairs, snapshot)
+
+        elapsed = time.perf_counter() - t0
+        self._cycles += 1
+        self._time_sum += elapsed
+        self._time_max = max(self._time_max, elapsed)
+        self._build_sum += t2 - t1
+        self._query_sum += t3 - t2
+
+    def _respond(self, pairs, snapshot):
+        if self._response is None:
+            return
+        pos = snapshot.pos
+        with self._lock:
+            for i, j in pairs:
+                # The upper drone of the pair is the one that climbs
+                lower, upper = (i, j) if pos[i, 2] <= pos[j, 2] else (j, i)
+                for k in (lower, upper):
+                    if k in self._engaged:
+                        continue
+                    self._engaged.add(k)
+                    self._responses += 1
+                    cf = self._cfs[k]
+                    if self._response == "land":
+                        # Non-blocking, the mission commands are ignored from now on
+                        cf.emergency_land()
+                    elif self._response == "climb" and k == upper:
+                        cf._safety_go_to(pos[k] + np.array([0.0, 0.0, self._climb_height]), SAFETY_MOVE_DURATION)
+                    else:
+                        cf._safety_go_to(pos[k], SAFETY_MOVE_DURATION)
+
+    def release(self):
+        # Give the control back to the missions of the engaged drones
+        with self._lock:
+            for k in self._engaged:
+                self._cfs[k]._clear_safety_override()
+            self._engaged.clear()
+
+    def get_stats(self):
+        stats = {
+            "drones": len(self._cfs),
+            "min_separation": self._min_separation,
+            "cycles": self._cycles,
+            "conflict_cycles": self._conflict_cycles,
+            "responses": self._responses,
+            "cycle_time_mean": self._time_sum/self._cycles if self._cycles > 0 else 0.0,
+            "cycle_time_max": self._time_max,
+            "build_time_mean": self._build_sum/self._cycles if self._cycles > 0 else 0.0,
+            "query_time_mean": self._query_sum/self._cycles if self._cycles > 0 else 0.0,
+        }
+        scheduler_stats = self._scheduler.get_stats("check")
+        if scheduler_stats is not None:
+            stats.update(scheduler_stats)
+        return stats
@@ -0,0 +1,459 @@
+import time
+import numpy as np
+import multiprocessing as mp
+
+from multiprocessing import shared_memory
+from threading import Condition, Lock, Thread
+
+from CFLib.HostClock import HostClock
+from CFLib.SwarmState import SwarmState
+from CFLib.Formation import Formation
+from CFLib.SwarmLifecycle import radio_of
+
+# Time (s) given to the shards to connect their drones, and to exit once stopped
+DEFAULT_CONNECT_TIMEOUT = 30
+DEFAULT_SHUTDOWN_TIMEOUT = 15
+# Period (s) with which the shards refresh the status flags of their drones
+STATUS_PERIOD = 0.05
+# Period (s) with which the controller checks that the shards it waits for are alive
+SHARD_POLL_PERIOD = 0.5
+
+# Status flags of a drone, written by its shard
+STATUS_CONNECTED = 1
+STATUS_FLYING = 2
+
+class _SharedTelemetry:
+
+    '''
+    Arrays of a swarm stored in a single buffer (the shared memory block of a
+    ShardedSwarmExecutor):
+        - state:    SwarmState (positions, times and sequence counters)
+        - latency:  (N, 3) log latency of each drone, see SimpleCF._log_latency
+        - status:   (N,) STATUS_* flags
+    Row k of every array is written only by the shard of drone k.
+    '''
+
+    def __init__(self, buffer, n_drones, initialize=True):
+        offset = SwarmState.nbytes(n_drones)
+        self.state = SwarmState(n_drones, buffer=buffer, initialize=initialize)
+        self.latency = np.ndarray((n_drones, 3), dtype=np.int64, buffer=buffer, offset=offset)
+        self.status = np.ndarray((n_drones,), dtype=np.int64, buffer=buffer, offset=offset + n_drones*3*8)
+        if initialize:
+            self.latency[:] = 0
+            self.status[:] = 0
+
+    @staticmethod
+    def nbytes(n_drones):
+        return SwarmState.nbytes(n_drones) + n_drones*(3 + 1)*8
+
+def _shard_main(name, shm_name, uris, members, options, commands, events):
+    '''
+    Main function of a shard process: it drives the drones members (indices in uris),
+    writing their telemetry in the shared memory block shm_name and executing the
+    commands received on the pipe commands. Outcomes are put on the queue events as
+    (kind, idx, value).
+    '''
+    # cflib is imported by the shards only: the controller does not open any link
+    import cflib.crtp
+    from CFLib.SimpleCF import SimpleCF, EMERGENCY_LAND_DURATION
+    from CFLib.RateScheduler import RateScheduler
+
+    cflib.crtp.init_drivers()
+    shm = shared_memory.SharedMemory(name=shm_name)
+    telemetry = _SharedTelemetry(shm.buf, len(uris), initialize=False)
+
+    # Same timeline of the controller (and of the other shards)
+    clock = HostClock(origin_ns=options["origin_ns"])
+    scheduler = RateScheduler(name="Shard_" + name)
+    cfs = {}
+    for idx in members:
+        cf = SimpleCF(uris[idx], clock=clock, Ts=options["Ts"], log_max_len=options["log_max_len"])
+        if options["setpoint_rate"] is not None:
+            cf._setpoint_rate = options["setpoint_rate"]
+        cf.use_phlc = options["use_phlc"]
+        cf.use_extpos = options["use_extpos"]
+        if options["extpos_rate"] is not None:
+            cf.extpos_rate = options["extpos_rate"]
+        cf._setpoint_scheduler = scheduler
+        # The log callbacks write straight into the shared arrays
+        cf._swarm_state = telemetry.state
+        cf._swarm_idx = idx
+        cf._log_latency = telemetry.latency[idx]
+        cfs[idx] = cf
+
+    def refresh_status():
+        for idx, cf in cfs.items():
+            telemetry.status[idx] = ((STATUS_CONNECTED if cf._link is not None and cf._link.is_up else 0)
+                                     | (STATUS_FLYING if cf._took_off_event.is_set() else 0))
+
+    def run_parallel(fn, items):
+        threads = [Thread(target=fn, args=item) for item in items]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+
+    def connect(idx, cf):
+        events.put(("connected", idx, cf.connect(**options["link"])))
+
+    def run_mission(idx, cf, fn, land, timeout):
+        ok = cf.run_mission(fn, land, timeout)
+        events.put(("mission_done", idx, ok))
+
+    def kill(duration):
+        # The drones of the shard share a radio: served back to back, see SimpleCFSwarm.kill_all()
+        if duration is None:
+            duration = EMERGENCY_LAND_DURATION
+        for cf in cfs.values():
+            cf._mission_stop.set()
+        for idx, cf in cfs.items():
+            try:
+                method = cf.emergency_land(duration)
+            except Exception as err:
+                method = "error: " + str(err)
+            events.put(("landed", idx, method))
+
+    try:
+        run_parallel(connect, cfs.items())
+        refresh_status()
+        while True:
+            if not commands.poll(STATUS_PERIOD):
+                refresh_status()
+                continue
+            command = commands.recv()
+            kind = command[0]
+            if kind == "shutdown":
+                break
+            elif kind == "extpos":
+                _, idx, pos, quat = command
+                cfs[idx].send_external_pos(pos, quat)
+            elif kind == "go_to":
+                for idx, target, duration in command[1]:
+                    cfs[idx]._go_to_nowait(target, duration)
+            elif kind == "mission":
+                _, missions, land, timeout = command
+                for idx, fn in missions:
+                    Thread(target=run_mission, args=(idx, cfs[idx], fn, land, timeout), daemon=True).start()
+            elif kind == "stop_missions":
+                for cf in cfs.values():
+                    cf._mission_stop.set()
+            elif kind == "kill":
+                Thread(target=kill, args=(command[1],), daemon=True).start()
+            refresh_status()
+    finally:
+        run_parallel(lambda cf: cf.disconnect(), [(cf,) for cf in cfs.values()])
+        scheduler.stop()
+        telemetry.status[members] = 0
+        events.put(("stopped", name, None))
+        # Drop the views on the block before closing it
+        del cfs, telemetry, cf
+        try:
+            shm.close()
+        except BufferError:
+            # Some view is still referenced by a cflib thread: the mapping is released at exit
+            pass
+
+class ShardedSwarmExecutor:
+
+    '''
+    ShardedSwarmExecutor class drives a swarm from several processes, to keep the log
+    latency independent of the number of drones.
+
+    In SimpleCFSwarm all the drones share one interpreter: the cflib receive threads,
+    the log callbacks and the NatNet decoder compete for the GIL. Here the drones are
+    sharded by radio dongle (see radio_of()): each shard is a process with its own
+    SimpleCF objects, setpoint scheduler and cflib driver.
+
+    Telemetry is written by the shards in a multiprocessing.shared_memory block: the
+    positions in a SwarmState, the log latency and the status flags of each drone.
+    The controller reads the arrays in place, without copies nor messages (state,
+    get_snapshot(), get_log_latency_stats()).
+
+    Commands are sent to the shards as tuples over one-way pipes
+    (multiprocessing.Pipe(duplex=False)): no feeder thread and a single pickle per
+    command. The commands for several drones of a shard (e.g. form()) travel in one
+    message. Outcomes (connections, missions, landings) come back on a queue.
+
+    Missions are executed by the shards: the functions passed to assign_execute_method()
+    must be picklable (defined at module level, as in the scripts of the repository).
+    '''
+
+    def __init__(self, uris, clock=None, Ts=100, log_max_len=None, setpoint_rate=None,
+                 use_phlc=True, use_extpos=False, extpos_rate=None, shard_of=radio_of, start_method="spawn"):
+        '''
+        uris:           URIs of the drones, in the order of the rows of the telemetry
+
+        clock:          HostClock of the controller. The shards use its time origin
+
+        Ts, log_max_len, setpoint_rate:  Passed to the SimpleCF objects of the shards
+                        (None setpoint_rate: SimpleCF default)
+
+        use_phlc, use_extpos, extpos_rate:  Configuration of all the drones
+
+        shard_of:       Function mapping an URI to its shard. By default one shard for
+                        each radio dongle
+
+        start_method:   multiprocessing start method of the shards. 'spawn' does not
+                        inherit the threads of the controller
+        '''
+        self._uris = list(uris)
+        self._clock = clock if clock is not None else HostClock.get_default()
+        self._options = {
+            "origin_ns": self._clock.origin_ns,
+            "Ts": Ts,
+            "log_max_len": log_max_len,
+            "setpoint_rate": setpoint_rate,
+            "use_phlc": use_phlc,
+            "use_extpos": use_extpos,
+            "extpos_rate": extpos_rate,
+            "link": {},
+        }
+        self._ctx = mp.get_context(start_method)
+
+        # Drones of each shard, and shard of each drone
+        self._shards = {}
+        for idx, uri in enumerate(self._uris):
+            self._shards.setdefault(shard_of(uri), []).append(idx)
+        self._shard_of = [None]*len(self._uris)
+        for name, members in self._shards.items():
+            for idx in members:
+                self._shard_of[idx] = name
+
+        # Action of each drone (None: the default one of SimpleCF)
+        self._missions = [None]*len(self._uris)
+
+        self._shm = None
+        self._telemetry = None
+        self._processes = {}
+        self._pipes = {}
+        self._pipe_locks = {}
+        self._events = None
+        self._event_thread = None
+
+        # Outcomes received from the shards, see _collect_events()
+        self._cond = Condition()
+        self._connected = {}
+        self._mission_results = {}
+        self._land_methods = {}
+        self._stopped = set()
+
+        # Commands sent to each shard
+        self._commands_sent = {name: 0 for name in self._shards}
+
+    @property
+    def state(self):
+        # SwarmState on the shared memory block: its arrays are read in place
+        return self._telemetry.state if self._telemetry is not None else None
+
+    def start(self, timeout=DEFAULT_CONNECT_TIMEOUT, **kwargs):
+        '''
+        Create the shared memory block, start one process for each shard and connect
+        the drones (see SimpleCF.connect(), parameters are passed to LinkSupervisor).
+        Return, for each drone, whether it connected within timeout seconds.
+        '''
+        n = len(self._uris)
+        self._options["link"] = kwargs
+        self._shm = shared_memory.SharedMemory(create=True, size=_SharedTelemetry.nbytes(n))
+        self._telemetry = _SharedTelemetry(self._shm.buf, n)
+        self._events = self._ctx.Queue()
+        self._event_thread = Thread(target=self._collect_events, name="ShardedSwarmExecutor_events", daemon=True)
+        self._event_thread.start()
+
+        for name, members in self._shards.items():
+            receiver, sender = self._ctx.Pipe(duplex=False)
+            process = self._ctx.Process(target=_shard_main, name="Shard_" + name,
+                                        args=(name, self._shm.name, self._uris, members, self._options,
+                                              receiver, self._events))
+            process.start()
+            receiver.close()
+            self._processes[name] = process
+            self._pipes[name] = sender
+            self._pipe_locks[name] = Lock()
+
+        with self._cond:
+            self._cond.wait_for(lambda: len(self._connected) == n, timeout)
+            return [self._connected.get(idx, False) for idx in range(n)]
+
+    def _collect_events(self):
+        # Store the outcomes sent by the shards, until the None sentinel
+        while True:
+            event = self._events.get()
+            if event is None:
+                return
+            kind, key, value = event
+            with self._cond:
+                if kind == "connected":
+                    self._connected[key] = value
+                elif kind == "mission_done":
+                    self._mission_results[key] = value
+                elif kind == "landed":
+                    self._land_methods[key] = value
+                elif kind == "stopped":
+                    self._stopped.add(key)
+                self._cond.notify_all()
+
+    def _send(self, name, command):
+        # Pipes are written by the controller thread and by the pose callbacks
+        with self._pipe_locks[name]:
+            self._pipes[name].send(command)
+            self._commands_sent[name] += 1
+
+    def _by_shard(self, items):
+        # Group (idx, ...) tuples by shard
+        groups = {}
+        for item in items:
+            groups.setdefault(self._shard_of[item[0]], []).append(item)
+        return groups
+
+    '''
+    Telemetry methods
+    '''
+    def get_snapshot(self):
+        # Consistent copy of positions, times and sample counts (see SwarmState.snapshot())
+        return self._telemetry.state.snapshot()
+
+    def get_positions(self):
+        return self.get_snapshot().pos
+
+    def get_centroid(self):
+        return np.nanmean(self.get_positions(), axis=0)
+
+    def get_distances(self):
+        return SwarmState.pairwise_distances(self.get_positions())
+
+    def is_connected(self):
+        return (self._telemetry.status & STATUS_CONNECTED) != 0
+
+    def is_flying(self):
+        return (self._telemetry.status & STATUS_FLYING) != 0
+
+    def get_log_latency_stats(self):
+        '''
+        For each drone (by URI), count, mean and max (s) of the delay between the
+        sampling time of its logs and their processing in its shard.
+        '''
+        latency = self._telemetry.latency.copy()
+        stats = {}
+        for idx, uri in enumerate(self._uris):
+            count, total, worst = (int(v) for v in latency[idx])
+            stats[uri] = {
+                "shard": self._shard_of[idx],
+                "count": count,
+                "mean": total/count/1e9 if count > 0 else 0.0,
+                "max": worst/1e9,
+            }
+        return stats
+
+    def get_shard_stats(self):
+        return {
+            name: {
+                "drones": len(members),
+                "alive": self._processes[name].is_alive() if name in self._processes else False,
+                "commands_sent": self._commands_sent[name],
+            }
+            for name, members in self._shards.items()
+        }
+
+    '''
+    Command methods
+    '''
+    def assign_execute_method(self, cf_idx, executed_method):
+        self._missions[cf_idx] = executed_method
+
+    def run_missions(self, land=True, timeout=None, wait=True):
+        '''
+        Execute the assigned actions on the connected drones (see SimpleCF.run_mission()),
+        one message for each shard. With land False the swarm keeps hovering.
+
+        timeout:    Maximum time (s) waited for the link of each drone and, if wait is
+                    True, for the missions to end
+
+        If wait is True, return the outcome of each mission once all of them ended, None
+        for the drones whose mission did not end within timeout or whose shard exited.
+        '''
+        with self._cond:
+            self._mission_results = {}
+        for name, missions in self._by_shard(list(enumerate(self._missions))).items():
+            self._send(name, ("mission", missions, land, timeout))
+        if not wait:
+            return None
+
+        n = len(self._uris)
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._cond:
+            while True:
+                missing = [idx for idx in range(n) if idx not in self._mission_results]
+                if not missing or not any(self._processes[self._shard_of[idx]].is_alive() for idx in missing):
+                    break
+                remaining = SHARD_POLL_PERIOD if deadline is None else deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                self._cond.wait(min(remaining, SHARD_POLL_PERIOD))
+            return [self._mission_results.get(idx) for idx in range(n)]
+
+    def stop_missions(self):
+        for name in self._shards:
+            self._send(name, ("stop_missions",))
+
+    def go_to(self, cf_idx, x, y, z, duration=None):
+        # Non-blocking go_to (see SimpleCF._go_to_nowait())
+        self._send(self._shard_of[cf_idx], ("go_to", [(cf_idx, (x, y, z), duration)]))
+
+    def form(self, formation, duration=None):
+        '''
+        Move the flying swarm in a formation (see SimpleCFSwarm.form()). The assignment is
+        computed here on the shared positions, the targets reach each shard in one message.
+        Return the (N,) array with the slot of each drone, None if some drone has no position.
+        '''
+        if not isinstance(formation, Formation):
+            formation = Formation(formation)
+        snapshot = self.get_snapshot()
+        if not np.all(np.isfinite(snapshot.pos)):
+            print("[ShardedSwarmExecutor.form()] Not all the drones have a position yet.")
+            return None
+        slot_of, _distance = formation.assign(snapshot.pos)
+        targets = formation.slots[slot_of]
+        for name, items in self._by_shard([(idx, targets[idx], duration) for idx in range(len(self._uris))]).items():
+            self._send(name, ("go_to", items))
+        return slot_of
+
+    def send_external_pos(self, cf_idx, pos, quat=None):
+        # Forward an external pose to the shard of the drone (see SimpleCF.send_external_pos())
+        self._send(self._shard_of[cf_idx], ("extpos", cf_idx, tuple(pos), None if quat is None else tuple(quat)))
+
+    def kill_all(self, duration=None, timeout=None):
+        '''
+        Land all the drones at once (see SimpleCFSwarm.kill_all()): each shard serves its
+        radio, the shards in parallel. duration (s) of the landing, EMERGENCY_LAND_DURATION
+        if None. Return the land command sent to each drone (by URI), None for the drones
+        not served within timeout seconds.
+        '''
+        with self._cond:
+            self._land_methods = {}
+        for name in self._shards:
+            self._send(name, ("kill", duration))
+        with self._cond:
+            self._cond.wait_for(lambda: len(self._land_methods) == len(self._uris), timeout)
+            return {uri: self._land_methods.get(idx) for idx, uri in enumerate(self._uris)}
+
+    def stop(self, timeout=DEFAULT_SHUTDOWN_TIMEOUT):
+        # Land and disconnect the drones, stop the shards and release the shared memory.
+        #   Views on state must not be referenced anymore.
+        for name in self._shards:
+            if self._processes[name].is_alive():
+                self._send(name, ("shutdown",))
+        deadline = time.monotonic() + timeout
+        for name, process in self._processes.items():
+            process.join(max(deadline - time.monotonic(), 0.0))
+            if process.is_alive():
+                print("[ShardedSwarmExecutor.stop()] Shard ", name, " did not exit. Terminating...")
+                process.terminate()
+                process.join()
+        self._events.put(None)
+        self._event_thread.join()
+        for pipe in self._pipes.values():
+            pipe.close()
+        self._telemetry = None
+        self._shm.close()
+        self._shm.unlink()
+        self._shm = None
@@ -3,7 +3,7 @@ import time
 import numpy as np
 from matplotlib import pyplot as plt
 
-from threading import Event, Thread, BrokenBarrierError
+from threading import Event, Lock, Thread, Timer
 
 # Crazyflie import
 import cflib.crtp
@@ -29,10 +29,117 @@ from cflib.crazyflie.extpos import Extpos
 from cflib.positioning.position_hl_commander import PositionHlCommander
 from cflib.positioning.motion_commander import MotionCommander
 
+# Trajectory memory, used to upload trajectories executed on board
+from cflib.crazyflie.mem import MemoryElement
+
+# Preallocated storage for the logged data
+from CFLib.DataBuffer import DataBuffer
+
+# Fixed-rate streaming of the position setpoints
+from CFLib.RateScheduler import RateScheduler
+
+# Piecewise polynomial trajectories executed on board
+from CFLib.PolyTrajectory import PolyTrajectory
+
+# Rate-limited forwarding of the external poses
+from CFLib.ExtposForwarder import ExtposForwarder, DEFAULT_EXTPOS_RATE
+
+# TOC cache shared among drones, scripts and processes
+from CFLib.TocCacheManager import TocCacheManager
+
+# Custom telemetry: packing of the log variables in log blocks and storage of their samples
+from CFLib.LogPlanner import LogPlanner
+from CFLib.TelemetryStore import TelemetryStore
+
+# Host timebase, and conversion of the drone clock onto it
+from CFLib.HostClock import HostClock, DRONE_TICK_PERIOD
+
+# Connection kept open across missions, with reconnection
+from CFLib.LinkSupervisor import LinkSupervisor
+
+# Consistent snapshots of the latest state, published without locks by the log callback
+from CFLib.StateSlot import StateSlot
+
 # Default parameters, you can change them
 DEFAULT_VELOCITY = 0.25
 DEFAULT_HEIGHT = 0.3
 DEFAULT_LANDING_HEIGHT = 0.1
+DEFAULT_SETPOINT_RATE = 50
+# Maximum time (s) waited for the first log after the log configuration is started
+FIRST_LOG_TIMEOUT = 10
+# go_to(wait=True): radius (m) of the tolerance ball and time (s) the drone must stay in it
+DEFAULT_ARRIVAL_TOL = 0.05
+DEFAULT_ARRIVAL_DWELL = 0.3
+# Period (s) at which a waited go_to checks whether the mission was stopped
+ARRIVAL_STOP_POLL = 0.05
+# Maximum time (s) waited for the acknowledgement of the parameters set at start up
+PARAM_ACK_TIMEOUT = 2
+# Kalman filter convergence: the variance of the position, logged every KALMAN_VAR_PERIOD ms,
+#   must vary less than KALMAN_VAR_THRESHOLD over the last KALMAN_VAR_WINDOW samples.
+#   If it does not converge within KALMAN_SETTLE_TIMEOUT seconds, the start up goes on anyway.
+KALMAN_VAR_PERIOD = 20
+KALMAN_VAR_WINDOW = 10
+KALMAN_VAR_THRESHOLD = 0.001
+KALMAN_SETTLE_TIMEOUT = 5
+
+# Duration (s) of the landing commanded by emergency_land()
+EMERGENCY_LAND_DURATION = 2.0
+
+# Maximum time (s) waited for a log confirming that the drone is airborne after the take off
+READY_LOG_TIMEOUT = 2
+
+# Row of the position log: host time (ns) and position estimated by the drone
+POS_LOG_DTYPE = np.dtype([('time', np.int64), ('pos', np.float64, (3,))])
+
+class _ArrivalCheck:
+
+    '''
+    State of a go_to(wait=True) command, updated by the log callback. It is cancelled
+    when the command is overridden (emergency landing, safety move).
+    '''
+
+    def __init__(self, target, tol, dwell, t_start):
+        # Times are host times (ns), dwell is in seconds
+        self.target = target
+        self.tol = tol
+        self.dwell_ns = int(dwell*1e9)
+        self.t_start = t_start
+        # Log time at which the drone entered the tolerance ball (None if outside)
+        self.t_inside = None
+        # Time to arrival (s), set when the drone stayed in the ball for dwell seconds
+        self.time_to_arrival = None
+        self.arrived = Event()
+        self.cancelled = False
+        # Set on arrival or cancellation
+        self._done = Event()
+
+    def update(self, t, pos):
+        if np.sum((pos - self.target)**2) > self.tol**2:
+            self.t_inside = None
+            return
+        if self.t_inside is None:
+            self.t_inside = t
+        if t - self.t_inside >= self.dwell_ns:
+            self.time_to_arrival = (self.t_inside - self.t_start)/1e9
+            self.arrived.set()
+            self._done.set()
+
+    def cancel(self):
+        self.cancelled = True
+        self._done.set()
+
+    def wait(self, timeout=None, stop=None):
+        # Wait for the arrival. Return False if timeout expires, the check is cancelled
+        #   or the stop event is set.
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            period = ARRIVAL_STOP_POLL
+            if deadline is not None:
+                period = max(min(period, deadline - time.monotonic()), 0.0)
+            if self._done.wait(period):
+                return self.arrived.is_set()
+            if (stop is not None and stop.is_set()) or (deadline is not None and time.monotonic() >= deadline):
+                return False
 
 class SimpleCF:
 
@@ -45,7 +152,8 @@ class SimpleCF:
         - Group and automate some lines of code necessary to drive a Crazyflie 
     '''
 
-    def __init__(self, uri, start_time=None, Ts=100):
+    def __init__(self, uri, clock=None, Ts=100, log_max_len=None, setpoint_rate=DEFAULT_SETPOINT_RATE,
+                 toc_cache=None):
         '''
         Here is a brief description of the parameters required to create a SimpleCF object.
 
@@ -53,14 +161,21 @@ class SimpleCF:
 
         Ts:     Sampling time used to log data from the drone
 
-        start_time: Initial time of the execution
+        clock:  HostClock providing the time of the logs. If None, the default shared
+                clock is used
+
+        log_max_len: Maximum number of position logs retained. If None, the whole
+                    flight is stored
+
+        setpoint_rate: Frequency (Hz) used to stream the position setpoint when
+                    Commander is used
+
+        toc_cache:  TocCacheManager used to store the TOCs. If None, the default
+                    shared cache is used
         '''
 
-        # Store the initial time of the execution
-        if start_time is None:
-            self._start_time = time.time()
-        else:
-            self._start_time = start_time
+        # Timebase of the logs, shared with the other components of the session
+        self._clock = clock if clock is not None else HostClock.get_default()
 
         # Store uri and log sampling time
         self._uri = uri
@@ -70,11 +185,57 @@ class SimpleCF:
         # Check if the drone is connected to the pc
         self.is_offline = True
 
+        # Synchronization events:
+        #   _first_log_event is set by the log callback when the first position arrives
+        #   _took_off_event is set once the commander completed the take off
+        #   _mission_stop is set to ask the executed function to terminate
+        # _state_cond, if set, is notified whenever the drone takes off or lands
+        #   (see SimpleCFSwarm.wait_all_ready()).
+        self._first_log_event = Event()
+        self._took_off_event = Event()
+        self._mission_stop = Event()
+        self._state_cond = None
+
+        # Set by emergency_land(): the mission commands are ignored and the normal landing
+        #   waits for the emergency one (_emergency_land_end, time.monotonic()) to complete
+        self._emergency = Event()
+        self._emergency_land_end = None
+
+        # SyncCrazyflie of the current connection, and LinkSupervisor keeping it open across
+        #   missions (see connect())
+        self._scf = None
+        self._link = None
+
+        # Time (s) spent waiting in each phase, identified by name
+        self.wait_times = {}
+
+        # Time (s) spent in each start up phase: connect, params, estimator, first_log,
+        #   take_off (see start_drone())
+        self.startup_times = {}
+
+        # TOC cache, and its hits and misses during the last connection
+        self._toc_cache_manager = toc_cache
+        self.toc_cache_stats = {}
+
         # Log variables and log initial configuration
-        self._first_log_arrived = False
         self._log_conf = LogConfig(name="cf_log_conf", period_in_ms=Ts)
         self._default_log_config()
 
+        # Custom log variables: they are packed in log blocks at connection time (when the
+        #   TOC is known), filling also the free space of the default block.
+        #   _log_blocks contains all the blocks started, default one included.
+        self._log_planner = LogPlanner()
+        self._log_blocks = []
+        self._telemetry = TelemetryStore(max_len=log_max_len)
+
+        # Model of the drone clock: logs are stamped with the time at which the drone
+        #   sampled them (drone tick converted in host time), not with their arrival time
+        self._clock_sync = self._clock.register(uri, tick_period=DRONE_TICK_PERIOD)
+
+        # Log latency: delay (ns) between the sampling time of a log and its callback,
+        #   as [count, sum, max]. It can be a row of a shared array (see ShardedSwarmExecutor).
+        self._log_latency = np.zeros(3, dtype=np.int64)
+
         # Function containing the action that the agent has to perform.
         # Initially it is set just to a time.wait(5)
         self._executed_function = self._execute
@@ -82,19 +243,43 @@ class SimpleCF:
         # Flag necessary to distinguish single mode and swarm mode
         self._swarm_mode = False
 
-        # Enable external position source
+        # Enable external position source.
+        # External poses are forwarded at extpos_rate by an ExtposForwarder.
         self.use_extpos = False
         self.extpos_recevier = None
+        self.extpos_rate = DEFAULT_EXTPOS_RATE
+        self._extpos_forwarder = None
         
         # Position log data
-        # Data estimated and logged by the drone
-        self._pos = np.empty((3, 0))
-        # Time associated to position logs
-        self._pos_time = np.array([])
+        # Each sample is a row (time, pos): host time (ns) and position are stored in the
+        # same buffer, so _pos and _pos_time always have the same length.
+        self._pos_log = DataBuffer(dtype=POS_LOG_DTYPE, max_len=log_max_len)
+
+        # Latest state (sequence number, time, position), read by the mission code
+        #   through get_snapshot() and wait_for_next_sample()
+        self._state = StateSlot()
+
+        # State matrix of the swarm the drone belongs to (see SimpleCFSwarm), and row of
+        #   the drone in it
+        self._swarm_state = None
+        self._swarm_idx = None
+
+        # Phases of the swarm start up, set by SimpleCFSwarm (see SwarmLifecycle)
+        self._lifecycle = None
 
         # Control data: positions setpoint vector
         self._pos_set_point = None
 
+        # Target imposed by a safety response (see SeparationMonitor): while it is set,
+        #   go_to() commands of the mission are ignored
+        self._safety_target = None
+
+        # Pending go_to(wait=True) command, checked at each log, and time to arrival
+        #   statistics of the completed ones
+        self._arrival_check = None
+        self._arrival_times = []
+        self._arrival_timeouts = 0
+
         # Two commanders are supported: PositionHlCommander and Commander.
         # The two commanders are exclusive each other: just one for instance of the class
         #   can be used.
@@ -105,11 +290,19 @@ class SimpleCF:
         # Check which commander object is used by the instance
         self.use_phlc = True
 
-        # Commander needs a support thread to be used. This thread is in charge of continously
-        #   send the position setpoint to the agent. Moreover, an Event is used to communicate
-        #   with the thread and stop it when the execution is completed.
-        self._commander_support_thread_stop = Event()
-        self._commander_support_thread = Thread( target=self._send_position_setpoint )
+        # Trajectories uploaded to the drone, identified by trajectory_id
+        self._trajectories = {}
+        # Trajectory fitted by SimpleCFSwarm.assign_trajectories(), uploaded by the drone itself
+        self._planned_trajectory = None
+
+        # Commander needs the position setpoint to be sent continously. A RateScheduler calls
+        #   _send_position_setpoint() at setpoint_rate (and forwards the external poses).
+        #   The scheduler can be shared among several drones (see SimpleCFSwarm): if it is
+        #   not set, a private one is created.
+        self._setpoint_rate = setpoint_rate
+        self._setpoint_scheduler = None
+        self._own_setpoint_scheduler = False
+        self._setpoints_sent = 0
 
     def connection_established(self, *args):
         print("[simpleCF.connection_established()] Connected to the drone ", self._uri)
@@ -118,9 +311,21 @@ class SimpleCF:
     def connection_lost(self, *args):
         print("[SimpleCF.connection_lost()] No longer connected to the drone ", self._uri)
         self.is_offline = True
+        if self._link is not None:
+            self._link.on_link_lost()
+
+    def add_log_variable(self, name, fetch_as=None, period_in_ms=None):
+        '''
+        Log a custom variable. Any number of variables can be added: they are split
+        in as many log blocks as necessary when the drone is connected.
 
-    def add_log_variable(self, name, fetch_as):
-        self._log_conf.add_variable(name, fetch_as)
+        name:           Complete name of the variable (group.name)
+
+        fetch_as:       Type used to fetch the variable. If None, the type stored on board is used
+
+        period_in_ms:   Log period of the variable. If None, Ts is used
+        '''
+        self._log_planner.add_variable(name, fetch_as, period_in_ms)
 
     def _default_log_config(self):
         # Add the components of the state logged by default
@@ -131,39 +336,27 @@ class SimpleCF:
     '''
     Start and stop methods
     '''
-    def start_drone(self, swarm_mode=False, barrier=None):
-        # Open SyncCrazyflie context
+    def start_drone(self, swarm_mode=False):
+        # In swarm mode, the drone goes through the phases of self._lifecycle
         self._swarm_mode = swarm_mode
-        with SyncCrazyflie(self._uri, cf = Crazyflie(rw_cache='./cache')) as scf:
-            # Store che SyncCrazyflie object
-            self._scf = scf
-
-            # Modify callbacks for connection established and lost
-            conn_cb = Caller()
-            conn_cb.add_callback(self.connection_established)
-            scf.cf.fully_connected = conn_cb
-            
-            lost_conn_cb = Caller()
-            lost_conn_cb.add_callback(self.connection_lost)
-            scf.cf.connection_lost = lost_conn_cb
-
-            # Reset KF and set the drone in Position Control mode
-            scf.cf.param.set_value('stabilizer.controller', '3')
-            scf.cf.param.set_value('kalman.resetEstimation', '1')
-            time.sleep(2)
-
-            # Load the log configuration
-            scf.cf.log.add_config(self._log_conf)
-            self._log_conf.data_received_cb.add_callback(
-                lambda _timestamp, data, _logconf: self._async_log_cb(data)
-            )
-
-            # Start state log
-            self._log_conf.start()
-
-            # Wait for the first log in order to know the position
-            while not self._first_log_arrived:
-                pass
+        self._mission_stop.clear()
+        self._emergency.clear()
+        self.startup_times = {}
+        scf = self._connect()
+        if scf is None:
+            self._checkpoint("connect", False)
+            return
+        try:
+            if not self._checkpoint("connect"):
+                return
+
+            # Start the logs, reset the estimator and wait for the first position
+            if not self._prepare(scf):
+                self._checkpoint("estimator", False)
+                return
+            if not self._checkpoint("estimator"):
+                self._stop_logs()
+                return
 
             # Enable external position source
             if self.use_extpos:
@@ -171,14 +364,104 @@ class SimpleCF:
 
             # Do stuff
             if swarm_mode:
-                self._execute_swarm_wrapper(barrier)
+                self._execute_swarm_wrapper()
             else:
                 self._execute_wrapper()
 
-            # Stop state log
-            self._log_conf.stop()
+            # Stop external position forwarding and logs
+            self._disable_ext_pos()
+            self._stop_logs()
+        finally:
+            self._disconnect(scf)
+        if self._own_setpoint_scheduler:
+            self._setpoint_scheduler.stop()
         print("[SimpleCF.start_drone()] Operation completed.")
 
+    def _connect(self):
+        # Open the link with the drone. Return the SyncCrazyflie, None if the connection failed.
+        t0 = time.monotonic()
+        cf, toc_cache = self._create_crazyflie()
+        scf = SyncCrazyflie(self._uri, cf = cf)
+        try:
+            scf.open_link()
+        except Exception as err:
+            print("[SimpleCF._connect()] Connection to the drone ", self._uri, " failed: ")
+            print(err)
+            return None
+        self._record_startup("connect", t0)
+        self._collect_toc_cache_stats(toc_cache)
+        self.is_offline = False
+
+        # Store che SyncCrazyflie object
+        self._scf = scf
+
+        # Modify callbacks for connection established and lost
+        conn_cb = Caller()
+        conn_cb.add_callback(self.connection_established)
+        scf.cf.fully_connected = conn_cb
+
+        lost_conn_cb = Caller()
+        lost_conn_cb.add_callback(self.connection_lost)
+        scf.cf.connection_lost = lost_conn_cb
+        return scf
+
+    def _prepare(self, scf, reset_estimator=True):
+        '''
+        Start the logs and wait for a position from the drone.
+        With reset_estimator, the Kalman filter is reset and the drone is set in Position
+        Control mode (cold start): a drone reconnected while flying keeps its estimate.
+        Return False if no log arrived.
+        '''
+        # Load and start the log configurations: state log is started together with
+        #   the estimator reset, instead of waiting for it
+        last_seq = self._state.seq
+        self._start_logs(scf.cf)
+
+        if reset_estimator:
+            # Reset KF and set the drone in Position Control mode
+            self._reset_estimator(scf.cf, '3')
+
+        # Wait for the first log (of this connection) in order to know the position
+        t0 = time.monotonic()
+        if self.wait_for_next_sample(after_seq=last_seq, timeout=FIRST_LOG_TIMEOUT) is None:
+            print("[SimpleCF._prepare()] No log received from the drone ", self._uri, ". Aborting...")
+            self._stop_logs()
+            return False
+        self._record_startup("first_log", t0)
+        return True
+
+    def _disconnect(self, scf):
+        try:
+            scf.close_link()
+        except Exception as err:
+            print("[SimpleCF._disconnect()] Error closing the link with the drone ", self._uri, ": ")
+            print(err)
+        if self._scf is scf:
+            self._scf = None
+            self.is_offline = True
+
+    def _rebind_link(self, scf):
+        '''
+        Attach the commanders and the external position forwarding to a new link, after
+        a reconnection (see LinkSupervisor). A flying drone is not taken off again.
+        '''
+        flying = self._took_off_event.is_set()
+        self._commander = scf.cf.commander
+        if self._pos_hl_commander is not None:
+            p0 = self.get_last_position()
+            phlc = PositionHlCommander(scf, x=p0[0], y=p0[1], z=p0[2] if flying else 0,
+                    default_velocity=DEFAULT_VELOCITY, default_height=DEFAULT_HEIGHT,
+                    controller = PositionHlCommander.CONTROLLER_PID, default_landing_height = DEFAULT_LANDING_HEIGHT)
+            phlc._is_flying = flying
+            self._pos_hl_commander = phlc
+        if self._motion_commander is not None:
+            # MotionCommander cannot be resumed in flight: the drone will land on board
+            #   (see _close_commander())
+            self._motion_commander = None
+        if self.use_extpos:
+            self._disable_ext_pos()
+            self._enable_ext_pos(scf.cf)
+
     def stop_drone(self):
         # Let the drone land
         if self.use_phlc:
@@ -186,12 +469,167 @@ class SimpleCF:
         else:
             self._close_commander()
 
+    '''
+    Supervised connection methods
+    '''
+    def connect(self, **kwargs):
+        '''
+        Connect the drone and keep it connected across missions (see run_mission()).
+        If the link drops, it is opened again with exponential backoff.
+        Parameters are passed to LinkSupervisor. Return False if the connection failed.
+        '''
+        if self._link is None:
+            self._link = LinkSupervisor(self, **kwargs)
+        return self._link.connect()
+
+    def run_mission(self, executed_function=None, land=True, timeout=None):
+        '''
+        Execute a mission on the connected drone (see connect()): take off if not flying,
+        execute executed_function (self._executed_function if None) and, if land is True,
+        land. With land False the drone keeps hovering, and the next mission starts
+        from the air.
+        '''
+        if self._link is None:
+            print("[SimpleCF.run_mission()] Drone ", self._uri, " not connected, call connect() first.")
+            return False
+        return self._link.run_mission(executed_function, land, timeout)
+
+    def disconnect(self):
+        # Land, if flying, and close the supervised connection
+        if self._link is not None:
+            self._link.close()
+
+    def get_link_stats(self):
+        if self._link is None:
+            return None
+        return self._link.get_stats()
+
+    '''
+    Synchronization methods
+    '''
+    @property
+    def _first_log_arrived(self):
+        return self._first_log_event.is_set()
+
+    def _wait_event(self, event, phase, timeout=None):
+        # Wait for the event, storing the time spent in self.wait_times[phase].
+        # Return False if the timeout expired.
+        t0 = time.monotonic()
+        flag = event.wait(timeout)
+        self.wait_times[phase] = time.monotonic() - t0
+        return flag
+
+    def _checkpoint(self, phase, ok=True):
+        # End of a phase of the swarm lifecycle: return False if the drone must not go on.
+        #   Without a lifecycle, the outcome of the drone is returned.
+        if self._lifecycle is None:
+            return ok
+        return self._lifecycle.arrive(self._swarm_idx, phase, ok)
+
+    def _set_took_off(self, flying):
+        if flying:
+            self._took_off_event.set()
+        else:
+            self._took_off_event.clear()
+        if self._state_cond is not None:
+            with self._state_cond:
+                self._state_cond.notify_all()
+
+    '''
+    Start up methods
+    '''
+    def _create_crazyflie(self):
+        # Crazyflie object using the shared TOC cache
+        if self._toc_cache_manager is None:
+            self._toc_cache_manager = TocCacheManager.get_default()
+        return self._toc_cache_manager.create_crazyflie()
+
+    def _collect_toc_cache_stats(self, toc_cache):
+        # Hits and misses of the TOC cache during the connection
+        self.toc_cache_stats = {"hits": toc_cache.hits, "misses": toc_cache.misses}
+        self._toc_cache_manager.collect(toc_cache)
+
+    def _record_startup(self, phase, t0):
+        # Store the time spent in a start up phase, started at t0 (time.monotonic())
+        self.startup_times[phase] = time.monotonic() - t0
+
+    def _set_params(self, cf, values, timeout=PARAM_ACK_TIMEOUT):
+        '''
+        Set the parameters in the dictionary values {name: value}.
+        All the values are sent at once, then the acknowledgements (the parameter
+        updates sent back by the drone) are awaited together.
+        Return False if not all of them arrived within timeout seconds.
+        '''
+        pending = set(values)
+        lock = Lock()
+        done = Event()
+
+        def param_updated(name, _value):
+            with lock:
+                pending.discard(name)
+                if not pending:
+                    done.set()
+
+        for name in values:
+            group, param = name.split('.')
+            cf.param.add_update_callback(group=group, name=param, cb=param_updated)
+        for name, value in values.items():
+            cf.param.set_value(name, value)
+
+        acked = done.wait(timeout)
+        for name in values:
+            group, param = name.split('.')
+            cf.param.remove_update_callback(group=group, name=param, cb=param_updated)
+        if not acked:
+            print("[SimpleCF._set_params()] Parameters ", pending, " not acknowledged by the drone ", self._uri)
+        return acked
+
+    def _wait_estimator(self, cf, timeout=KALMAN_SETTLE_TIMEOUT):
+        '''
+        Wait for the convergence of the Kalman filter, detected logging the variance
+        of the estimated position. Return False if it did not converge within timeout seconds.
+        '''
+        var_conf = LogConfig(name="cf_kalman_var", period_in_ms=KALMAN_VAR_PERIOD)
+        var_conf.add_variable('kalman.varPX', 'float')
+        var_conf.add_variable('kalman.varPY', 'float')
+        var_conf.add_variable('kalman.varPZ', 'float')
+
+        # Last KALMAN_VAR_WINDOW samples of the variance
+        var_window = DataBuffer((3,), max_len=KALMAN_VAR_WINDOW)
+        converged = Event()
+
+        def var_log_cb(_timestamp, data, _logconf):
+            var_window.append((data['kalman.varPX'], data['kalman.varPY'], data['kalman.varPZ']))
+            if len(var_window) == KALMAN_VAR_WINDOW and \
+                    np.all(np.ptp(var_window.view(), axis=1) < KALMAN_VAR_THRESHOLD):
+                converged.set()
+
+        cf.log.add_config(var_conf)
+        var_conf.data_received_cb.add_callback(var_log_cb)
+        var_conf.start()
+        flag = converged.wait(timeout)
+        var_conf.stop()
+        var_conf.delete()
+        if not flag:
+            print("[SimpleCF._wait_estimator()] Kalman filter of the drone ", self._uri, " not converged. Going on...")
+        return flag
+
+    def _reset_estimator(self, cf, controller):
+        # Set the controller and reset the Kalman filter, then wait for its convergence
+        t0 = time.monotonic()
+        self._set_params(cf, {'stabilizer.controller': controller, 'kalman.resetEstimation': '1'})
+        self._record_startup("params", t0)
+
+        t0 = time.monotonic()
+        self._wait_estimator(cf)
+        self._record_startup("estimator", t0)
+
     '''
     Check take off methods
     '''
-    def wait_for_take_off(self):
-        while not self.took_off():
-            time.sleep(0.2)
+    def wait_for_take_off(self, timeout=None):
+        # Return False if the drone did not take off within timeout seconds
+        return self._wait_event(self._took_off_event, "take_off", timeout)
 
     def took_off(self):
         # Check if the agent is flying
@@ -225,83 +663,167 @@ class SimpleCF:
             self._close_phlcommander()
         print("[SimpleCF._execute_wrapper()] End of execution.")
 
-    def _execute_swarm_wrapper(self, barrier):
+    def _execute_swarm_wrapper(self):
         '''
         This function, as the name suggets, wrap the execution of the action that 
         the agent has to complete IN A SWARM FORMATION.
 
-        This include an initial waiting phase until all the agents take off.
-        The barrier wait has exactly this goal.
+        The drone goes through the take off, ready and mission phases of the swarm
+        lifecycle: it takes off in its turn on the radio, waits for the others to be
+        airborne, executes the action (stopped after the mission timeout, if any) and lands.
+        If the swarm goes on without it, or aborts, the drone lands at once.
         '''
-        if not self.use_phlc:
-            self._init_commander()
+        lifecycle = self._lifecycle
+        flying = False
+        try:
+            lifecycle.takeoff_turn(self._swarm_idx)
+            if not self.use_phlc:
+                self._init_commander()
+            else:
+                self._init_phlcommander()
+            flying = True
+        except Exception as err:
+            print("[SimpleCF._execute_swarm_wrapper()] Take off of the drone ", self._uri, " failed: ")
+            print(err)
+
+        proceed = self._checkpoint("takeoff", flying) and self._checkpoint("ready", self._is_airborne())
+        if proceed:
+            timer = None
+            timeout = lifecycle.mission_timeout()
+            if timeout is not None:
+                timer = Timer(timeout, self._mission_stop.set)
+                timer.daemon = True
+                timer.start()
+            ok = True
             try:
-                print("Drone ", self._uri, " waiting for the others...")
-                barrier.wait(timeout=15)
                 self._executed_function(self)
-            except BrokenBarrierError:
-                print("[SimpleCF._execute_swarm_wrapper()] Barrier time out reached. Landing...")
             except Exception as err:
-                print("[SimpleCF._execute_swarm_wrapper()] An error occurred during initialization: ")
+                print("[SimpleCF._execute_swarm_wrapper()] An error occurred during the mission: ")
                 print(err)
-                print("Landing...")
-            self._close_commander()
+                ok = False
+            if timer is not None:
+                timer.cancel()
+            self._checkpoint("mission", ok)
         else:
-            while not self._first_log_arrived:
-                time.sleep(1)
-            self._init_phlcommander()
-            # Wait for all the drones to take off
-            try:
-                print("Drone ", self._uri, " waiting for the others...")
-                barrier.wait(timeout=15)
-                self._executed_function(self)
-            except BrokenBarrierError:
-                print("[SimpleCF._execute_swarm_wrapper()] Barrier time out reached. Landing...")
-            except Exception as err:
-                print("[SimpleCF._execute_swarm_wrapper()] An error occurred during initialization: ")
-                print(err)
-                print("Landing...")
-            self._close_phlcommander()
-                
+            print("[SimpleCF._execute_swarm_wrapper()] Drone ", self._uri, " left the swarm. Landing...")
+
+        if flying:
+            if not self.use_phlc:
+                self._close_commander()
+            else:
+                self._close_phlcommander()
+        self._checkpoint("land", flying)
         print("[SimpleCF._execute_wrapper()] End of execution.")
 
+    def _is_airborne(self, timeout=READY_LOG_TIMEOUT):
+        # Check, on a log newer than the take off, that the drone left the ground
+        snapshot = self.wait_for_next_sample(timeout=timeout)
+        return snapshot is not None and snapshot.pos[2] > DEFAULT_LANDING_HEIGHT
+
     '''
     Commanders initialization methods 
     '''
     def _init_commander(self):
+        # take_off() returns once the take off is completed
+        t0 = time.monotonic()
         mc = MotionCommander(self._scf, default_height=DEFAULT_HEIGHT)
         mc.take_off()
-        time.sleep(3)
+        self._record_startup("take_off", t0)
         self._motion_commander = mc
         self._commander = self._scf.cf.commander
+        self._set_took_off(True)
         self.wait_for_take_off()
-        self._commander_support_thread.start()
-        while not self._commander_support_thread.is_alive():
-            time.sleep(0.2)
+        self._get_scheduler().add_task(self._uri, self._send_position_setpoint, self._setpoint_rate)
 
     def _init_phlcommander(self):
-        while not self._first_log_arrived:
-            time.sleep(0.2)
+        self._wait_event(self._first_log_event, "first_log")
         p0 = self.get_last_position() 
         phlc = PositionHlCommander(self._scf, x=p0[0], y=p0[1], z=0, 
                 default_velocity=DEFAULT_VELOCITY, default_height=DEFAULT_HEIGHT, 
                 controller = PositionHlCommander.CONTROLLER_PID, default_landing_height = DEFAULT_LANDING_HEIGHT)
+        # take_off() returns once the take off is completed
+        t0 = time.monotonic()
         phlc.take_off()
-        time.sleep(3)
+        self._record_startup("take_off", t0)
         self._pos_hl_commander = phlc
         self._commander = self._scf.cf.commander
+        self._set_took_off(True)
         print("Wait take off...")
         self.wait_for_take_off()
 
     def _close_commander(self):
-        self._commander_support_thread_stop.set()
-        self._motion_commander.land()
+        if self._setpoint_scheduler is not None:
+            self._setpoint_scheduler.remove_task(self._uri)
+        if self._wait_emergency_land():
+            pass
+        elif self._motion_commander is not None:
+            # Not flying if the landing was taken over by emergency_land()
+            if self._motion_commander._is_flying:
+                self._motion_commander.land()
+        else:
+            # MotionCommander lost with the link (see _rebind_link()): land on board
+            self._scf.cf.commander.send_notify_setpoint_stop()
+            self._scf.cf.high_level_commander.land(0.0, EMERGENCY_LAND_DURATION)
+            time.sleep(EMERGENCY_LAND_DURATION)
+        self._set_took_off(False)
         # time.sleep(3)
 
     def _close_phlcommander(self):
-        self._pos_hl_commander.land()
+        if not self._wait_emergency_land():
+            self._pos_hl_commander.land()
+        self._set_took_off(False)
         # time.sleep(3)
 
+    def _wait_emergency_land(self):
+        # If an emergency landing was commanded, wait for its end instead of landing again
+        if not self._emergency.is_set():
+            return False
+        land_end = self._emergency_land_end
+        if land_end is not None and land_end > time.monotonic():
+            time.sleep(land_end - time.monotonic())
+        return True
+
+    def emergency_land(self, duration=EMERGENCY_LAND_DURATION):
+        '''
+        Land at once, without blocking: the mission is asked to stop and its commands
+        are ignored from now on. It can be called from any thread.
+
+        The landing is executed on board by the high level commander (after releasing the
+        low level setpoints when Commander is used). If that fails, the motors are stopped
+        with commander.send_stop_setpoint().
+
+        Return 'land' or 'stop' (the command sent), None if the drone is not connected.
+        '''
+        # The end of the landing is known before the mission is woken up, so that
+        #   _wait_emergency_land() never sees the flag without it
+        self._emergency_land_end = time.monotonic() + duration
+        self._emergency.set()
+        self._mission_stop.set()
+        self._cancel_arrival_check()
+        if self._setpoint_scheduler is not None:
+            self._setpoint_scheduler.remove_task(self._uri)
+
+        scf = self._scf
+        if scf is None or not scf.is_link_open():
+            return None
+        cf = scf.cf
+        try:
+            if not self.use_phlc:
+                # The hover setpoints of MotionCommander would override the landing
+                mc = self._motion_commander
+                if mc is not None and mc._thread is not None:
+                    mc._thread.stop()
+                    mc._thread = None
+                    mc._is_flying = False
+                cf.commander.send_notify_setpoint_stop()
+            cf.high_level_commander.land(0.0, duration)
+            return 'land'
+        except Exception as err:
+            print("[SimpleCF.emergency_land()] Land command to the drone ", self._uri, " failed, stopping the motors: ")
+            print(err)
+        cf.commander.send_stop_setpoint()
+        return 'stop'
+
     '''
     '''
     def _execute(self, this):
@@ -311,70 +833,405 @@ class SimpleCF:
     '''
     External position methods
     '''
-    def _enable_ext_pos(self):
-        self.extpos_recevier = Extpos(self._scf.cf)
+    def _enable_ext_pos(self, cf=None):
+        if cf is None:
+            cf = self._scf.cf
+        self.extpos_recevier = Extpos(cf)
+        self._extpos_forwarder = ExtposForwarder(self.extpos_recevier, self._get_scheduler(),
+                                                 (self._uri, "extpos"), rate=self.extpos_rate)
+        self._extpos_forwarder.start()
+
+    def _disable_ext_pos(self):
+        if self._extpos_forwarder is not None:
+            self._extpos_forwarder.stop()
+        self.extpos_recevier = None
 
-    def send_external_pos(self, pos):
-        if self.extpos_recevier is None:
+    def send_external_pos(self, pos, quat=None):
+        # Forward an external position (and, if given, the orientation quaternion
+        #   (qx, qy, qz, qw)). Just the newest pose is sent, at extpos_rate.
+        forwarder = self._extpos_forwarder
+        if self.extpos_recevier is None or forwarder is None:
             return
-        x = pos[0]
-        y = pos[1]
-        z = pos[2]
-        self.extpos_recevier.send_extpos(x, y, z)
+        forwarder.push(pos, quat)
+
+    def get_extpos_stats(self):
+        # Counters of the external position forwarding (see ExtposForwarder)
+        if self._extpos_forwarder is None:
+            return None
+        return self._extpos_forwarder.get_stats()
 
     '''
     Control methods
     '''
-    def go_to(self, x, y, z):
+    def go_to(self, x, y, z, wait=False, tol=DEFAULT_ARRIVAL_TOL, timeout=None, dwell=DEFAULT_ARRIVAL_DWELL):
+        '''
+        Send the drone to (x, y, z).
+
+        wait:       If True, return once the logged position stays within tol meters
+                    from the target for dwell seconds
+        timeout:    Maximum time (s) waited for the arrival. With PositionHlCommander it
+                    is counted after the planned duration of the motion
+
+        Return False if wait is True and the drone did not arrive within timeout seconds.
+        '''
         if self._pos_hl_commander == None and self._commander == None:
             print("[SimpleCF.go_to()] No commander object available.")
-            return
+            return False
+        if self._safety_target is not None or self._emergency.is_set():
+            print("[SimpleCF.go_to()] Safety override active on drone ", self._uri, ", command ignored.")
+            return False
 
-        # Update the setpoint, so the _commander_support_thread can access it
+        # Update the setpoint, so the setpoint scheduler can access it
         self._pos_set_point = np.array([x, y, z])
 
-        # If PositionHlCommander is used, send the setpoint via object
+        # The arrival is checked by the log callback, so it is registered before the
+        #   command is sent
+        if wait:
+            check = _ArrivalCheck(self._pos_set_point, tol, dwell, self._clock.now_ns())
+            self._arrival_check = check
+
+        # If PositionHlCommander is used, send the command to the high level commander.
+        #   Without arrival check, wait for the end of the planned motion, as
+        #   PositionHlCommander.go_to() does, unless the mission is stopped
+        duration = None
         if self.use_phlc:
-            self._pos_hl_commander.go_to(x, y, z)
+            duration = self._send_go_to(self._pos_set_point)
+            if not wait:
+                self._mission_stop.wait(duration)
+
+        if not wait:
+            return True
+        if duration is not None and timeout is not None:
+            timeout = duration + timeout
+        arrived = check.wait(timeout, self._mission_stop)
+        if self._arrival_check is check:
+            self._arrival_check = None
+        if arrived:
+            self._arrival_times.append(check.time_to_arrival)
+        elif check.cancelled or self._mission_stop.is_set():
+            print("[SimpleCF.go_to()] Motion of the drone ", self._uri, " interrupted.")
+        else:
+            self._arrival_timeouts += 1
+            print("[SimpleCF.go_to()] Drone ", self._uri, " did not reach the target in time.")
+        return arrived
+
+    def get_arrival_stats(self):
+        # Time to arrival statistics of the go_to(wait=True) commands
+        times = np.array(self._arrival_times)
+        if len(times) == 0:
+            return {"count": 0, "timeouts": self._arrival_timeouts}
+        return {
+            "count": len(times),
+            "timeouts": self._arrival_timeouts,
+            "mean": float(np.mean(times)),
+            "min": float(np.min(times)),
+            "max": float(np.max(times)),
+            "total": float(np.sum(times)),
+        }
+
+    def _send_go_to(self, target, duration=None):
+        # Send the drone to target without blocking: with PositionHlCommander the high
+        #   level commander is used directly, since PositionHlCommander.go_to() waits for
+        #   the end of the motion. By default the duration follows DEFAULT_VELOCITY.
+        #   Return the duration of the motion (None with Commander).
+        target = np.asarray(target, dtype=np.float64)
+        self._pos_set_point = target
+        if self.use_phlc and self._pos_hl_commander is not None:
+            if duration is None:
+                p0 = self.get_last_position()
+                distance = 0.0 if p0 is None else np.linalg.norm(target - p0)
+                duration = max(distance/DEFAULT_VELOCITY, 0.1)
+            self._scf.cf.high_level_commander.go_to(target[0], target[1], target[2], 0, duration)
+            self._set_phlc_position(target)
+            return duration
+        return None
+
+    def _set_phlc_position(self, pos):
+        # PositionHlCommander computes its motions (go_to, land) from the position it
+        #   commanded last: keep it aligned with the commands sent around it
+        phlc = self._pos_hl_commander
+        if phlc is not None:
+            phlc._x, phlc._y, phlc._z = (float(v) for v in pos)
+
+    def _go_to_nowait(self, target, duration=None, tol=DEFAULT_ARRIVAL_TOL, dwell=DEFAULT_ARRIVAL_DWELL):
+        '''
+        Non-blocking go_to used by SimpleCFSwarm to dispatch many commands at once.
+        Return the _ArrivalCheck of the command (its arrived event is set once the drone
+        stays within tol meters from target for dwell seconds), None if the command was
+        not sent.
+        '''
+        if self._pos_hl_commander == None and self._commander == None:
+            print("[SimpleCF._go_to_nowait()] No commander object available.")
+            return None
+        if self._safety_target is not None or self._emergency.is_set():
+            print("[SimpleCF._go_to_nowait()] Safety override active on drone ", self._uri, ", command ignored.")
+            return None
+        target = np.asarray(target, dtype=np.float64)
+        check = _ArrivalCheck(target, tol, dwell, self._clock.now_ns())
+        self._arrival_check = check
+        self._send_go_to(target, duration)
+        return check
+
+    def _safety_go_to(self, target, duration):
+        # Send the drone to target, overriding the mission until _clear_safety_override()
+        target = np.asarray(target, dtype=np.float64)
+        self._safety_target = target
+        self._cancel_arrival_check()
+        self._send_go_to(target, duration)
+
+    def _cancel_arrival_check(self):
+        # Release the go_to waiting for the arrival, the command being overridden
+        check = self._arrival_check
+        self._arrival_check = None
+        if check is not None:
+            check.cancel()
+
+    def _clear_safety_override(self):
+        self._safety_target = None
 
     def _send_position_setpoint(self):
-        # Method used to init the _commander_support_thread object.
-        # It sends continously the position reference to the drone via _commander object instance.
-        print("SEND_POSITION_THREAD STARTED")
-        while not self._commander_support_thread_stop.is_set():
-            if self._pos_set_point is None:
-                # print("SEND_POS_THREAD No position")
-                continue
-            # print("SEND_POS_THREAD")
-            x = self._pos_set_point[0]
-            y = self._pos_set_point[1]
-            z = self._pos_set_point[2]
-            self._commander.send_position_setpoint(x, y, z, 0)
-        print("SEND_POSITION_THREAD STOPPPED")
+        # Method called periodically by the setpoint scheduler.
+        # It sends the position reference to the drone via _commander object instance.
+        pos_set_point = self._pos_set_point
+        if pos_set_point is None or self._emergency.is_set() or self.is_offline:
+            return
+        x = pos_set_point[0]
+        y = pos_set_point[1]
+        z = pos_set_point[2]
+        self._commander.send_position_setpoint(x, y, z, 0)
+        self._setpoints_sent += 1
+
+    '''
+    Trajectory methods
+    '''
+    def upload_trajectory(self, trajectory, trajectory_id=1, offset=0):
+        '''
+        Upload a PolyTrajectory to the trajectory memory of the drone and define it
+        with the given trajectory_id. Then, it can be executed with run_trajectory().
+
+        offset: Address in the trajectory memory, used to store more than one trajectory
+        '''
+        traj_mems = self._scf.cf.mem.get_mems(MemoryElement.TYPE_TRAJ)
+        if len(traj_mems) == 0:
+            print("[SimpleCF.upload_trajectory()] No trajectory memory available on the drone ", self._uri)
+            return False
+        traj_mem = traj_mems[0]
+        if offset + trajectory.size > traj_mem.size:
+            print("[SimpleCF.upload_trajectory()] The trajectory does not fit the trajectory memory.")
+            return False
+
+        traj_mem.trajectory = trajectory.to_poly4d()
+        if not traj_mem.write_data_sync(start_addr=offset):
+            print("[SimpleCF.upload_trajectory()] Upload failed.")
+            return False
+        self._scf.cf.high_level_commander.define_trajectory(trajectory_id, offset, trajectory.n_pieces)
+        self._trajectories[trajectory_id] = trajectory
+        return True
+
+    def run_trajectory(self, trajectory_id=1, time_scale=1.0, relative=False, wait=True):
+        '''
+        Start the execution on board of an uploaded trajectory.
+
+        time_scale: 1.0 original speed, >1.0 slower, <1.0 faster
+
+        relative:   If True, the trajectory is shifted to the current setpoint
+
+        wait:       If True, return once the trajectory is completed (or the mission is stopped)
+        '''
+        if not self.use_phlc:
+            # Setpoints streamed by the low level commander would override the trajectory
+            print("[SimpleCF.run_trajectory()] Trajectories can be executed only with PositionHlCommander.")
+            return
+        if trajectory_id not in self._trajectories:
+            print("[SimpleCF.run_trajectory()] Trajectory ", trajectory_id, " not uploaded.")
+            return
+        trajectory = self._trajectories[trajectory_id]
+        self._scf.cf.high_level_commander.start_trajectory(trajectory_id, time_scale, relative)
+        # The trajectory ends at its last waypoint (shifted to the current setpoint if relative)
+        end = trajectory.evaluate(trajectory.duration)[:, 0]
+        if relative and self._pos_hl_commander is not None:
+            end = end - trajectory.evaluate(0.0)[:, 0] + np.array(self._pos_hl_commander.get_position())
+        self._pos_set_point = end
+        self._set_phlc_position(end)
+        if wait:
+            self._mission_stop.wait(trajectory.duration*time_scale)
+
+    def fly_waypoints(self, waypoints, times, trajectory_id=1, time_scale=1.0):
+        '''
+        Fit a trajectory through the (N, 3) waypoints, reached at the given times
+        (measured from the start of the trajectory), upload and execute it.
+        The first waypoint should be the current position of the drone.
+        '''
+        trajectory = PolyTrajectory.fit(waypoints, times)
+        if self.upload_trajectory(trajectory, trajectory_id):
+            self.run_trajectory(trajectory_id, time_scale)
+
+    def fly_planned_trajectory(self, trajectory_id=1, time_scale=1.0):
+        # Upload and execute the trajectory assigned by SimpleCFSwarm.assign_trajectories()
+        if self._planned_trajectory is None:
+            print("[SimpleCF.fly_planned_trajectory()] No trajectory assigned to the drone ", self._uri)
+            return
+        if self.upload_trajectory(self._planned_trajectory, trajectory_id):
+            self.run_trajectory(trajectory_id, time_scale)
+
+    def _get_scheduler(self):
+        # Scheduler used for the periodic tasks of the drone (setpoints, external poses).
+        # If no scheduler has been shared (see SimpleCFSwarm), a private one is created.
+        if self._setpoint_scheduler is None:
+            self._setpoint_scheduler = RateScheduler(name="SimpleCF_" + self._uri)
+            self._own_setpoint_scheduler = True
+        return self._setpoint_scheduler
+
+    def get_setpoint_stats(self):
+        # Timing statistics of the setpoint streaming (see RateScheduler)
+        if self._setpoint_scheduler is None:
+            return None
+        return self._setpoint_scheduler.get_stats(self._uri)
 
     '''
     Log and getter methods
     '''
-    def _async_log_cb(self, data):
-        self._default_log_cb(data)
-        # Add eventual logic to manage custom logs
-
-    def _default_log_cb(self, data):
-        # Reconstruct position vector
-        pos = np.array([[data['kalman.stateX']],
-                        [data['kalman.stateY']], 
-                        [data['kalman.stateZ']]]
-                    )
-
-        # Store current position
-        self._pos_time = np.append(self._pos_time, time.time()-self._start_time)
-        self._pos = np.append(self._pos, pos, axis=1)
-        if not self._first_log_arrived:
-            self._first_log_arrived = True
+    def _start_logs(self, cf):
+        # The default block is created again at each connection, so that variables and
+        #   callbacks are not added twice when the drone is started more than once
+        self._log_conf = LogConfig(name="cf_log_conf", period_in_ms=self._ts)
+        self._default_log_config()
+        self._log_blocks = [self._log_conf]
+        # The drone tick restarts when the drone is rebooted
+        self._clock_sync.reset()
+        if len(self._log_planner) > 0:
+            self._log_blocks += self._log_planner.plan(self._ts, cf.log.toc, base_blocks=[self._log_conf])
+
+        for block in self._log_blocks:
+            self._telemetry.add_block(block)
+            cf.log.add_config(block)
+            block.data_received_cb.add_callback(
+                lambda timestamp, data, logconf: self._async_log_cb(data, timestamp, logconf)
+            )
+        for block in self._log_blocks:
+            block.start()
+
+    def _stop_logs(self):
+        for block in self._log_blocks:
+            block.stop()
+
+    def _async_log_cb(self, data, timestamp=None, logconf=None):
+        # Every packet, whatever its block, updates the model of the drone clock
+        t = None
+        if timestamp is not None:
+            now = self._clock.now_ns()
+            t = self._clock_sync.update(timestamp, now)
+            latency = self._log_latency
+            latency[0] += 1
+            latency[1] += now - t
+            latency[2] = max(latency[2], now - t)
+
+        # The position is in the default block, custom variables can be in any block
+        if logconf is None or logconf is self._log_conf:
+            self._default_log_cb(data, t)
+        if logconf is not None:
+            self._telemetry.append(logconf.name, timestamp, data)
+
+    def _default_log_cb(self, data, t=None):
+        # Store time and position. Without the drone timestamp, the arrival time is used.
+        if t is None:
+            t = self._clock.now_ns()
+        pos = np.array([data['kalman.stateX'], data['kalman.stateY'], data['kalman.stateZ']])
+        self._pos_log.append((t, pos))
+        self._state.publish(t, pos)
+        swarm_state = self._swarm_state
+        if swarm_state is not None:
+            swarm_state.update(self._swarm_idx, t, pos)
+        if not self._first_log_event.is_set():
+            self._first_log_event.set()
+
+        # Signal the arrival of a pending go_to(wait=True)
+        check = self._arrival_check
+        if check is not None:
+            check.update(t, pos)
+
+    @property
+    def _pos(self):
+        # Data estimated and logged by the drone, as a (3, N) array (view, not a copy)
+        return self._pos_log.view()['pos'].T
+
+    @property
+    def _pos_time(self):
+        # Host time (int64 ns) associated to position logs (view, not a copy)
+        return self._pos_log.view()['time']
 
     def get_last_position(self):
-        # Return the last logged position
-        return np.reshape(self._pos[:, np.size(self._pos, 1)-1], (3,))
+        # Return the last logged position (None before the first log)
+        snapshot = self._state.snapshot()
+        return None if snapshot is None else snapshot.pos
+
+    def get_snapshot(self):
+        # Last logged sample as a StateSnapshot (seq, time, pos), None before the first log
+        return self._state.snapshot()
+
+    def wait_for_next_sample(self, after_seq=None, timeout=None):
+        # Block until a sample newer than after_seq is logged and return its StateSnapshot,
+        #   None if the timeout (s) expired (see StateSlot.wait_for_next_sample())
+        return self._state.wait_for_next_sample(after_seq, timeout)
+
+    def get_telemetry(self, names=None):
+        # All the logged variables (or the given ones) aligned on the drone timestamps (ms).
+        #   'time' contains the same timestamps converted in host time (int64 ns).
+        telemetry = self._telemetry.merged(names)
+        telemetry['time'] = self._clock_sync.to_host(telemetry['timestamp'])
+        return telemetry
+
+    def get_radio_load(self):
+        '''
+        Packets per second exchanged with the drone, as configured: logs (down), position
+        setpoints and external poses (up). Once connected the log blocks in use are
+        counted, before they are estimated (see LogPlanner.estimate_blocks()).
+        '''
+        if self._log_blocks:
+            log_rate = sum(1000.0/block.period_in_ms for block in self._log_blocks)
+        else:
+            default_used = LogPlanner.block_size(self._log_conf)
+            blocks = self._log_planner.estimate_blocks(self._ts, {self._ts: default_used})
+            log_rate = 1000.0/self._ts + sum(n*1000.0/period for period, n in blocks.items())
+        setpoint_rate = 0.0 if self.use_phlc else float(self._setpoint_rate)
+        extpos_rate = float(self.extpos_rate) if self.use_extpos else 0.0
+        return {
+            "log": log_rate,
+            "setpoint": setpoint_rate,
+            "extpos": extpos_rate,
+            "up": setpoint_rate + extpos_rate,
+            "down": log_rate,
+        }
+
+    def get_packet_counts(self):
+        # Packets exchanged with the drone since its creation, by kind
+        extpos = self.get_extpos_stats()
+        return {
+            "log": int(self._log_latency[0]),
+            "setpoint": self._setpoints_sent,
+            "extpos": extpos["sent"] if extpos is not None else 0,
+        }
+
+    def get_log_latency_stats(self):
+        # Delay (s) between the sampling time of the logs and their processing on the host
+        count, total, worst = (int(v) for v in self._log_latency)
+        return {
+            "count": count,
+            "mean": total/count/1e9 if count > 0 else 0.0,
+            "max": worst/1e9,
+        }
+
+    def get_clock_stats(self):
+        # Offset and drift of the drone clock with respect to the host clock (see ClockSync)
+        return self._clock_sync.get_stats()
+
+    def get_log_variable(self, name, t_start=None, t_end=None):
+        # Timestamps (ms) and values of a logged variable, optionally in [t_start, t_end)
+        return self._telemetry.slice(name, t_start, t_end)
+
+    def get_latest_log(self, names=None):
+        # Last timestamp (ms) and value of each logged variable
+        return self._telemetry.latest(names)
         
 if __name__ == '__main__':
     # Initialize the low-level drivers
@@ -1,20 +1,78 @@
 import numpy as np
 import time
 
-from threading import Barrier, Thread
+from threading import Condition, Thread
 
 import cflib.crtp
-from CFLib.SimpleCF import SimpleCF
+from CFLib.SimpleCF import SimpleCF, EMERGENCY_LAND_DURATION
+from CFLib.RateScheduler import RateScheduler
+from CFLib.PolyTrajectory import PolyTrajectory
+from CFLib.TocCacheManager import TocCacheManager
+from CFLib.HostClock import HostClock
+from CFLib.SwarmState import SwarmState
+from CFLib.Formation import Formation
+from CFLib.SwarmLifecycle import SwarmLifecycle, DEFAULT_TAKEOFF_STAGGER, radio_of
+from CFLib.SeparationMonitor import SeparationMonitor, DEFAULT_MIN_SEPARATION, DEFAULT_MONITOR_RATE
+from CFLib.BandwidthPlanner import BandwidthPlanner
+
+# Time (s) within which kill_all() must have sent the land commands to all the drones
+DEFAULT_KILL_DEADLINE = 1.0
 
 class SimpleCFSwarm():
     
-    def __init__(self, uris):
-        self._cfs = [SimpleCF(uri) for uri in uris]
+    def __init__(self, uris, toc_cache=None, clock=None):
+        # All the drones share the same TOC cache and the same timebase
+        self._toc_cache = toc_cache if toc_cache is not None else TocCacheManager.get_default()
+        self._clock = clock if clock is not None else HostClock.get_default()
+        self._cfs = [SimpleCF(uri, clock=self._clock, toc_cache=self._toc_cache) for uri in uris]
         self.cfs_threads = []
-        self._sync_barrier = None
+        # Thread driving each drone, started by start_swarm() or _run_parallel() (None if none)
+        self._drone_threads = [None]*len(self._cfs)
+
+        # Phases of the last start_swarm(), see SwarmLifecycle
+        self._lifecycle = None
+
+        # A single scheduler thread streams the position setpoints and the external
+        #   poses of all the drones
+        self._setpoint_scheduler = RateScheduler(name="SimpleCFSwarm_setpoint")
+        for cf in self._cfs:
+            cf._setpoint_scheduler = self._setpoint_scheduler
+
+        # Positions and times of all the drones, row k updated by the logs of drone k
+        self._swarm_state = SwarmState(len(self._cfs))
+        for idx, cf in enumerate(self._cfs):
+            cf._swarm_state = self._swarm_state
+            cf._swarm_idx = idx
 
-    def enable_extpos(self, cf_idx):
-        self._cfs.use_extpos = True
+        # Timing of the last formation change, see form()
+        self.formation_stats = {}
+
+        # Outcome of the last kill_all() for each drone
+        self.kill_report = {}
+
+        # Check of the distances between the drones, see start_separation_monitor()
+        self._separation_monitor = None
+
+        # Radio load of the swarm, checked before the drones are started with
+        #   bandwidth_policy ('warn', 'reject' or 'scale'), see check_bandwidth()
+        self._bandwidth = BandwidthPlanner()
+        self.bandwidth_policy = "warn"
+
+        # Condition notified by the drones when they take off or land
+        self._state_cond = Condition()
+        for cf in self._cfs:
+            cf._state_cond = self._state_cond
+
+        # Time (s) spent waiting in each swarm phase, identified by name
+        self.wait_times = {}
+
+    def set_setpoint_rate(self, cf_idx, rate):
+        self._cfs[cf_idx]._setpoint_rate = rate
+
+    def enable_extpos(self, cf_idx, rate=None):
+        self._cfs[cf_idx].use_extpos = True
+        if rate is not None:
+            self._cfs[cf_idx].extpos_rate = rate
 
     def enable_extpos_all(self):
         for cf in self._cfs:
@@ -23,49 +81,269 @@ class SimpleCFSwarm():
     def assign_execute_method(self, cf_idx, executed_method):
         self._cfs[cf_idx]._executed_function = executed_method
 
+    def assign_trajectories(self, waypoints, times, time_scale=1.0):
+        '''
+        Fit the trajectories of all the drones with a single vectorized computation,
+        and assign to each drone an action that uploads and executes its own trajectory.
+
+        waypoints:  (D, N, 3) array: N positions for each of the D drones
+
+        times:      (N,) array of times at which the waypoints are reached
+        '''
+        trajectories = PolyTrajectory.fit_many(waypoints, times)
+        for cf, trajectory in zip(self._cfs, trajectories):
+            cf._planned_trajectory = trajectory
+            cf._executed_function = lambda this: this.fly_planned_trajectory(time_scale=time_scale)
+
     def assign_all_empty(self):
         for cf in self._cfs:
             cf._executed_function = SimpleCFSwarm._empty
 
-    def wait_all_ready(self):
+    def wait_all_ready(self, timeout=None):
+        # Wait until all the drones took off.
+        # Return False if the timeout expired.
+        t0 = time.monotonic()
+        with self._state_cond:
+            ready = self._state_cond.wait_for(
+                lambda: all(cf._took_off_event.is_set() for cf in self._cfs), timeout)
+        self.wait_times["all_ready"] = time.monotonic() - t0
+        return ready
+
+    def get_snapshot(self):
+        # Consistent copy of the positions (N, 3), times (N,) and sample counts (N,) of the
+        #   drones, in the order of the uris (see SwarmState.snapshot())
+        return self._swarm_state.snapshot()
+
+    def get_positions(self):
+        # (N, 3) last positions of the drones, NaN for the drones without logs
+        return self._swarm_state.snapshot().pos
+
+    def get_centroid(self):
+        return np.nanmean(self.get_positions(), axis=0)
+
+    def get_distances(self):
+        # (N, N) distances between the drones
+        return SwarmState.pairwise_distances(self.get_positions())
+
+    def form(self, formation, wait=False, timeout=None, duration=None):
         '''
-        repeat = True
-        while repeat:
-            repeat = False
-            for cf in self._cfs:
-                if not cf.took_off():
-                    repeat = True
-                    break
-            time.sleep(1)
+        Move the swarm in a formation, assigning each drone to a slot so that the total
+        distance flown is minimum (see Formation.assign()). The go_to commands are sent
+        to all the drones at once, without waiting for each motion.
+
+        formation:  Formation, or (M, 3) array of slots (M >= number of drones)
+
+        wait:       If True, return once all the drones reached their slot or the
+                    timeout (s) expired
+
+        duration:   Duration (s) of the motions with PositionHlCommander. If None,
+                    it follows the distance of each drone from its slot
+
+        Return the (N,) array with the slot assigned to each drone, None if some drone
+        has no position yet. If wait is True, return also whether all the drones arrived.
         '''
-        wait = True
-        while wait:
-            wait = self._sync_barrier.n_waiting == len(self._cfs)
-            time.sleep(1)
+        if not isinstance(formation, Formation):
+            formation = Formation(formation)
+        t0 = time.perf_counter()
+        snapshot = self._swarm_state.snapshot()
+        if not np.all(np.isfinite(snapshot.pos)):
+            print("[SimpleCFSwarm.form()] Not all the drones have a position yet.")
+            return (None, False) if wait else None
+        slot_of, distance = formation.assign(snapshot.pos)
+        targets = formation.slots[slot_of]
+
+        t1 = time.perf_counter()
+        checks = [cf._go_to_nowait(target, duration) for cf, target in zip(self._cfs, targets)]
+        t2 = time.perf_counter()
+        self.formation_stats = {
+            "drones": len(self._cfs),
+            "slots": len(formation),
+            "total_distance": distance,
+            "plan_time": t1 - t0,
+            "dispatch_time": t2 - t1,
+        }
+        if not wait:
+            return slot_of
+
+        # Wait for the arrivals with a single deadline for the whole swarm
+        arrived = all(check is not None for check in checks)
+        deadline = None if timeout is None else time.monotonic() + timeout
+        for cf, check in zip(self._cfs, checks):
+            if check is None:
+                continue
+            remaining = None if deadline is None else max(deadline - time.monotonic(), 0.0)
+            arrived = check.wait(remaining, cf._mission_stop) and arrived
+        self.formation_stats["wait_time"] = time.perf_counter() - t2
+        return slot_of, arrived
+
+    def start_separation_monitor(self, min_separation=DEFAULT_MIN_SEPARATION, response="hold",
+                                 rate=DEFAULT_MONITOR_RATE, **kwargs):
+        # Check the distances between the flying drones in background (see SeparationMonitor)
+        self.stop_separation_monitor()
+        self._separation_monitor = SeparationMonitor(self._swarm_state, self._cfs, min_separation=min_separation,
+                                                     rate=rate, response=response, **kwargs)
+        self._separation_monitor.start()
+        return self._separation_monitor
+
+    def stop_separation_monitor(self):
+        if self._separation_monitor is not None:
+            self._separation_monitor.stop()
+
+    def get_separation_stats(self):
+        if self._separation_monitor is None:
+            return None
+        return self._separation_monitor.get_stats()
+
+    def check_bandwidth(self, policy=None):
+        '''
+        Check that the log, setpoint and extpos rates of the drones fit their radios
+        (see BandwidthPlanner.check()). policy overrides bandwidth_policy.
+        Return the load planned on each radio.
+        '''
+        return self._bandwidth.check(self._cfs, self.bandwidth_policy if policy is None else policy)
+
+    def get_radio_utilization(self):
+        # Utilization of each radio since the previous call (see BandwidthPlanner.sample())
+        return self._bandwidth.sample(self._cfs)
+
+    def get_lifecycle_report(self):
+        # Status of each drone and time spent in each phase (see SwarmLifecycle.get_report())
+        if self._lifecycle is None:
+            return None
+        return self._lifecycle.get_report()
+
+    def prefetch_toc(self):
+        # Warm the TOC cache connecting to all the drones in parallel
+        return self._toc_cache.prefetch([cf._uri for cf in self._cfs])
+
+    def get_startup_stats(self):
+        '''
+        Start up times of the swarm: for each phase (see SimpleCF.startup_times),
+        mean, min and max over the drones that completed it.
+        '''
+        phases = {phase for cf in self._cfs for phase in cf.startup_times}
+        stats = {}
+        for phase in phases:
+            times = np.array([cf.startup_times[phase] for cf in self._cfs if phase in cf.startup_times])
+            stats[phase] = {
+                "count": len(times),
+                "mean": float(np.mean(times)),
+                "min": float(np.min(times)),
+                "max": float(np.max(times)),
+            }
+        return stats
 
     @staticmethod
     def _empty(cf):
-        while True:
-            pass
+        # Keep the drone hovering until the mission is stopped (see kill_all())
+        cf._mission_stop.wait()
+
+    def start_swarm(self, policies=None, stagger=DEFAULT_TAKEOFF_STAGGER):
+        '''
+        Start all the drones, each in its own thread, through the phases of a SwarmLifecycle.
 
-    def start_swarm(self):
-        self._sync_barrier = Barrier(len(self._cfs))
+        policies:   Dictionary {phase: PhasePolicy} with the timeout and quorum of the
+                    phases to change (see SwarmLifecycle.DEFAULT_POLICIES)
+
+        stagger:    Interval (s) between two take off commands on the same radio
+        '''
+        self.check_bandwidth()
+        self._lifecycle = SwarmLifecycle([cf._uri for cf in self._cfs], policies=policies, stagger=stagger)
+        self._lifecycle.start()
+        self.cfs_threads = []
         for cf in self._cfs:
-            t = Thread( target=cf.start_drone, args=(True, self._sync_barrier) )
+            cf._lifecycle = self._lifecycle
+            t = Thread( target=cf.start_drone, args=(True,) )
             self.cfs_threads.append( t )
+        self._drone_threads = list(self.cfs_threads)
 
         for t in self.cfs_threads:
             t.start()
 
-    def kill_all(self):
+    def _run_parallel(self, fn):
+        # Call fn(cf) on all the drones, each in its own thread, and return the results
+        results = [None]*len(self._cfs)
+
+        def run(idx, cf):
+            results[idx] = fn(cf)
+
+        threads = [Thread(target=run, args=(idx, cf)) for idx, cf in enumerate(self._cfs)]
+        self._drone_threads = threads
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        return results
+
+    def connect_all(self, **kwargs):
+        # Connect all the drones in parallel and keep them connected across missions
+        #   (see SimpleCF.connect()). Parameters are passed to LinkSupervisor.
+        self.check_bandwidth()
+        return self._run_parallel(lambda cf: cf.connect(**kwargs))
+
+    def run_missions(self, land=True, timeout=None):
+        # Execute the assigned actions on the connected drones, in parallel
+        #   (see SimpleCF.run_mission()). With land False the swarm keeps hovering.
+        return self._run_parallel(lambda cf: cf.run_mission(land=land, timeout=timeout))
+
+    def disconnect_all(self):
+        self._run_parallel(lambda cf: cf.disconnect())
+
+    def get_link_stats(self):
+        return {cf._uri: cf.get_link_stats() for cf in self._cfs}
+
+    def kill_all(self, deadline=DEFAULT_KILL_DEADLINE, duration=EMERGENCY_LAND_DURATION):
+        '''
+        Land all the drones at once (see SimpleCF.emergency_land()).
+
+        The land commands are sent by one thread for each radio (each one stops the
+        mission of its drone, see SimpleCF.emergency_land()): the drones sharing a radio are served back to back, the radios
+        in parallel. Broadcast packets are not used, since they are not acknowledged.
+
+        deadline:   Time (s) within which all the commands should be sent. The drones
+                    not served by then are reported with land_command None
+
+        duration:   Duration (s) of the landing
+
+        Return, for each drone (by URI), the time (s) from the call to its land command,
+        the command sent ('land', 'stop' or None), the error if any, and whether its
+        thread (start_swarm() or run_missions()) exited within the deadline, None if
+        no thread was started for it.
+        '''
+        t0 = time.monotonic()
+        self.stop_separation_monitor()
+
+        report = {cf._uri: {"land_command": None, "method": None, "error": None, "thread_exited": None}
+                  for cf in self._cfs}
+
+        def land_radio(cfs):
+            for cf in cfs:
+                entry = report[cf._uri]
+                try:
+                    entry["method"] = cf.emergency_land(duration)
+                except Exception as err:
+                    entry["error"] = str(err)
+                entry["land_command"] = time.monotonic() - t0
+
+        radios = {}
         for cf in self._cfs:
-            try:
-                cf.stop_drone()
-            except:
-                pass
+            radios.setdefault(radio_of(cf._uri), []).append(cf)
+        threads = [Thread(target=land_radio, args=(cfs,), daemon=True) for cfs in radios.values()]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join(max(t0 + deadline - time.monotonic(), 0.0))
 
-        for t in self.cfs_threads:
-            try:
-                t._stop()
-            except:
-                pass
\ No newline at end of file
+        late = [uri for uri, entry in report.items() if entry["land_command"] is None]
+        if late:
+            print("[SimpleCFSwarm.kill_all()] Land command not sent within the deadline to ", late)
+
+        # The mission threads stop cooperatively (_mission_stop), then land and disconnect
+        for cf, t in zip(self._cfs, self._drone_threads):
+            if t is None:
+                continue
+            t.join(max(t0 + deadline - time.monotonic(), 0.0))
+            report[cf._uri]["thread_exited"] = not t.is_alive()
+
+        self.kill_report = report
+        return report
@@ -0,0 +1,767 @@
+import time
+import queue
+import struct
+import numpy as np
+
+from threading import Lock, Thread
+
+from cflib.crtp.crtpstack import CRTPPacket, CRTPPort
+from cflib.crazyflie.log import Log, LogTocElement, CHAN_SETTINGS, CHAN_LOGDATA, \
+    CMD_CREATE_BLOCK, CMD_CREATE_BLOCK_V2, CMD_START_LOGGING, CMD_STOP_LOGGING, CMD_DELETE_BLOCK, CMD_RESET_LOGGING
+from cflib.crazyflie.toc import Toc
+from cflib.crazyflie.mem import MemoryElement
+from cflib.utils.callbacks import Caller
+
+from CFLib.RateScheduler import RateScheduler
+
+# Frequency (Hz) of the simulation step: dynamics of all the drones and log packets
+DEFAULT_SIM_RATE = 100
+# Time (s) needed to open a link and to download the parameters
+DEFAULT_CONNECT_DELAY = 0.05
+DEFAULT_PARAM_DELAY = 0.05
+# Distance (m) between the drones placed on the ground by default
+DEFAULT_SPAWN_SPACING = 0.5
+
+# Point-mass dynamics: PD tracking of the reference position (and of its velocity),
+#   critically damped, with limited acceleration (m/s^2)
+SIM_KP = 36.0
+SIM_KD = 2*np.sqrt(SIM_KP)
+SIM_MAX_ACCEL = 6.0
+GRAVITY = 9.81
+# The motors stop if no low level setpoint arrives for this time (s), as the on-board watchdog
+COMMANDER_WATCHDOG = 0.5
+
+# Kalman variance logged after a reset: VAR_FLOOR + VAR_INITIAL*exp(-t/VAR_TAU)
+VAR_INITIAL = 0.05
+VAR_TAU = 0.2
+VAR_FLOOR = 1e-4
+
+# Size (bytes) of the simulated trajectory memory
+TRAJ_MEMORY_SIZE = 4096
+
+# Control modes of a simulated drone
+MODE_OFF = 0
+MODE_HL = 1
+MODE_POSITION = 2
+MODE_VELOCITY = 3
+MODE_TRAJECTORY = 4
+
+# Log variables of the simulated TOC: {name: (type, state array, column)}
+LOG_VARIABLES = {
+    "kalman.stateX": ("float", "est", 0),
+    "kalman.stateY": ("float", "est", 1),
+    "kalman.stateZ": ("float", "est", 2),
+    "kalman.varPX": ("float", "var", None),
+    "kalman.varPY": ("float", "var", None),
+    "kalman.varPZ": ("float", "var", None),
+    "stateEstimate.x": ("float", "est", 0),
+    "stateEstimate.y": ("float", "est", 1),
+    "stateEstimate.z": ("float", "est", 2),
+    "stateEstimate.vx": ("float", "vel", 0),
+    "stateEstimate.vy": ("float", "vel", 1),
+    "stateEstimate.vz": ("float", "vel", 2),
+    "pm.vbat": ("float", "vbat", None),
+}
+
+# Parameters of the simulated TOC, with their initial value
+PARAMETERS = {
+    "stabilizer.controller": "1",
+    "stabilizer.estimator": "2",
+    "kalman.resetEstimation": "0",
+    "commander.enHighLevel": "1",
+}
+
+def _build_log_toc():
+    toc = Toc()
+    for ident, (name, (ctype, _, _)) in enumerate(LOG_VARIABLES.items()):
+        group, var = name.split(".")
+        data = bytes([LogTocElement.get_id_from_cstring(ctype)]) + group.encode() + b"\0" + var.encode() + b"\0"
+        toc.add_element(LogTocElement(ident, data))
+    return toc
+
+class _CacheStats:
+
+    # Stand-in for the SharedTocCache of a connection: the simulated TOC is never cached
+    hits = 0
+    misses = 0
+
+class _SimLink:
+
+    def __init__(self, uri):
+        self.uri = uri
+
+    def close(self):
+        pass
+
+class _SimDrone:
+
+    '''
+    Python side of a simulated drone (row idx of the arrays of SimulatedSwarm): link,
+    started log blocks and trajectories.
+    '''
+
+    def __init__(self, uri, idx):
+        self.uri = uri
+        self.idx = idx
+        self.boot = time.monotonic()
+        # SimCrazyflie connected to the drone, and links refused until down_until
+        self.cf = None
+        self.down_until = 0.0
+        # Started log blocks: {block id: [period (s), next due time, LogConfig]}
+        self.blocks = {}
+        # Trajectory memory {offset: pieces}, trajectories {id: (offset, n_pieces)} and the
+        #   trajectory being executed (start times (P+1,), (P, 3, 8) coefficients, t0, time scale, shift)
+        self.memory = {}
+        self.trajectories = {}
+        self.trajectory = None
+
+    def tick(self, now):
+        # Log timestamp: ms from the boot of the drone, on 24 bits as in the log packets
+        return int((now - self.boot)*1000) & 0xFFFFFF
+
+class SimCommander:
+
+    '''
+    Stand-in for the cflib Commander: low level setpoints.
+    '''
+
+    def __init__(self, cf):
+        self._cf = cf
+
+    def _set(self, mode, ref=None, vref=None):
+        if self._cf.link is not None:
+            self._cf._sim.set_low_level(self._cf._drone.idx, mode, ref, vref)
+
+    def send_setpoint(self, roll, pitch, yawrate, thrust):
+        # Attitude is not simulated: zero thrust stops the motors, otherwise the drone hovers
+        if thrust == 0:
+            self.send_stop_setpoint()
+        else:
+            self._set(MODE_VELOCITY, vref=(0.0, 0.0, None))
+
+    def send_stop_setpoint(self):
+        if self._cf.link is not None:
+            self._cf._sim.stop_motors(self._cf._drone.idx)
+
+    def send_notify_setpoint_stop(self, remain_valid_milliseconds=0):
+        if self._cf.link is not None:
+            self._cf._sim.hand_over(self._cf._drone.idx)
+
+    def send_velocity_world_setpoint(self, vx, vy, vz, yawrate):
+        self._set(MODE_VELOCITY, vref=(vx, vy, vz))
+
+    def send_zdistance_setpoint(self, roll, pitch, yawrate, zdistance):
+        self._set(MODE_VELOCITY, ref=(None, None, zdistance), vref=(0.0, 0.0, None))
+
+    def send_hover_setpoint(self, vx, vy, yawrate, zdistance):
+        # Yaw is not simulated: body and world frames coincide
+        self._set(MODE_VELOCITY, ref=(None, None, zdistance), vref=(vx, vy, None))
+
+    def send_position_setpoint(self, x, y, z, yaw):
+        self._set(MODE_POSITION, ref=(x, y, z))
+
+    def send_full_state_setpoint(self, pos, vel, acc, orientation, rollrate, pitchrate, yawrate):
+        self._set(MODE_POSITION, ref=tuple(pos))
+
+class SimHighLevelCommander:
+
+    '''
+    Stand-in for the cflib HighLevelCommander: motions planned on board.
+    '''
+
+    def __init__(self, cf):
+        self._cf = cf
+
+    def _plan(self, goal, duration, relative=False, land=False):
+        if self._cf.link is not None:
+            self._cf._sim.plan(self._cf._drone.idx, goal, duration, relative, land)
+
+    def set_group_mask(self, group_mask=0):
+        pass
+
+    def takeoff(self, absolute_height_m, duration_s, group_mask=0, yaw=0.0):
+        self._plan((None, None, absolute_height_m), duration_s)
+
+    def land(self, absolute_height_m, duration_s, group_mask=0, yaw=0.0):
+        self._plan((None, None, absolute_height_m), duration_s, land=True)
+
+    def stop(self, group_mask=0):
+        if self._cf.link is not None:
+            self._cf._sim.stop_motors(self._cf._drone.idx)
+
+    def go_to(self, x, y, z, yaw, duration_s, relative=False, linear=False, group_mask=0):
+        self._plan((x, y, z), duration_s, relative)
+
+    def define_trajectory(self, trajectory_id, offset, n_pieces, type=0):
+        self._cf._drone.trajectories[trajectory_id] = (offset, n_pieces)
+
+    def start_trajectory(self, trajectory_id, time_scale=1.0, relative=False, reversed=False, group_mask=0):
+        if self._cf.link is not None:
+            self._cf._sim.start_trajectory(self._cf._drone.idx, trajectory_id, time_scale, relative)
+
+class SimLocalization:
+
+    '''
+    Stand-in for the cflib Localization: external poses are counted, the simulated
+    estimate does not need them.
+    '''
+
+    def __init__(self, cf):
+        self._cf = cf
+
+    def send_extpos(self, pos):
+        if self._cf.link is not None:
+            self._cf._sim.count("extpos")
+
+    def send_extpose(self, pos, quat):
+        self.send_extpos(pos)
+
+class _SimTrajectoryMemory:
+
+    def __init__(self, drone):
+        self._drone = drone
+        self.size = TRAJ_MEMORY_SIZE
+        self.trajectory = []
+
+    def write_data_sync(self, start_addr=0):
+        self._drone.memory[start_addr] = list(self.trajectory)
+        return True
+
+class SimMemory:
+
+    def __init__(self, cf):
+        self._cf = cf
+
+    def get_mems(self, type):
+        if type == MemoryElement.TYPE_TRAJ and self._cf._drone is not None:
+            return [_SimTrajectoryMemory(self._cf._drone)]
+        return []
+
+class SimParam:
+
+    '''
+    Stand-in for the cflib Param: values are acknowledged by the drone after a round trip,
+    from the receiving thread of the link, as in cflib.
+    '''
+
+    def __init__(self, cf):
+        self._cf = cf
+        self._values = dict(PARAMETERS)
+        # {(group, name): [callbacks]}, name None for the group callbacks
+        self._callbacks = {}
+
+    def add_update_callback(self, group=None, name=None, cb=None):
+        self._callbacks.setdefault((group, name), []).append(cb)
+
+    def remove_update_callback(self, group, name=None, cb=None):
+        callbacks = self._callbacks.get((group, name), [])
+        if cb in callbacks:
+            callbacks.remove(cb)
+
+    def get_value(self, complete_name):
+        return self._values[complete_name]
+
+    def set_value(self, complete_name, value):
+        if complete_name not in self._values:
+            raise KeyError("{} not in param TOC".format(complete_name))
+        if self._cf.link is None:
+            return
+        value = str(value)
+        self._values[complete_name] = value
+        if complete_name == "kalman.resetEstimation" and value == "1":
+            self._cf._sim.reset_estimator(self._cf._drone.idx)
+        self._cf._post(lambda: self._updated(complete_name, value))
+
+    def _updated(self, complete_name, value):
+        group, name = complete_name.split(".")
+        for key in ((group, name), (group, None), (None, None)):
+            for cb in list(self._callbacks.get(key, [])):
+                cb(complete_name, value)
+
+class SimCrazyflie:
+
+    '''
+    Stand-in for the cflib Crazyflie on a link to a drone of a SimulatedSwarm.
+
+    It exposes the callbacks and the subsystems used by SyncCrazyflie, SimpleCF and the
+    cflib commanders (PositionHlCommander, MotionCommander, Extpos). The log subsystem
+    is the cflib one (Log and LogConfig): its packets are exchanged with the simulated
+    drone, so blocks are created, started and decoded as on a real link. Incoming
+    packets and acknowledgements are delivered by a receiving thread for each link,
+    as in cflib.
+    '''
+
+    def __init__(self, sim):
+        self._sim = sim
+        self._drone = None
+        self.link = None
+        self.link_uri = ""
+
+        self.disconnected = Caller()
+        self.connection_lost = Caller()
+        self.link_established = Caller()
+        self.connection_requested = Caller()
+        self.connected = Caller()
+        self.fully_connected = Caller()
+        self.connection_failed = Caller()
+
+        self._port_callbacks = {}
+        self._rx_queue = queue.Queue()
+        self._rx_thread = None
+
+        self.log = Log(self)
+        self.param = SimParam(self)
+        self.commander = SimCommander(self)
+        self.high_level_commander = SimHighLevelCommander(self)
+        self.loc = SimLocalization(self)
+        self.mem = SimMemory(self)
+
+    def add_port_callback(self, port, cb):
+        self._port_callbacks.setdefault(port, []).append(cb)
+
+    def remove_port_callback(self, port, cb):
+        callbacks = self._port_callbacks.get(port, [])
+        if cb in callbacks:
+            callbacks.remove(cb)
+
+    def is_connected(self):
+        return self.link is not None
+
+    def open_link(self, link_uri):
+        self.link_uri = link_uri
+        self.connection_requested.call(link_uri)
+        self._rx_thread = Thread(target=self._receive, name="SimCrazyflie_" + link_uri, daemon=True)
+        self._rx_thread.start()
+        self._post(self._connect)
+
+    def _connect(self):
+        time.sleep(self._sim.connect_delay)
+        drone = self._sim.attach(self.link_uri, self)
+        if drone is None:
+            self.connection_failed.call(self.link_uri, "Simulated drone " + self.link_uri + " not reachable")
+            self._rx_queue.put(None)
+            return
+        self._drone = drone
+        self.link = _SimLink(self.link_uri)
+        self.log.toc = self._sim.log_toc
+        self.link_established.call(self.link_uri)
+        self.connected.call(self.link_uri)
+        time.sleep(self._sim.param_delay)
+        self.fully_connected.call(self.link_uri)
+
+    def close_link(self):
+        if self.link is None:
+            return
+        self._sim.detach(self._drone.idx, self)
+        self.link = None
+        self._post(lambda: self.disconnected.call(self.link_uri))
+        self._rx_queue.put(None)
+
+    def _lose(self, message):
+        # Called by SimulatedSwarm.drop_link(): the drone is no longer reachable
+        self.link = None
+        self._post(lambda: self.connection_lost.call(self.link_uri, message))
+        self._post(lambda: self.disconnected.call(self.link_uri))
+        self._rx_queue.put(None)
+
+    def send_packet(self, pk, expected_reply=(), resend=False, timeout=0.2):
+        if self.link is None:
+            return
+        if pk.port == CRTPPort.LOGGING and pk.channel == CHAN_SETTINGS:
+            self._sim.log_command(self._drone.idx, self, pk.data)
+
+    def _post(self, item):
+        # item: CRTPPacket delivered to the port callbacks, or function called by the receiving thread
+        self._rx_queue.put(item)
+
+    def _receive(self):
+        while True:
+            item = self._rx_queue.get()
+            if item is None:
+                return
+            if isinstance(item, CRTPPacket):
+                for cb in list(self._port_callbacks.get(item.port, [])):
+                    cb(item)
+            else:
+                item()
+
+class SimulatedSwarm:
+
+    '''
+    SimulatedSwarm class simulates a swarm of Crazyflie drones, so that SimpleCF and
+    SimpleCFSwarm can be run and load tested without hardware.
+
+    It is used in place of the TocCacheManager: its create_crazyflie() returns a
+    SimCrazyflie, so the mission code runs unchanged:
+
+        sim = SimulatedSwarm()
+        swarm = SimpleCFSwarm(uris, toc_cache=sim)
+
+    Every URI is a drone, placed on the ground on a grid the first time it is connected
+    (or at the position given to add_drone()). All the drones are stepped at rate Hz in
+    one NumPy step: point-mass dynamics tracking a reference position with a limited
+    acceleration. The reference follows the commands: high level commander motions and
+    trajectories, position, velocity and hover setpoints. The motors stop with the
+    stop setpoint, at the end of a landing and, as on board, when the low level
+    setpoints stop for COMMANDER_WATCHDOG seconds. At each step, the log blocks that
+    are due are packed in log packets with the drone tick and delivered to the link.
+
+    The links can be dropped with drop_link(), to test the reconnection.
+    get_stats() reports the step timing (see RateScheduler) and the packets exchanged.
+    '''
+
+    def __init__(self, rate=DEFAULT_SIM_RATE, position_noise=0.0, connect_delay=DEFAULT_CONNECT_DELAY,
+                 param_delay=DEFAULT_PARAM_DELAY, spacing=DEFAULT_SPAWN_SPACING, seed=None):
+        '''
+        rate:           Frequency (Hz) of the simulation step
+
+        position_noise: Standard deviation (m) of the noise added to the logged position
+
+        connect_delay, param_delay:  Time (s) needed to open a link and to download the parameters
+
+        spacing:        Distance (m) between the drones placed on the ground by default
+        '''
+        self.rate = rate
+        self.position_noise = position_noise
+        self.connect_delay = connect_delay
+        self.param_delay = param_delay
+        self._spacing = spacing
+        self._rng = np.random.default_rng(seed)
+
+        self.log_toc = _build_log_toc()
+        self._drones = {}
+        self._rows = []
+        self._lock = Lock()
+
+        # State of the drones, one row each
+        self.pos = np.zeros((0, 3))
+        self.vel = np.zeros((0, 3))
+        self._ref = np.zeros((0, 3))
+        self._ref_prev = np.zeros((0, 3))
+        self._vref = np.zeros((0, 3))
+        self._mode = np.zeros(0, dtype=np.int64)
+        self._last_setpoint = np.zeros(0)
+        self._reset_time = np.zeros(0)
+        # High level motion: start, goal, start time, duration, landing
+        self._hl_start = np.zeros((0, 3))
+        self._hl_goal = np.zeros((0, 3))
+        self._hl_t0 = np.zeros(0)
+        self._hl_duration = np.zeros(0)
+        self._hl_land = np.zeros(0, dtype=bool)
+
+        self._scheduler = RateScheduler(name="SimulatedSwarm")
+        self._counts = {"log": 0, "setpoint": 0, "extpos": 0, "hl": 0}
+        self._steps = 0
+        self._step_sum = 0.0
+        self._step_max = 0.0
+
+    '''
+    Drones
+    '''
+    def add_drone(self, uri, pos=None):
+        # Place a drone at pos (on the ground on a grid by default). Return its row.
+        with self._lock:
+            if uri in self._drones:
+                return self._drones[uri].idx
+            idx = len(self._rows)
+            if pos is None:
+                cols = 10
+                pos = ((idx % cols)*self._spacing, (idx // cols)*self._spacing, 0.0)
+            pos = np.asarray(pos, dtype=np.float64)
+            self.pos = np.vstack((self.pos, pos))
+            self.vel = np.vstack((self.vel, np.zeros(3)))
+            self._ref = np.vstack((self._ref, pos))
+            self._ref_prev = np.vstack((self._ref_prev, pos))
+            self._vref = np.vstack((self._vref, np.zeros(3)))
+            self._mode = np.append(self._mode, MODE_OFF)
+            self._last_setpoint = np.append(self._last_setpoint, 0.0)
+            self._reset_time = np.append(self._reset_time, time.monotonic())
+            self._hl_start = np.vstack((self._hl_start, pos))
+            self._hl_goal = np.vstack((self._hl_goal, pos))
+            self._hl_t0 = np.append(self._hl_t0, 0.0)
+            self._hl_duration = np.append(self._hl_duration, 0.0)
+            self._hl_land = np.append(self._hl_land, False)
+            drone = _SimDrone(uri, idx)
+            self._drones[uri] = drone
+            self._rows.append(drone)
+            return idx
+
+    def get_positions(self):
+        # True positions (N, 3) of the drones, in the order they were added
+        with self._lock:
+            return self.pos.copy()
+
+    def drop_link(self, uri, down_for=0.0):
+        # Drop the link with the drone: it cannot be (re)connected for down_for seconds.
+        #   Return False if the drone does not exist.
+        with self._lock:
+            drone = self._drones.get(uri)
+            if drone is None:
+                return False
+            cf = drone.cf
+            drone.cf = None
+            drone.blocks = {}
+            drone.down_until = time.monotonic() + down_for
+        if cf is not None:
+            cf._lose("Simulated link loss")
+        return True
+
+    '''
+    Link, used by SimCrazyflie
+    '''
+    def create_crazyflie(self):
+        # Same interface of TocCacheManager.create_crazyflie()
+        self.start()
+        return SimCrazyflie(self), _CacheStats()
+
+    def collect(self, cache):
+        pass
+
+    def prefetch(self, uris, timeout=None):
+        return {uri: {"ok": True, "time": 0.0, "hits": 0, "misses": 0} for uri in uris}
+
+    def attach(self, uri, cf):
+        # Open a link: return the drone, None if it refuses the connection
+        self.add_drone(uri)
+        with self._lock:
+            drone = self._drones[uri]
+            if time.monotonic() < drone.down_until:
+                return None
+            drone.cf = cf
+            drone.blocks = {}
+            return drone
+
+    def detach(self, idx, cf):
+        with self._lock:
+            drone = self._rows[idx]
+            if drone.cf is cf:
+                drone.cf = None
+                drone.blocks = {}
+
+    def log_command(self, idx, cf, data):
+        # Log settings packet sent by cflib: answer as the firmware does
+        command, block_id = data[0], data[1]
+        drone = self._rows[idx]
+        if command in (CMD_CREATE_BLOCK, CMD_CREATE_BLOCK_V2):
+            pass
+        elif command == CMD_START_LOGGING:
+            period = data[2]*10/1000.0
+            block = cf.log._find_block(block_id)
+            with self._lock:
+                drone.blocks[block_id] = [period, time.monotonic() + period, block]
+        elif command in (CMD_STOP_LOGGING, CMD_DELETE_BLOCK):
+            with self._lock:
+                drone.blocks.pop(block_id, None)
+        elif command == CMD_RESET_LOGGING:
+            with self._lock:
+                drone.blocks = {}
+        else:
+            # Append commands are not acknowledged
+            return
+        pk = CRTPPacket()
+        pk.set_header(CRTPPort.LOGGING, CHAN_SETTINGS)
+        pk.data = (command, block_id, 0)
+        cf._post(pk)
+
+    def count(self, kind):
+        with self._lock:
+            self._counts[kind] += 1
+
+    def reset_estimator(self, idx):
+        with self._lock:
+            self._reset_time[idx] = time.monotonic()
+
+    '''
+    Commands, used by the simulated commanders
+    '''
+    def set_low_level(self, idx, mode, ref=None, vref=None):
+        # Low level setpoint: None components keep the current reference
+        now = time.monotonic()
+        with self._lock:
+            if self._mode[idx] == MODE_OFF:
+                self._ref[idx] = self.pos[idx]
+            if ref is not None:
+                for k, v in enumerate(ref):
+                    if v is not None:
+                        self._ref[idx, k] = v
+            if vref is not None:
+                self._vref[idx] = [0.0 if v is None else v for v in vref]
+            self._mode[idx] = mode
+            self._last_setpoint[idx] = now
+            self._counts["setpoint"] += 1
+
+    def stop_motors(self, idx):
+        with self._lock:
+            self._mode[idx] = MODE_OFF
+            self._counts["hl"] += 1
+
+    def hand_over(self, idx):
+        # Low level setpoints stopped: the high level commander holds the current reference
+        with self._lock:
+            if self._mode[idx] in (MODE_POSITION, MODE_VELOCITY):
+                self._start_plan(idx, self._ref[idx].copy(), 0.0, False, time.monotonic())
+            self._counts["setpoint"] += 1
+
+    def plan(self, idx, goal, duration, relative=False, land=False):
+        # High level motion from the current reference to goal (None components unchanged)
+        now = time.monotonic()
+        with self._lock:
+            start = self._ref[idx].copy() if self._mode[idx] != MODE_OFF else self.pos[idx].copy()
+            target = start.copy()
+            for k, v in enumerate(goal):
+                if v is not None:
+                    target[k] = start[k] + v if relative else v
+            self._start_plan(idx, target, duration, land, now, start)
+            self._counts["hl"] += 1
+
+    def _start_plan(self, idx, goal, duration, land, now, start=None):
+        # Called with the lock held
+        self._hl_start[idx] = self._ref[idx] if start is None else start
+        self._hl_goal[idx] = goal
+        self._hl_t0[idx] = now
+        self._hl_duration[idx] = duration
+        self._hl_land[idx] = land
+        self._mode[idx] = MODE_HL
+
+    def start_trajectory(self, idx, trajectory_id, time_scale=1.0, relative=False):
+        drone = self._rows[idx]
+        if trajectory_id not in drone.trajectories:
+            return
+        offset, n_pieces = drone.trajectories[trajectory_id]
+        pieces = drone.memory.get(offset, [])[:n_pieces]
+        if not pieces:
+            return
+        durations = np.array([p.duration for p in pieces])
+        coeffs = np.array([[p.x.values, p.y.values, p.z.values] for p in pieces])
+        starts = np.concatenate(([0.0], np.cumsum(durations)))
+        with self._lock:
+            shift = self._ref[idx] - coeffs[0, :, 0] if relative else np.zeros(3)
+            drone.trajectory = (starts, coeffs, time.monotonic(), time_scale, shift)
+            self._mode[idx] = MODE_TRAJECTORY
+            self._counts["hl"] += 1
+
+    @staticmethod
+    def _evaluate(trajectory, now):
+        # Position of a trajectory at time now, and whether it is completed
+        starts, coeffs, t0, time_scale, shift = trajectory
+        t = (now - t0)/time_scale
+        done = t >= starts[-1]
+        k = min(np.searchsorted(starts, t, side="right") - 1, len(coeffs) - 1)
+        tau = min(max(t - starts[k], 0.0), starts[k + 1] - starts[k])
+        return coeffs[k] @ tau**np.arange(coeffs.shape[2]) + shift, done
+
+    '''
+    Simulation step
+    '''
+    def start(self):
+        # Called by create_crazyflie(): the drones are stepped once the first link is created
+        if self._scheduler.get_stats("step") is None:
+            self._scheduler.add_task("step", self._step, self.rate)
+
+    def stop(self):
+        self._scheduler.remove_task("step")
+        self._scheduler.stop()
+
+    def _step(self):
+        t0 = time.perf_counter()
+        now = time.monotonic()
+        dt = 1.0/self.rate
+        with self._lock:
+            mode = self._mode
+            # Watchdog of the low level setpoints
+            low_level = (mode == MODE_POSITION) | (mode == MODE_VELOCITY)
+            mode[low_level & (now - self._last_setpoint > COMMANDER_WATCHDOG)] = MODE_OFF
+
+            # Reference of the high level motions: smoothstep from start to goal
+            hl = mode == MODE_HL
+            if hl.any():
+                duration = self._hl_duration[hl]
+                s = np.clip((now - self._hl_t0[hl])/np.maximum(duration, 1e-9), 0.0, 1.0)
+                s = s*s*(3 - 2*s)
+                self._ref[hl] = self._hl_start[hl] + (self._hl_goal[hl] - self._hl_start[hl])*s[:, np.newaxis]
+                landed = np.flatnonzero(hl)[(s >= 1.0) & self._hl_land[hl]]
+                mode[landed] = MODE_OFF
+
+            for idx in np.flatnonzero(mode == MODE_TRAJECTORY):
+                drone = self._rows[idx]
+                self._ref[idx], done = self._evaluate(drone.trajectory, now)
+                if done:
+                    self._start_plan(idx, self._ref[idx].copy(), 0.0, False, now)
+
+            velocity = mode == MODE_VELOCITY
+            self._ref[velocity] += self._vref[velocity]*dt
+            ref_vel = (self._ref - self._ref_prev)/dt
+
+            # Point-mass dynamics: PD tracking with limited acceleration, free fall without motors
+            acc = SIM_KP*(self._ref - self.pos) + SIM_KD*(ref_vel - self.vel)
+            norm = np.linalg.norm(acc, axis=1, keepdims=True)
+            acc *= np.minimum(1.0, SIM_MAX_ACCEL/np.maximum(norm, 1e-9))
+            off = mode == MODE_OFF
+            acc[off] = (0.0, 0.0, -GRAVITY)
+            self.vel += acc*dt
+            self.pos += self.vel*dt
+            ground = self.pos[:, 2] <= 0.0
+            self.pos[ground, 2] = 0.0
+            self.vel[ground & (off | (self.vel[:, 2] < 0))] = 0.0
+            self._ref[off] = self.pos[off]
+            self._ref_prev = self._ref.copy()
+
+            # Logged state
+            state = {
+                "est": self.pos + self._rng.normal(0.0, self.position_noise, self.pos.shape)
+                       if self.position_noise > 0 else self.pos.copy(),
+                "vel": self.vel.copy(),
+                "var": VAR_FLOOR + VAR_INITIAL*np.exp(-(now - self._reset_time)/VAR_TAU),
+                "vbat": np.full(len(self.pos), 4.0),
+            }
+            due = []
+            for drone in self._rows:
+                if drone.cf is None:
+                    continue
+                for block_id, entry in drone.blocks.items():
+                    if entry[1] <= now:
+                        # Late blocks skip the missed periods, as the on-board timers do not queue
+                        entry[1] += max(np.ceil((now - entry[1])/entry[0]), 1.0)*entry[0]
+                        due.append((drone, block_id, entry[2]))
+
+        for drone, block_id, block in due:
+            self._send_log(drone, block_id, block, state, now)
+
+        elapsed = time.perf_counter() - t0
+        self._steps += 1
+        self._step_sum += elapsed
+        self._step_max = max(self._step_max, elapsed)
+
+    def _send_log(self, drone, block_id, block, state, now):
+        cf = drone.cf
+        if cf is None or block is None:
+            return
+        tick = drone.tick(now)
+        payload = bytearray((block_id, tick & 0xFF, (tick >> 8) & 0xFF, (tick >> 16) & 0xFF))
+        for var in block.variables:
+            _, array, column = LOG_VARIABLES[var.name]
+            value = state[array][drone.idx] if column is None else state[array][drone.idx, column]
+            fmt = LogTocElement.get_unpack_string_from_id(var.fetch_as)
+            if fmt[-1] not in "fe":
+                value = int(value)
+            payload += struct.pack(fmt, value)
+        pk = CRTPPacket()
+        pk.set_header(CRTPPort.LOGGING, CHAN_LOGDATA)
+        pk.data = payload
+        cf._post(pk)
+        # Called by the step only, outside the lock
+        self._counts["log"] += 1
+
+    def get_stats(self):
+        stats = {
+            "drones": len(self._rows),
+            "connected": sum(drone.cf is not None for drone in self._rows),
+            "steps": self._steps,
+            "step_time_mean": self._step_sum/self._steps if self._steps > 0 else 0.0,
+            "step_time_max": self._step_max,
+            "packets": dict(self._counts),
+        }
+        scheduler_stats = self._scheduler.get_stats("step")
+        if scheduler_stats is not None:
+            stats.update(scheduler_stats)
+        return stats
@@ -0,0 +1,88 @@
+import numpy as np
+
+from collections import namedtuple
+from threading import Condition
+
+# Consistent state of a drone: sequence number (1 for the first sample), host time (ns)
+#   and position
+StateSnapshot = namedtuple("StateSnapshot", ["seq", "time", "pos"])
+
+# Layout of a slot
+SLOT_DTYPE = np.dtype([('seq', np.int64), ('time', np.int64), ('pos', np.float64, (3,))])
+
+class StateSlot:
+
+    '''
+    StateSlot class publishes the latest state of a drone from the log thread to any
+    number of readers, without locks in the log path.
+
+    The state is double buffered: sample k is written in slot k % 2, then the published
+    sequence number is advanced, so the writer never touches the slot of the last
+    published sample. A reader copies the slot of the sequence number it read, and
+    retries if the writer went on to overwrite that slot meanwhile (seqlock): a snapshot
+    never mixes the time of a sample with the position of another one.
+
+    wait_for_next_sample() blocks until a newer sample is published. The writer takes
+    the lock of the condition only when someone is waiting.
+    '''
+
+    def __init__(self):
+        self._slots = np.zeros(2, dtype=SLOT_DTYPE)
+        self._seq = 0
+
+        # Readers blocked in wait_for_next_sample()
+        self._cond = Condition()
+        self._waiters = 0
+
+    @property
+    def seq(self):
+        # Sequence number of the last published sample (0 if none)
+        return self._seq
+
+    def publish(self, t, pos):
+        # Called by the single writer (the log callback)
+        seq = self._seq + 1
+        slot = self._slots[seq % 2]
+        slot['seq'] = seq
+        slot['time'] = t
+        slot['pos'] = pos
+        self._seq = seq
+
+        if self._waiters:
+            with self._cond:
+                self._cond.notify_all()
+
+    def snapshot(self):
+        '''
+        Return the last published sample as a StateSnapshot, None before the first one.
+        '''
+        while True:
+            seq = self._seq
+            if seq == 0:
+                return None
+            slot = self._slots[seq % 2].copy()
+            # The slot is valid if it still holds sample seq: the writer overwrites it
+            #   only when publishing seq + 2
+            if slot['seq'] == seq and self._seq < seq + 2:
+                return StateSnapshot(seq, int(slot['time']), slot['pos'])
+
+    def wait_for_next_sample(self, after_seq=None, timeout=None):
+        '''
+        Block until a sample newer than after_seq is published and return it.
+        If after_seq is None, wait for the sample following the last published one.
+        Return None if the timeout (s) expired.
+
+        A loop passing the seq of its previous snapshot runs in lockstep with the logs:
+        if it was busy for more than a log period, it returns at once with the newest
+        sample (snapshot.seq tells how many were skipped).
+        '''
+        if after_seq is None:
+            after_seq = self._seq
+        with self._cond:
+            self._waiters += 1
+            try:
+                if not self._cond.wait_for(lambda: self._seq > after_seq, timeout):
+                    return None
+            finally:
+                self._waiters -= 1
+        return self.snapshot()
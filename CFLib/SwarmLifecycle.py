@@ -0,0 +1,229 @@
+import math
+import time
+
+from collections import namedtuple
+from threading import Condition, Lock
+
+# Policy of a phase:
+#   timeout:    Time (s) from the start of the phase after which the late drones are left
+#               behind. For the mission, time after which the drones are asked to stop; for
+#               the landing, time after which a drone is reported as 'overran land'.
+#               None waits forever.
+#   quorum:     Drones that must complete the phase for the swarm to go on: a fraction of
+#               the drones that entered the phase if float, a number of drones if int.
+#               Not used by mission and land
+PhasePolicy = namedtuple("PhasePolicy", ["timeout", "quorum"])
+
+# Phases of the lifecycle, in order. The drones wait for each other at the end of the
+#   synchronized phases; mission and land are just timed.
+PHASES = ("connect", "estimator", "takeoff", "ready", "mission", "land")
+SYNC_PHASES = ("connect", "estimator", "takeoff", "ready")
+
+DEFAULT_POLICIES = {
+    "connect": PhasePolicy(timeout=20, quorum=1.0),
+    "estimator": PhasePolicy(timeout=10, quorum=1.0),
+    "takeoff": PhasePolicy(timeout=15, quorum=1.0),
+    "ready": PhasePolicy(timeout=5, quorum=1.0),
+    "mission": PhasePolicy(timeout=None, quorum=None),
+    "land": PhasePolicy(timeout=10, quorum=None),
+}
+
+# Default interval (s) between the take off commands of the drones sharing a radio
+DEFAULT_TAKEOFF_STAGGER = 0.3
+
+def link_of(uri):
+    # Radio, channel and datarate of a drone: 'radio://0/80/2M/E7E7E7E701' -> ('radio://0', 80, '2M')
+    parts = uri.split("/")
+    radio = "/".join(parts[:3])
+    channel = int(parts[3]) if len(parts) > 3 and parts[3] else None
+    datarate = parts[4] if len(parts) > 4 and parts[4] else "2M"
+    return radio, channel, datarate
+
+def radio_of(uri):
+    # Radio (dongle) used to reach a drone: 'radio://0/80/2M/E7E7E7E701' -> 'radio://0'
+    return link_of(uri)[0]
+
+class _PhaseState:
+
+    def __init__(self):
+        self.started_at = None
+        # Drones still in the swarm when the phase started
+        self.entered = 0
+        # Drones that reached the end of the phase, with their outcome
+        self.arrived = {}
+        # Outcome of the phase for the swarm (None until decided) and drones admitted to the next one
+        self.result = None
+        self.admitted = set()
+
+class SwarmLifecycle:
+
+    '''
+    SwarmLifecycle class drives the drones of a swarm through explicit phases: connect,
+    estimator (Kalman settle and first log), takeoff, ready (airborne confirmed by the
+    logs), mission and land.
+
+    Each drone thread calls arrive() at the end of a phase. For the synchronized phases
+    the drone waits until the phase is decided for the whole swarm:
+        - as soon as all the drones still in the swarm arrived, or
+        - when the timeout of the phase expires.
+    The phase succeeds if at least quorum drones completed it: they go on together,
+    the late or failed ones are left behind. Otherwise the swarm aborts and the
+    drones already flying land.
+
+    Take off is staggered: the drones sharing a radio send their take off command at
+    least stagger seconds apart (see takeoff_turn()), so the link is not saturated.
+
+    Time spent by each drone in each phase (and waiting for the others at its end) is
+    reported by get_report().
+    '''
+
+    def __init__(self, uris, policies=None, stagger=DEFAULT_TAKEOFF_STAGGER):
+        '''
+        uris:       URIs of the drones, in the order of the swarm
+
+        policies:   Dictionary {phase: PhasePolicy} overriding DEFAULT_POLICIES
+
+        stagger:    Interval (s) between two take off commands on the same radio
+        '''
+        self._uris = list(uris)
+        self._policies = dict(DEFAULT_POLICIES)
+        if policies is not None:
+            self._policies.update(policies)
+        self._stagger = stagger
+
+        self._cond = Condition()
+        self._phases = {phase: _PhaseState() for phase in PHASES}
+        # Drones still in the swarm
+        self._active = set(range(len(self._uris)))
+        self.aborted_at = None
+
+        # Per drone: end of its last phase, time spent in each phase and waiting at its end,
+        #   final status
+        self._marks = [None]*len(self._uris)
+        self._phase_times = [{} for _ in self._uris]
+        self._wait_times = [{} for _ in self._uris]
+        self._status = ["ok"]*len(self._uris)
+
+        # Next time at which a take off can be sent on each radio
+        self._radio_lock = Lock()
+        self._radio_next = {}
+
+    def start(self):
+        # Open the first phase
+        now = time.monotonic()
+        with self._cond:
+            self._marks = [now]*len(self._uris)
+            self._phases[PHASES[0]].started_at = now
+            self._phases[PHASES[0]].entered = len(self._active)
+
+    def policy(self, phase):
+        return self._policies[phase]
+
+    def _quorum_count(self, phase):
+        quorum = self._policies[phase].quorum
+        if isinstance(quorum, float):
+            return math.ceil(quorum*self._phases[phase].entered)
+        return quorum
+
+    def _deadline(self, phase):
+        state = self._phases[phase]
+        timeout = self._policies[phase].timeout
+        if timeout is None or state.started_at is None:
+            return None
+        return state.started_at + timeout
+
+    def arrive(self, idx, phase, ok=True):
+        '''
+        Drone idx completed phase (ok False if it failed it).
+        For the synchronized phases, block until the phase is decided.
+        Return True if the drone must go on with the next phase.
+        '''
+        with self._cond:
+            now = time.monotonic()
+            self._phase_times[idx][phase] = now - self._marks[idx]
+            self._marks[idx] = now
+            state = self._phases[phase]
+            if idx not in self._active:
+                # Left behind in a previous phase, or the swarm aborted
+                return False
+            state.arrived[idx] = ok
+            if not ok:
+                self._active.discard(idx)
+                self._status[idx] = "failed at " + phase
+            if phase not in SYNC_PHASES:
+                timeout = self._policies[phase].timeout
+                if ok and timeout is not None and self._phase_times[idx][phase] > timeout:
+                    self._status[idx] = "overran " + phase
+                return ok
+
+            while state.result is None:
+                self._try_decide(phase)
+                if state.result is not None:
+                    break
+                deadline = self._deadline(phase)
+                self._cond.wait(None if deadline is None else max(deadline - time.monotonic(), 0.0))
+            t_end = time.monotonic()
+            self._wait_times[idx][phase] = t_end - now
+            self._marks[idx] = t_end
+            return idx in state.admitted
+
+    def _try_decide(self, phase):
+        # Called with the lock held
+        state = self._phases[phase]
+        pending = self._active - set(state.arrived)
+        deadline = self._deadline(phase)
+        if pending and (deadline is None or time.monotonic() < deadline):
+            return
+
+        completed = {idx for idx, ok in state.arrived.items() if ok and idx in self._active}
+        state.result = len(completed) >= self._quorum_count(phase)
+        if state.result:
+            state.admitted = completed
+            for idx in self._active - completed:
+                self._status[idx] = "dropped at " + phase
+            self._active = completed
+        else:
+            print("[SwarmLifecycle] Quorum not reached in phase ", phase, ": ", len(completed),
+                  " drones out of ", state.entered, ". Aborting...")
+            self.aborted_at = phase
+            for idx in self._active:
+                self._status[idx] = "aborted at " + phase
+            self._active = set()
+
+        # Open the next phase
+        next_idx = PHASES.index(phase) + 1
+        if next_idx < len(PHASES):
+            self._phases[PHASES[next_idx]].started_at = time.monotonic()
+            self._phases[PHASES[next_idx]].entered = len(self._active)
+        self._cond.notify_all()
+
+    def takeoff_turn(self, idx):
+        # Block until drone idx can send its take off command, staggering the drones
+        #   sharing a radio. The time spent waiting is reported as 'takeoff_stagger'.
+        radio = radio_of(self._uris[idx])
+        with self._radio_lock:
+            now = time.monotonic()
+            turn = max(now, self._radio_next.get(radio, now))
+            self._radio_next[radio] = turn + self._stagger
+        if turn > now:
+            time.sleep(turn - now)
+        self._wait_times[idx]["takeoff_stagger"] = turn - now
+
+    def mission_timeout(self):
+        return self._policies["mission"].timeout
+
+    def get_report(self):
+        '''
+        For each drone (by URI): final status ('ok', 'failed at <phase>', 'dropped at <phase>',
+        'aborted at <phase>' or 'overran <phase>'), time (s) spent in each phase and waiting
+        at its end.
+        '''
+        with self._cond:
+            return {
+                uri: {
+                    "status": self._status[idx],
+                    "phases": dict(self._phase_times[idx]),
+                    "waits": dict(self._wait_times[idx]),
+                }
+                for idx, uri in enumerate(self._uris)
+            }
@@ -0,0 +1,85 @@
+import numpy as np
+
+from collections import namedtuple
+
+# Consistent state of the whole swarm: (N, 3) positions, (N,) host times (ns) and (N,)
+#   number of samples received by each drone (0 if none, position NaN)
+SwarmSnapshot = namedtuple("SwarmSnapshot", ["pos", "time", "count"])
+
+# Maximum number of attempts to copy a row that is being written
+SNAPSHOT_RETRIES = 100
+
+class SwarmState:
+
+    '''
+    SwarmState class stores the latest state of all the drones of a swarm in shared
+    arrays: row k of pos and time is updated in place by the log callback of drone k,
+    so swarm-level logic (distances, centroid, formations) is computed with vectorized
+    NumPy instead of looping over the SimpleCF objects.
+
+    Each row has a single writer and its own sequence counter (seqlock): the counter is
+    odd while the row is written and even once it is complete. snapshot() copies the
+    arrays and copies again the rows whose counter was odd or changed meanwhile, so no
+    row mixes the time of a sample with the position of another one.
+
+    The arrays can live in an external buffer (e.g. multiprocessing.shared_memory), so
+    that the rows are written by other processes (see ShardedSwarmExecutor).
+    '''
+
+    def __init__(self, n_drones, buffer=None, initialize=True):
+        '''
+        n_drones:   Number of rows
+
+        buffer:     Object exposing the buffer protocol, of at least nbytes(n_drones) bytes,
+                    where the arrays are stored. If None, they are allocated here
+
+        initialize: If False, the content of buffer is kept (the state is attached to
+                    arrays already initialized by another process)
+        '''
+        if buffer is None:
+            buffer = bytearray(SwarmState.nbytes(n_drones))
+        self.pos = np.ndarray((n_drones, 3), dtype=np.float64, buffer=buffer)
+        self.time = np.ndarray((n_drones,), dtype=np.int64, buffer=buffer, offset=n_drones*3*8)
+        self._seq = np.ndarray((n_drones,), dtype=np.int64, buffer=buffer, offset=n_drones*4*8)
+        if initialize:
+            self.pos[:] = np.nan
+            self.time[:] = 0
+            self._seq[:] = 0
+
+    @staticmethod
+    def nbytes(n_drones):
+        # Bytes used by the arrays of n_drones rows: pos (float64), time and seq (int64)
+        return n_drones*(3 + 1 + 1)*8
+
+    def __len__(self):
+        return len(self.time)
+
+    def update(self, idx, t, pos):
+        # Called by the log callback of drone idx, the only writer of row idx
+        self._seq[idx] += 1
+        self.time[idx] = t
+        self.pos[idx] = pos
+        self._seq[idx] += 1
+
+    def snapshot(self):
+        '''
+        Return a consistent copy of the state as a SwarmSnapshot.
+        '''
+        seq = self._seq.copy()
+        pos = self.pos.copy()
+        t = self.time.copy()
+        for _ in range(SNAPSHOT_RETRIES):
+            torn = (seq % 2 == 1) | (seq != self._seq)
+            if not torn.any():
+                return SwarmSnapshot(pos, t, seq//2)
+            idx = np.flatnonzero(torn)
+            seq[idx] = self._seq[idx]
+            pos[idx] = self.pos[idx]
+            t[idx] = self.time[idx]
+        raise RuntimeError("[SwarmState.snapshot()] Rows updated too often to be copied.")
+
+    @staticmethod
+    def pairwise_distances(pos):
+        # (N, N) distances between the rows of pos
+        diff = pos[:, np.newaxis, :] - pos[np.newaxis, :, :]
+        return np.sqrt(np.sum(diff**2, axis=-1))
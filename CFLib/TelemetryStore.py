@@ -0,0 +1,160 @@
+import numpy as np
+
+from cflib.crazyflie.log import LogTocElement
+
+from CFLib.DataBuffer import DataBuffer
+
+# NumPy type of the columns, for each log type (LogTocElement.types)
+LOG_DTYPES = {
+    'uint8_t': np.uint8,
+    'uint16_t': np.uint16,
+    'uint32_t': np.uint32,
+    'int8_t': np.int8,
+    'int16_t': np.int16,
+    'int32_t': np.int32,
+    'FP16': np.float16,
+    'float': np.float32,
+}
+
+class TelemetryStore:
+
+    '''
+    TelemetryStore class stores the samples of several log blocks.
+
+    Each block has its own buffer, with one row for each sample: the drone-side
+    timestamp (ms) and one typed column for each variable of the block, with the
+    NumPy type corresponding to the type the variable is fetched as.
+    A whole row is appended at once, so the columns of a block always have the
+    same length.
+
+    Queries are vectorized:
+        latest():   Last value of some variables
+        slice():    Samples of a variable in a time range
+        resample(): Values of some variables at arbitrary timestamps
+        merged():   All the variables aligned on the union of their timestamps
+    '''
+
+    def __init__(self, max_len=None):
+        # Buffers of the blocks and names of their variables, identified by block name
+        self._blocks = {}
+        self._block_vars = {}
+        # Block containing each variable
+        self._var_block = {}
+        self._max_len = max_len
+
+    @staticmethod
+    def column_dtype(fetch_as):
+        # NumPy type of a variable fetched as fetch_as (type id or name)
+        if isinstance(fetch_as, str):
+            return np.dtype(LOG_DTYPES[fetch_as])
+        return np.dtype(LOG_DTYPES[LogTocElement.types[fetch_as][0]])
+
+    def add_block(self, log_conf):
+        # A block added again with the same variables (e.g. at a reconnection) keeps
+        #   its samples
+        names = [var.name for var in log_conf.variables]
+        dtype = np.dtype([('timestamp', np.int64)] +
+                         [(var.name, self.column_dtype(var.fetch_as)) for var in log_conf.variables])
+        buffer = self._blocks.get(log_conf.name)
+        if buffer is not None and buffer.view().dtype == dtype:
+            return
+        for name in self._block_vars.get(log_conf.name, []):
+            if self._var_block.get(name) == log_conf.name:
+                del self._var_block[name]
+        self._blocks[log_conf.name] = DataBuffer(dtype=dtype, max_len=self._max_len)
+        self._block_vars[log_conf.name] = names
+        for name in names:
+            self._var_block[name] = log_conf.name
+
+    def append(self, block_name, timestamp, data):
+        row = (timestamp,) + tuple(data[name] for name in self._block_vars[block_name])
+        self._blocks[block_name].append(row)
+
+    def variables(self):
+        return list(self._var_block)
+
+    def get_block(self, block_name):
+        # Samples of a block (view, not a copy)
+        return self._blocks[block_name].view()
+
+    def column(self, name):
+        '''
+        Samples of a variable (views, not copies).
+        Return the timestamps and the values arrays.
+        '''
+        rec = self._blocks[self._var_block[name]].view()
+        return rec['timestamp'], rec[name]
+
+    def latest(self, names=None):
+        '''
+        Last sample of each variable.
+        Return a dictionary {name: (timestamp, value)}, (None, None) if no sample has been logged.
+        '''
+        if names is None:
+            names = self.variables()
+        last = {}
+        for name in names:
+            buffer = self._blocks[self._var_block[name]]
+            if len(buffer) == 0:
+                last[name] = (None, None)
+                continue
+            row = buffer.last()
+            last[name] = (int(row['timestamp']), row[name][()])
+        return last
+
+    def slice(self, name, t_start=None, t_end=None):
+        '''
+        Samples of a variable with t_start <= timestamp < t_end (None means unbounded).
+        Return the timestamps and the values arrays (views, not copies).
+        '''
+        timestamps, values = self.column(name)
+        i0 = 0 if t_start is None else np.searchsorted(timestamps, t_start, side='left')
+        i1 = len(timestamps) if t_end is None else np.searchsorted(timestamps, t_end, side='left')
+        return timestamps[i0:i1], values[i0:i1]
+
+    def resample(self, timestamps, names=None, method='previous'):
+        '''
+        Values of the variables at the given timestamps.
+
+        timestamps: Array of increasing timestamps (ms)
+
+        method:     'previous': last value at or before each timestamp (NaN before the first sample)
+                    'linear':   linear interpolation (NaN outside the logged range)
+
+        Return a dictionary {name: float64 array}.
+        '''
+        if names is None:
+            names = self.variables()
+        timestamps = np.asarray(timestamps)
+        resampled = {}
+        for name in names:
+            t, v = self.column(name)
+            values = np.full(len(timestamps), np.nan)
+            if len(t) > 0:
+                if method == 'linear':
+                    values[:] = np.interp(timestamps, t, v.astype(np.float64), left=np.nan, right=np.nan)
+                else:
+                    # Index of the last sample at or before each timestamp
+                    idx = np.searchsorted(t, timestamps, side='right') - 1
+                    valid = idx >= 0
+                    values[valid] = v[idx[valid]]
+            resampled[name] = values
+        return resampled
+
+    def merged(self, names=None):
+        '''
+        Align the variables on the union of the timestamps of their blocks.
+        Each variable holds its last value (NaN before its first sample).
+
+        Return a dictionary with the 'timestamp' array and one array for each variable.
+        '''
+        if names is None:
+            names = self.variables()
+        blocks = {self._var_block[name] for name in names}
+        if not blocks:
+            return {'timestamp': np.array([], dtype=np.int64)}
+        timestamps = np.unique(np.concatenate([self._blocks[block].view()['timestamp'] for block in blocks]))
+
+        merged = {'timestamp': timestamps}
+        merged.update(self.resample(timestamps, names))
+        return merged
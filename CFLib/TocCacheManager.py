@@ -0,0 +1,189 @@
+import os
+import sys
+import json
+import time
+import tempfile
+
+from threading import Lock, Thread
+
+import cflib.crtp
+from cflib.crazyflie import Crazyflie
+from cflib.crazyflie.syncCrazyflie import SyncCrazyflie
+from cflib.crazyflie.toccache import TocCache
+from cflib.crazyflie.log import LogTocElement
+from cflib.crazyflie.param import ParamTocElement
+
+# Shared cache location: it can be changed with the SIMPLECF_CACHE_DIR environment variable
+DEFAULT_CACHE_DIR = os.environ.get('SIMPLECF_CACHE_DIR',
+                                   os.path.join(os.path.expanduser('~'), '.cache', 'simplecf'))
+
+# Maximum time (s) waited for a drone during prefetch()
+PREFETCH_TIMEOUT = 30
+
+class SharedTocCache(TocCache):
+
+    '''
+    Variant of the cflib TocCache that can be shared among threads and processes.
+
+    Files use the cflib format (one <CRC>.json file for each TOC), but:
+        - The directory is checked at each fetch, so TOCs written by other
+          processes after the creation of the object are found
+        - Files are written to a temporary file and then renamed, so a reader
+          never sees a partially written TOC
+        - An entry is used only if it is stored under the CRC reported by the
+          drone and it decodes to a valid TOC; otherwise it is removed and the
+          TOC is downloaded again
+        - Hits and misses are counted
+    '''
+
+    def __init__(self, cache_dir):
+        super().__init__()
+        self._rw_cache = cache_dir
+        os.makedirs(cache_dir, exist_ok=True)
+        self.hits = 0
+        self.misses = 0
+
+    def _filename(self, crc):
+        return os.path.join(self._rw_cache, '%08X.json' % crc)
+
+    def fetch(self, crc):
+        filename = self._filename(crc)
+        try:
+            with open(filename) as cache:
+                toc = json.load(cache, object_hook=self._decoder)
+        except FileNotFoundError:
+            self.misses += 1
+            return None
+        except Exception as err:
+            print("[SharedTocCache.fetch()] Invalid cache file ", filename, ": ", err)
+            toc = None
+
+        if not self._is_valid(toc):
+            self._remove(filename)
+            self.misses += 1
+            return None
+        self.hits += 1
+        return toc
+
+    @staticmethod
+    def _is_valid(toc):
+        # A TOC is a non empty dictionary {group: {name: element}}
+        if not isinstance(toc, dict) or len(toc) == 0:
+            return False
+        for group in toc.values():
+            if not isinstance(group, dict):
+                return False
+            for element in group.values():
+                if not isinstance(element, (LogTocElement, ParamTocElement)):
+                    return False
+        return True
+
+    @staticmethod
+    def _remove(filename):
+        try:
+            os.remove(filename)
+        except OSError:
+            pass
+
+    def insert(self, crc, toc):
+        # Write a temporary file in the same directory, then rename it atomically
+        try:
+            fd, tmp_name = tempfile.mkstemp(dir=self._rw_cache, suffix='.tmp')
+            with os.fdopen(fd, 'w') as cache:
+                cache.write(json.dumps(toc, indent=2, default=self._encoder))
+            os.replace(tmp_name, self._filename(crc))
+        except Exception as err:
+            print("[SharedTocCache.insert()] Could not save the cache: ", err)
+
+class TocCacheManager:
+
+    '''
+    TocCacheManager class handles the TOC cache shared by all the drones.
+
+    The cache is stored in a configurable directory (DEFAULT_CACHE_DIR by default),
+    instead of a ./cache folder depending on where the script is executed.
+    It can be warmed before a mission with prefetch(), for a list of URIs in parallel.
+
+    From the command line:
+        python -m CFLib.TocCacheManager radio://0/80/2M/E7E7E7E701 radio://0/80/2M/E7E7E7E702
+    '''
+
+    _default = None
+    _default_lock = Lock()
+
+    def __init__(self, cache_dir=DEFAULT_CACHE_DIR):
+        self.cache_dir = cache_dir
+        os.makedirs(cache_dir, exist_ok=True)
+
+        # Hits and misses of all the caches created by the manager
+        self._lock = Lock()
+        self._hits = 0
+        self._misses = 0
+
+    @classmethod
+    def get_default(cls):
+        # Manager shared by all the SimpleCF objects not configured otherwise. The drones
+        #   of a swarm connect from several threads: only one of them creates it.
+        if cls._default is None:
+            with cls._default_lock:
+                if cls._default is None:
+                    cls._default = cls()
+        return cls._default
+
+    def create_crazyflie(self):
+        '''
+        Create a Crazyflie object using the shared cache.
+        Return the Crazyflie and its SharedTocCache, which counts the hits and misses
+        of that connection.
+        '''
+        cf = Crazyflie()
+        cache = SharedTocCache(self.cache_dir)
+        cf._toc_cache = cache
+        return cf, cache
+
+    def collect(self, cache):
+        # Add the hits and misses of a connection to the totals of the manager
+        with self._lock:
+            self._hits += cache.hits
+            self._misses += cache.misses
+
+    def get_stats(self):
+        with self._lock:
+            return {"cache_dir": self.cache_dir, "hits": self._hits, "misses": self._misses}
+
+    def prefetch(self, uris, timeout=PREFETCH_TIMEOUT):
+        '''
+        Connect to all the drones in parallel, so that their TOCs are stored in the cache.
+        The drivers must be initialized (cflib.crtp.init_drivers()).
+        Return, for each uri, a dictionary with the connection time and the cache hits and misses.
+        '''
+        results = {}
+
+        def fetch(uri):
+            t0 = time.monotonic()
+            cf, cache = self.create_crazyflie()
+            try:
+                with SyncCrazyflie(uri, cf=cf):
+                    pass
+                ok = True
+            except Exception as err:
+                print("[TocCacheManager.prefetch()] Could not connect to ", uri, ": ", err)
+                ok = False
+            self.collect(cache)
+            results[uri] = {"ok": ok, "time": time.monotonic() - t0,
+                            "hits": cache.hits, "misses": cache.misses}
+
+        threads = [Thread(target=fetch, args=(uri,), daemon=True) for uri in uris]
+        for t in threads:
+            t.start()
+        t_end = time.monotonic() + timeout
+        for t in threads:
+            t.join(max(t_end - time.monotonic(), 0))
+        return results
+
+if __name__ == '__main__':
+    # Warm the shared cache for the URIs given as arguments
+    cflib.crtp.init_drivers()
+    manager = TocCacheManager()
+    for uri, res in manager.prefetch(sys.argv[1:]).items():
+        print(uri, res)
@@ -12,12 +12,12 @@ from threading import Thread
 
 import cflib.crtp
 
-from OptitrackClient import OptitrackClient
-
 # setting path
 sys.path.append('../SimplifiedCFLib')
 from CFLib.SimpleCF import SimpleCF
 
+from OptitrackClient import OptitrackClient
+
 '''
 Sequence of movements perfromed to collect UWB position estimation and OT position estimation.
 UWB are then oversampled to fit OT measurements, so a MS estimation of the transformation between 
@@ -61,19 +61,17 @@ if __name__ == '__main__':
     # Define the URI identifying the agent
     uri = 'radio://0/80/2M/E7E7E7E706'
 
-    # Store the initial time. 
-    # This is necessary just to compare the position estimation given by UWB and OT. 
-    start_time = time.time()
-
-    # Create a SimpleCF object providing uri and start_time
-    cf = SimpleCF(uri, start_time)
+    # SimpleCF and OptitrackClient share the default HostClock, so the position
+    # estimation given by UWB and OT can be compared on the same timeline.
+    # Create a SimpleCF object providing uri
+    cf = SimpleCF(uri)
     cf.use_phlc = False
 
     # Set the execute function
     cf._executed_function = move
     
     # Create the OT client
-    oc = OptitrackClient(start_time)
+    oc = OptitrackClient()
 
     # Add to the client ALL the object that you want to track.
     # If more objects must be tracked, invoke
@@ -108,17 +106,17 @@ if __name__ == '__main__':
     f_y = interpolate.interp1d(cf._pos_time, cf._pos[1, :])
     f_z = interpolate.interp1d(cf._pos_time, cf._pos[2, :])
 
-    # Time interval where both signals are collected
-    idx_t0 = np.argmax( oc._track_time - cf._pos_time[0] > 0 )
-    idx_tf = np.argmax( oc._track_time - cf._pos_time[-1] > 0 )
+    # Frames collected while both signals are available, with the object validly tracked
+    t = oc._track_time
+    idx = np.flatnonzero( (t >= cf._pos_time[0]) & (t <= cf._pos_time[-1]) & oc._tracked_valid[frame_id] )
 
     # Compute the rotation transform
     # Rotate OT frame in UWB frame
-    tmp = np.vstack(( f_x(oc._track_time[idx_t0:idx_tf]), f_y(oc._track_time[idx_t0:idx_tf]), f_z(oc._track_time[idx_t0:idx_tf]) ))    
-    rot_ot2uwb, rssd = R.align_vectors(tmp.T, oc._tracked_pos[frame_id][:, idx_t0:idx_tf].T)
+    tmp = np.vstack(( f_x(t[idx]), f_y(t[idx]), f_z(t[idx]) ))    
+    rot_ot2uwb, rssd = R.align_vectors(tmp.T, oc._tracked_pos[frame_id][:, idx].T)
 
     # p_uwb = O_ot_in_uwb + rot_ot2uwb @ p_ot
-    O_ot_in_uwb = cf._pos[:, idx_t0] - rot_ot2uwb.as_matrix()@oc._tracked_pos[frame_id][:, idx_t0]
+    O_ot_in_uwb = tmp[:, 0] - rot_ot2uwb.as_matrix()@oc._tracked_pos[frame_id][:, idx[0]]
 
     # Store the configuration
     filename = "ot_uwb_config"
@@ -2,10 +2,16 @@ from PythonNatNetSDK.NatNetClient import NatNetClient
 from matplotlib import pyplot as plt
 import numpy as np
 import scipy.io as sio
-import time
+from scipy.spatial.transform import Rotation
 from threading import Event, Thread
 import sys
 
+# Preallocated storage for the tracked data
+from CFLib.DataBuffer import DataBuffer
+
+# Host timebase, and conversion of the camera clock onto it
+from CFLib.HostClock import HostClock, CAMERA_TICK_PERIOD
+
 class OptitrackClient:
 
     '''
@@ -19,7 +25,20 @@ class OptitrackClient:
         These settings can be modified, just be carefull when initializing an OptitrackClient object 
     '''
     
-    def __init__(self, start_time, client_address="192.168.100.2", server_address="192.168.100.1"):
+    def __init__(self, clock=None, client_address="192.168.100.2", server_address="192.168.100.1", max_len=None):
+        '''
+        Here is a brief description of the parameters required to create an OptitrackClient object.
+
+        clock:          HostClock providing the time of the frames. If None, the default
+                        shared clock is used
+
+        client_address: IP address of this machine
+
+        server_address: IP address of the machine running Motive
+
+        max_len:        Maximum number of samples retained for each tracked object.
+                        If None, the whole session is stored
+        '''
         # Initialize the NatNet client
         self._client = NatNetClient()
 
@@ -27,9 +46,10 @@ class OptitrackClient:
         self._client.set_client_address(client_address)    # This machine (client PC)
         self._client.set_server_address(server_address)    # Motive machine (server)
 
-        # Register the listener for rigid body data
+        # Register the listeners: rigid body data are forwarded to the callbacks as soon as
+        #   they are decoded, while the whole frame is recorded once it is complete.
         self._client.rigid_body_listener = self._receive_rigid_body_frame
-        self._client.new_frame_listener = self._receive_frame_listener
+        self._client.new_frame_with_data_listener = self._receive_frame_listener
 
         # Event to stop the streaming
         self._stop_streaming = Event()
@@ -37,33 +57,105 @@ class OptitrackClient:
         # List of tracked object
         self._tracked_objs = []
 
-        # Dictionary containing, for each streaming_id, the list of tracked position
-        self._tracked_pos = {}
+        # Dictionary containing, for each streaming_id, its column in the recorded frames
+        self._body_idx = {}
 
-        # Dictionary containing, for each streaming_id, the list of callbacks
+        # Dictionary containing, for each streaming_id, the list of callbacks.
+        # Callbacks in _rotation_cbs receive also the orientation quaternion.
         self._tracked_cbs = {}
+        self._rotation_cbs = set()
 
-        # Time
-        self._start_time = start_time
-        self._track_time = np.array([])
+        # Time: frames are stamped with the mid-exposure time of the cameras, converted
+        #   from the clock of the Motive machine to the host clock
+        self._clock = clock if clock is not None else HostClock.get_default()
+        self._camera_sync = self._clock.register("optitrack", tick_period=CAMERA_TICK_PERIOD)
+
+        # Recorded frames: one row for each NatNet frame, see _build_record_log()
+        self._max_len = max_len
+        self._record_log = None
+        self._record_row = None
+        self._build_record_log()
 
         # Coordinate Transformation
         self._coor_transformation_configured = False
         self._O_ot_in_uwb = None
         self._rot_ot2uwb = None
+        self._rotation_ot2uwb = None
 
     def track_object(self, streaming_id):
         # Include a new object to the tracked list.
         # Objects are identified using the IDs setted in Motive for each rigid body.
         if streaming_id not in self._tracked_objs:
             self._tracked_objs.append(streaming_id)
-            self._tracked_pos[streaming_id] = np.empty((3,0))
+            # The layout of the recorded frames can change only before the first frame
+            if len(self._record_log) == 0:
+                self._build_record_log()
+            else:
+                print("[OptitrackClient.track_object()] Recording already started, object ", streaming_id, " is not recorded.")
 
-    def add_track_callback(self, streaming_id, callback):
-        if streaming_id not in self._tracked_objs:
-            self._tracked_objs.append(streaming_id)
-            self._tracked_pos[streaming_id] = np.empty((3, 0))
+    def add_track_callback(self, streaming_id, callback, with_rotation=False):
+        # The callback receives the position in UWB coordinates, callback(pos).
+        # If with_rotation is True, it receives also the orientation quaternion
+        #   (qx, qy, qz, qw) in UWB coordinates, callback(pos, quat): e.g. SimpleCF.send_external_pos
+        self.track_object(streaming_id)
         self._tracked_cbs[streaming_id] = callback
+        if with_rotation:
+            self._rotation_cbs.add(streaming_id)
+        else:
+            self._rotation_cbs.discard(streaming_id)
+
+    def _build_record_log(self):
+        '''
+        Each row of the record log describes one NatNet frame:
+            frame_number:   Frame number assigned by Motive
+            time:           Host time (ns) of the mid-exposure of the cameras
+            host_time:      Host time (ns) at which the frame was received
+            timestamp:      NatNet timestamp of the frame (ns)
+            pos:            (n_bodies, 3) positions of the tracked objects
+            rot:            (n_bodies, 4) quaternions (qx, qy, qz, qw) of the tracked objects
+            tracking_valid: (n_bodies,) flags, False if the object is missing or not tracked
+            error:          (n_bodies,) mean marker error of the tracked objects
+
+        Column k of the per-body fields refers to the object self._body_idx[streaming_id] == k.
+        '''
+        self._body_idx = {streaming_id: k for k, streaming_id in enumerate(self._tracked_objs)}
+        n_bodies = len(self._tracked_objs)
+        dtype = np.dtype([
+            ('frame_number', np.int64),
+            ('time', np.int64),
+            ('host_time', np.int64),
+            ('timestamp', np.int64),
+            ('pos', np.float64, (n_bodies, 3)),
+            ('rot', np.float64, (n_bodies, 4)),
+            ('tracking_valid', np.bool_, (n_bodies,)),
+            ('error', np.float32, (n_bodies,)),
+        ])
+        self._record_log = DataBuffer(dtype=dtype, max_len=self._max_len)
+        self._record_row = np.zeros((), dtype=dtype)
+
+    @property
+    def _records(self):
+        # Recorded frames (view, not a copy)
+        return self._record_log.view()
+
+    @property
+    def _tracked_pos(self):
+        # Dictionary containing, for each streaming_id, the (3, N) array of tracked positions.
+        # Positions are NaN in the frames where the object is missing.
+        # Arrays are views of the record log, not copies.
+        records = self._records
+        return {streaming_id: records['pos'][:, k, :].T for streaming_id, k in self._body_idx.items()}
+
+    @property
+    def _tracked_valid(self):
+        # Dictionary containing, for each streaming_id, the (N,) tracking_valid flags
+        records = self._records
+        return {streaming_id: records['tracking_valid'][:, k] for streaming_id, k in self._body_idx.items()}
+
+    @property
+    def _track_time(self):
+        # Host time (int64 ns) of the mid-exposure of each frame (view, not a copy)
+        return self._records['time']
 
     def identity_transformation(self):
         self.load_configuration("Optitrack/config/default_config")
@@ -72,6 +164,7 @@ class OptitrackClient:
         config = sio.loadmat(filename)
         self._rot_ot2uwb = config['rot_ot2uwb']
         self._O_ot_in_uwb = config['O_ot_in_uwb']
+        self._rotation_ot2uwb = Rotation.from_matrix(self._rot_ot2uwb)
         self._coor_transformation_configured = True
 
     def run(self):
@@ -97,26 +190,72 @@ class OptitrackClient:
             pass
 
     def _receive_frame_listener(self, data):
-        # At each new data packet, the receiving time is stored
-        self._track_time = np.append(self._track_time, time.time()-self._start_time)
+        # At each new data packet, a row containing the whole frame is stored
+        host_time = self._clock.now_ns()
+        time_ns = self._camera_time(data['mocap_data'], host_time)
+
+        # Collect the tracked objects included in the frame
+        idx, pos, rot, valid, error = [], [], [], [], []
+        for rigid_body in data['mocap_data'].rigid_body_data.rigid_body_list:
+            k = self._body_idx.get(rigid_body.id_num)
+            if k is None:
+                continue
+            idx.append(k)
+            pos.append(rigid_body.pos)
+            rot.append(rigid_body.rot)
+            valid.append(rigid_body.tracking_valid)
+            error.append(rigid_body.error)
+
+        # Fill the row: missing objects are marked as not valid
+        row = self._record_row
+        row['frame_number'] = data['frame_number']
+        row['time'] = time_ns
+        row['host_time'] = host_time
+        row['timestamp'] = round(data['timestamp']*1e9)
+        row['pos'] = np.nan
+        row['rot'] = np.nan
+        row['tracking_valid'] = False
+        row['error'] = np.nan
+        if idx:
+            row['pos'][idx] = pos
+            row['rot'][idx] = rot
+            row['tracking_valid'][idx] = valid
+            row['error'][idx] = error
+
+        # Single write of the whole frame
+        self._record_log.append(row)
+
+    def _camera_time(self, mocap_data, host_time):
+        # Map the mid-exposure stamp of the frame onto the host clock.
+        # Frames without the stamp (NatNet < 3) are stamped with their arrival time.
+        suffix_data = mocap_data.suffix_data
+        stamp = getattr(suffix_data, 'stamp_camera_mid_exposure', -1)
+        if stamp <= 0:
+            return host_time
+        return self._camera_sync.update(stamp, host_time)
+
+    def get_clock_stats(self):
+        # Offset and drift of the camera clock with respect to the host clock (see ClockSync)
+        return self._camera_sync.get_stats()
 
     def _receive_rigid_body_frame(self, new_id, position, rotation):
-        # This function is invoked for each rigid body included in a new data packet
-        if new_id not in self._tracked_objs:
+        # This function is invoked for each rigid body included in a new data packet.
+        # Data are recorded by _receive_frame_listener(), here they are just forwarded.
+
+        # If the rigid body is associated to a callback, invoke it (after the coordinate is transformed)
+        if new_id not in self._tracked_cbs:
             return
         new_pos = np.reshape(np.array(position), (3,))
-        # print(self._tracked_pos[new_id])
-        # print(new_pos)
-        self._tracked_pos[new_id] = np.append(self._tracked_pos[new_id],
-                np.reshape(new_pos, (3,1)), axis=1)
 
-        # If the rigid body is associated to a callback, invoke it (after the coordinate is transformed)
-        if new_id in self._tracked_cbs:
-            # Transform coordinates from OT to UWB
-            # p_uwb = O_ot_in_uwb + rot_ot2uwb @ p_ot
-            p_uwb = self._O_ot_in_uwb.reshape((3,)) + self._rot_ot2uwb@new_pos
+        # Transform coordinates from OT to UWB
+        # p_uwb = O_ot_in_uwb + rot_ot2uwb @ p_ot
+        p_uwb = self._O_ot_in_uwb.reshape((3,)) + self._rot_ot2uwb@new_pos
 
-            # print(p_uwb)
+        # Send the position information
+        if new_id not in self._rotation_cbs:
+            self._tracked_cbs[new_id](p_uwb.tolist())
+            return
 
-            # Send the position information
-            self._tracked_cbs[new_id](p_uwb.tolist())
\ No newline at end of file
+        # Rotate the orientation from OT to UWB: q_uwb = rot_ot2uwb * q_ot
+        q_uwb = (self._rotation_ot2uwb*Rotation.from_quat(rotation)).as_quat()
+        self._tracked_cbs[new_id](p_uwb.tolist(), q_uwb.tolist())
\ No newline at end of file
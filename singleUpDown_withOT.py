@@ -78,19 +78,17 @@ if __name__ == '__main__':
     # Define the URI identifying the agent
     uri = 'radio://0/80/2M/E7E7E7E706'
 
-    # Store the initial time. 
-    # This is necessary just to compare the position estimation given by UWB and OT. 
-    start_time = time.time()
-
-    # Create a SimpleCF object providing uri and start_time
-    cf = SimpleCF(uri, start_time)
+    # SimpleCF and OptitrackClient share the default HostClock, so the position
+    # estimation given by UWB and OT can be compared on the same timeline.
+    # Create a SimpleCF object providing uri
+    cf = SimpleCF(uri)
     cf.use_phlc = True
 
     # Set the execute function
     cf._executed_function = execute_up_down_relative
     
     # Create the OT client
-    oc = OptitrackClient(start_time)
+    oc = OptitrackClient()
 
     # Add to the client ALL the object that you want to track.
     # If more objects must be tracked, invoke
@@ -0,0 +1,50 @@
+import numpy as np
+from matplotlib import pyplot as plt
+
+import cflib.crtp
+from CFLib.SimpleCF import SimpleCF
+from CFLib.HostClock import HostClock
+
+def move_trajectory(self):
+    '''
+    Same movements of move() in single_export.py, executed on board as a single
+    trajectory instead of a chain of go_to and time.sleep.
+    The waypoints are uploaded once, then the drone flies them without further
+    commands from the pc.
+    '''
+    p0 = self.get_last_position()
+    z0 = 0.60
+    waypoints = np.array([
+        [p0[0],     p0[1],     p0[2]],
+        [p0[0],     p0[1],     0.3],
+        [p0[0],     p0[1],     0.7],
+        [p0[0]+0.4, p0[1],     z0],
+        [p0[0]-0.4, p0[1],     z0],
+        [p0[0],     p0[1]+0.4, z0],
+        [p0[0],     p0[1]-0.4, z0],
+        [p0[0],     p0[1],     z0],
+    ])
+    # Time at which each waypoint is reached
+    times = np.arange(len(waypoints))*3.0
+    self.fly_waypoints(waypoints, times)
+
+if __name__ == '__main__':
+    # Initialize the low-level drivers
+    cflib.crtp.init_drivers()
+    uri = 'radio://0/80/2M/E7E7E7E702'
+
+    # Create a SimpleCF object providing uri
+    cf = SimpleCF(uri)
+
+    # Set the execute function
+    cf._executed_function = move_trajectory
+    
+    # Start the agent
+    cf.start_drone()
+
+    # Various plots
+    fig, ax = plt.subplots(1, 1, layout='constrained')
+    t = HostClock.to_seconds(cf._pos_time)
+    ax.plot(t, cf._pos[0, :], t, cf._pos[1, :], t, cf._pos[2, :])
+    ax.legend(['CF_x', 'CF_y', 'CF_z'])
+    plt.show()
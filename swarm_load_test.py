@@ -0,0 +1,43 @@
+import sys
+import time
+
+from CFLib.SimpleCFSwarm import SimpleCFSwarm
+from CFLib.SimulatedSwarm import SimulatedSwarm
+
+def execute_up_down_relative(self):
+    p0 = self.get_last_position()
+    # Go up
+    self.go_to(p0[0], p0[1], z=0.5, wait=True, timeout=10)
+    time.sleep(2)
+    # Go down
+    self.go_to(p0[0], p0[1], z=0.3, wait=True, timeout=10)
+    time.sleep(2)
+
+if __name__ == '__main__':
+    # Load test without hardware: the drones are simulated, 10 for each radio
+    n_drones = int(sys.argv[1]) if len(sys.argv) > 1 else 50
+    uris = ['radio://%d/80/2M/E7E7E7E7%02X' % (idx//10, idx) for idx in range(n_drones)]
+
+    sim = SimulatedSwarm()
+    simple_swarm = SimpleCFSwarm(uris, toc_cache=sim)
+
+    t0 = time.monotonic()
+    connected = simple_swarm.connect_all()
+    print("Connected: ", sum(bool(c) for c in connected), "/", n_drones, " in ", time.monotonic() - t0, " s")
+    for idx in range(n_drones):
+        simple_swarm.assign_execute_method(idx, execute_up_down_relative)
+
+    t0 = time.monotonic()
+    missions = simple_swarm.run_missions()
+    print("Missions: ", sum(bool(m) for m in missions), "/", n_drones, " in ", time.monotonic() - t0, " s")
+
+    latencies = [simple_swarm._cfs[idx].get_log_latency_stats() for idx in range(n_drones)]
+    latencies = [stats for stats in latencies if stats["count"] > 0]
+    if latencies:
+        print("Log latency: mean ", sum(stats["mean"] for stats in latencies)/len(latencies),
+              " s, max ", max(stats["max"] for stats in latencies), " s")
+    print("Startup: ", simple_swarm.get_startup_stats())
+
+    simple_swarm.disconnect_all()
+    sim.stop()
+    print("Simulation: ", sim.get_stats())
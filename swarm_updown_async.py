@@ -0,0 +1,35 @@
+import cflib.crtp
+from CFLib.AsyncSimpleCFSwarm import AsyncSimpleCFSwarm
+
+async def execute_up_down_relative(self):
+    '''
+    Asyncio version of the action: go_to_async and wait are awaited, so all the drones
+    of the swarm are driven by the same event loop.
+    '''
+    p0 = self.get_last_position()
+    # Initial position
+    print("Initial position")
+    await self.go_to_async(p0[0], p0[1], z=0.5)
+    await self.wait(2)
+    # Go up 
+    print("Go up")
+    await self.go_to_async(p0[0], p0[1], z=0.8)
+    await self.wait(2)
+    # Go down
+    print("Go down to initial position")
+    await self.go_to_async(p0[0], p0[1], z=0.5)
+    await self.wait(2)
+
+if __name__ == '__main__':
+    # Initialize the low-level drivers
+    cflib.crtp.init_drivers()
+
+    uris = ['radio://0/80/2M/E7E7E7E703', 
+            'radio://0/80/2M/E7E7E7E702']
+
+    simple_swarm = AsyncSimpleCFSwarm(uris)
+    simple_swarm.assign_execute_method(0, execute_up_down_relative)
+    simple_swarm.assign_execute_method(1, execute_up_down_relative)
+
+    # Note: this is a blocking method
+    simple_swarm.start_swarm()
@@ -0,0 +1,39 @@
+import time
+
+from CFLib.ShardedSwarmExecutor import ShardedSwarmExecutor
+
+def execute_up_down_relative(self):
+    '''
+    Executed in the shard process of the drone: it must be defined at module level,
+    so that it can be sent to the shard.
+    '''
+    p0 = self.get_last_position()
+    # Initial position
+    print("Initial position")
+    self.go_to(p0[0], p0[1], z=0.5)
+    time.sleep(2)
+    # Go up 
+    print("Go up")
+    self.go_to(p0[0], p0[1], z=0.8)
+    time.sleep(2)
+    # Go down
+    print("Go down to initial position")
+    self.go_to(p0[0], p0[1], z=0.5)
+    time.sleep(2)
+
+if __name__ == '__main__':
+    # One shard (process) for each radio dongle
+    uris = ['radio://0/80/2M/E7E7E7E703', 
+            'radio://0/80/2M/E7E7E7E702',
+            'radio://1/90/2M/E7E7E7E704',
+            'radio://1/90/2M/E7E7E7E705']
+
+    executor = ShardedSwarmExecutor(uris)
+    print("Connected: ", executor.start())
+    for idx in range(len(uris)):
+        executor.assign_execute_method(idx, execute_up_down_relative)
+
+    print("Missions: ", executor.run_missions())
+    for uri, stats in executor.get_log_latency_stats().items():
+        print(uri, " log latency: mean ", stats["mean"], " s, max ", stats["max"], " s")
+    executor.stop()
@@ -39,10 +39,8 @@ if __name__ == '__main__':
 
     frame_ids = [27, 28]
 
-    start_time = time.time()
-
     # Create the OT client
-    oc = OptitrackClient(start_time)
+    oc = OptitrackClient()
 
     for frame in frame_ids:    
         oc.track_object(frame)
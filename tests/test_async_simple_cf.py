@@ -0,0 +1,62 @@
+import asyncio
+import threading
+import time
+
+from CFLib.AsyncSimpleCF import AsyncSimpleCF
+from CFLib.AsyncSimpleCFSwarm import AsyncSimpleCFSwarm
+from CFLib.SimulatedSwarm import SimulatedSwarm
+
+URIS = ['radio://0/80/2M/E7E7E7E700', 'radio://0/80/2M/E7E7E7E701']
+
+async def hover_long(self):
+    p0 = self.get_last_position()
+    await self.go_to_async(p0[0], p0[1], 0.5)
+    await self.wait(30)
+
+def test_kill_all_lands_async_swarm():
+    sim = SimulatedSwarm()
+    for uri in URIS:
+        sim.add_drone(uri)
+    swarm = AsyncSimpleCFSwarm(URIS, toc_cache=sim)
+    for idx in range(len(URIS)):
+        swarm.assign_execute_method(idx, hover_long)
+    runner = threading.Thread(target=swarm.start_swarm, daemon=True)
+    runner.start()
+    try:
+        # Wait for the swarm to be hovering
+        deadline = time.monotonic() + 15
+        while time.monotonic() < deadline and not (sim.get_positions()[:, 2] > 0.45).all():
+            time.sleep(0.1)
+        assert (sim.get_positions()[:, 2] > 0.45).all()
+
+        assert set(swarm.kill_all().values()) == {'land'}
+        runner.join(10)
+        assert not runner.is_alive()
+        assert (sim.get_positions()[:, 2] < 0.05).all()
+    finally:
+        sim.stop()
+
+def test_link_supervisor_reconnects_async_drone():
+    sim = SimulatedSwarm()
+    cf = AsyncSimpleCF(URIS[0], toc_cache=sim)
+
+    async def mission():
+        await cf.connect_async(backoff_base=0.1)
+        await cf.take_off()
+        assert sim.drop_link(URIS[0], down_for=0.2)
+        # The drone keeps hovering while the link is opened again
+        deadline = time.monotonic() + 10
+        while time.monotonic() < deadline and cf.get_link_stats()["reconnects"] == 0:
+            await asyncio.sleep(0.05)
+        assert cf.get_link_stats()["reconnects"] == 1
+        assert cf.get_link_stats()["state"] == "up"
+        assert cf.took_off()
+        assert await cf.go_to_async(*(cf.get_last_position() + [0.0, 0.0, 0.2]))
+        await cf.land()
+        await cf.disconnect_async()
+
+    try:
+        asyncio.run(mission())
+        assert sim.get_positions()[0, 2] < 0.15
+    finally:
+        sim.stop()
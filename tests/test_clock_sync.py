@@ -0,0 +1,33 @@
+import numpy as np
+
+from CFLib.ClockSync import ClockSync
+
+def feed(sync, ticks, host_ns):
+    return np.array([sync.update(tick, host) for tick, host in zip(ticks, host_ns)])
+
+def test_tick_reset_restarts_the_fit():
+    sync = ClockSync(tick_period=1e-3)
+    # 10 s of packets every 10 ms, with a 2 ms transport delay
+    ticks = np.arange(5000, 15000, 10, dtype=np.uint32)
+    host_ns = 1_000_000_000_000 + (ticks - ticks[0]).astype(np.int64)*1_000_000 + 2_000_000
+    feed(sync, ticks, host_ns)
+    assert sync.n_samples == len(ticks)
+
+    # The drone reboots: its tick restarts from 0 while the host time goes on
+    ticks_after = np.arange(0, 2000, 10, dtype=np.uint32)
+    host_after = host_ns[-1] + 3_000_000_000 + ticks_after.astype(np.int64)*1_000_000
+    corrected = feed(sync, ticks_after, host_after)
+
+    assert sync.n_samples == len(ticks_after)
+    assert sync.get_stats()["reference_tick"] == ticks_after[-1]
+    # Times stay on the host timeline, within the transport delay
+    assert np.max(np.abs(corrected - host_after)) < 5_000_000
+
+def test_packets_out_of_order_keep_the_fit():
+    sync = ClockSync(tick_period=1e-3)
+    ticks = np.arange(0, 1000, 10, dtype=np.uint32)
+    host_ns = 1_000_000_000 + ticks.astype(np.int64)*1_000_000
+    feed(sync, ticks, host_ns)
+    # A packet of another block, sampled 5 ms earlier, arrives late
+    sync.update(ticks[-1] - 5, host_ns[-1] + 1_000_000)
+    assert sync.n_samples == len(ticks) + 1
@@ -3,6 +3,7 @@ import sys
 sys.path.insert(0, '../')
 from CFLib.SimpleCF import SimpleCF
 from Optitrack.OptitrackClient import OptitrackClient
+from CFLib.HostClock import HostClock
 
 # Import regular python packages 
 from scipy import interpolate
@@ -13,34 +14,44 @@ from scipy.io import savemat
 def export_drone_position(cf: SimpleCF, filename: str):
     data = {
             "uri": cf._uri, 
-            "time": cf._pos_time, 
+            "time": HostClock.to_seconds(cf._pos_time), 
+            "time_ns": cf._pos_time, 
             "pos": cf._pos.T
             }
     savemat(filename, data, appendmat=True)
 
 def export_drone_ot_position(cf: SimpleCF, frame_id: int, oc: OptitrackClient, filename: str):
-    idx_t0, idx_tf, fitted_cf_est = fit_data(cf, oc)
+    idx, fitted_cf_est = fit_data(cf, oc, frame_id)
     data = {
             "uri": cf._uri, 
-            "time": oc._track_time[idx_t0:idx_tf], 
+            "time": HostClock.to_seconds(oc._track_time[idx]), 
+            "time_ns": oc._track_time[idx], 
             "cf_est_pos": fitted_cf_est.T,
-            "ot_est_pos": oc._tracked_pos[frame_id][:, idx_t0:idx_tf]
+            "ot_est_pos": oc._tracked_pos[frame_id][:, idx]
             }
     savemat(filename, data)
 
-def fit_data(cf: SimpleCF, oc: OptitrackClient):
+def overlapping_frames(cf: SimpleCF, oc: OptitrackClient, frame_id: int):
+    # Indices of the OT frames collected while the drone was logging, in which the
+    # object frame_id is validly tracked. Frames are recorded row by row, so these
+    # indices apply to both oc._track_time and oc._tracked_pos[frame_id].
+    t = oc._track_time
+    mask = (t >= cf._pos_time[0]) & (t <= cf._pos_time[-1]) & oc._tracked_valid[frame_id]
+    return np.flatnonzero(mask)
+
+def fit_data(cf: SimpleCF, oc: OptitrackClient, frame_id: int):
+    # Both time vectors are host times (int64 ns) of the same HostClock
     f_x = interpolate.interp1d(cf._pos_time, cf._pos[0, :])
     f_y = interpolate.interp1d(cf._pos_time, cf._pos[1, :])
     f_z = interpolate.interp1d(cf._pos_time, cf._pos[2, :])
 
-    idx_t0 = np.argmax( oc._track_time - cf._pos_time[0] > 0 )
-    idx_tf = np.argmax( oc._track_time - cf._pos_time[-1] > 0 )
+    idx = overlapping_frames(cf, oc, frame_id)
 
     tmp = np.vstack(
-        (   f_x(oc._track_time[idx_t0:idx_tf]), 
-            f_y(oc._track_time[idx_t0:idx_tf]), 
-            f_z(oc._track_time[idx_t0:idx_tf])  
+        (   f_x(oc._track_time[idx]), 
+            f_y(oc._track_time[idx]), 
+            f_z(oc._track_time[idx])  
         )
     )
 
-    return (idx_t0, idx_tf, tmp.T)
\ No newline at end of file
+    return (idx, tmp.T)
\ No newline at end of file